@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""ad-hoc benchmarks for book-picker. not run in the image build.
+
+usage:
+    python benchmark.py scan                      # synthetic tree, serial vs parallel
+    python benchmark.py scan --latency-ms 2       # pretend every listdir is an nfs round trip
+    python benchmark.py scan --root /mnt/books    # real library
+    python benchmark.py pipeline --latency-ms 2   # time to first posted book, offline
+    python benchmark.py startup --max-ms 200      # import time of main, fails above the threshold
+    python benchmark.py suite --out results.json  # 10k/100k files, every scan/selection mode, json out
+    python benchmark.py compare old.json new.json # flag anything that got slower or bigger
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import pathlib
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from discord_webhook import DryRunSink
+from main import (
+    SELECT_STRATEGIES,
+    get_all_files,
+    iter_diverse_files,
+    run_pipeline,
+    scan_files,
+    select_diverse_files,
+)
+
+
+def build_tree(root: pathlib.Path, top_dirs: int, subdirs: int, files: int) -> int:
+    """top_dirs collections, each with subdirs dirs holding files files. returns file count."""
+    count = 0
+    for t in range(top_dirs):
+        for s in range(subdirs):
+            d = root / f"collection_{t:04d}" / f"volume_{s:03d}"
+            d.mkdir(parents=True)
+            for f in range(files):
+                (d / f"book_{f:03d}.epub").touch()
+                count += 1
+    return count
+
+
+@contextlib.contextmanager
+def simulated_latency(latency_ms: float):
+    """make every os.scandir call pay a fixed delay, like a round trip to a nas."""
+    if latency_ms <= 0:
+        yield
+        return
+    real_scandir = os.scandir
+
+    def slow_scandir(path="."):
+        time.sleep(latency_ms / 1000)
+        return real_scandir(path)
+
+    os.scandir = slow_scandir
+    try:
+        yield
+    finally:
+        os.scandir = real_scandir
+
+
+def time_scan(root: pathlib.Path, workers: int, repeat: int) -> tuple[float, int]:
+    """best-of-n wall time for a full scan, plus the number of files found."""
+    best = float("inf")
+    found = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = sum(1 for _ in scan_files(root, workers=workers))
+        best = min(best, time.perf_counter() - start)
+    return best, found
+
+
+class SlowModel:
+    """gemini stand-in that takes a fixed time per review."""
+
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+
+    def generate_content(self, prompt, generation_config=None):
+        time.sleep(self.latency_s)
+        text = "mid. rating: 5/10"
+        return SimpleNamespace(
+            parts=[SimpleNamespace(text=text)],
+            text=text,
+            prompt_feedback=None,
+            candidates=[SimpleNamespace(finish_reason=1)],
+        )
+
+
+def time_pipeline(
+    root: pathlib.Path, args: argparse.Namespace, strategy: str, streamed: bool
+) -> tuple[float, float, int]:
+    """(seconds to first book message, seconds to last message, books posted) for one run.
+
+    streamed=False collects every pick before starting, which is how a run
+    behaved before the pipeline.
+    """
+    out = io.StringIO()
+    sink = DryRunSink("json", out=out)
+    picks = iter_diverse_files(
+        root, args.n, strategy=strategy, scan_workers=args.scan_workers
+    )
+    if not streamed:
+        picks = list(picks)
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        posted = run_pipeline(
+            picks,
+            sink,
+            pool,
+            "intro",
+            root,
+            "https://example.com",
+            "bench",
+            review_mode=args.review_mode,
+            concurrency=args.concurrency,
+            model=SlowModel(args.review_ms / 1000),
+        )
+    times = [json.loads(line)["t"] for line in out.getvalue().splitlines()]
+    # times[0] is the intro, times[1] the first book
+    return times[1], times[-1], posted
+
+
+def cmd_pipeline(args: argparse.Namespace) -> None:
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="book-picker-bench-"))
+    try:
+        n = build_tree(tmp, args.top_dirs, args.subdirs, args.files)
+        print(f"built synthetic tree: {n} files", file=sys.stderr)
+        with simulated_latency(args.latency_ms), contextlib.redirect_stderr(
+            io.StringIO()
+        ):
+            rows = [
+                (strategy, streamed, *time_pipeline(tmp, args, strategy, streamed))
+                for strategy in args.strategies
+                for streamed in (False, True)
+            ]
+        for strategy, streamed, first, last, posted in rows:
+            print(
+                f"{strategy:<9} {'streamed' if streamed else 'collected':<9} "
+                f"first book {first * 1000:8.1f} ms  last {last * 1000:8.1f} ms  "
+                f"{posted} posted"
+            )
+    finally:
+        shutil.rmtree(tmp)
+
+
+# heavy imports that only the review path needs, must never load at startup
+LAZY_MODULES = ("google.generativeai", "grpc", "google.protobuf")
+
+
+def import_times(module: str) -> dict[str, int]:
+    """cumulative import time in microseconds per module, for `import module` in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=pathlib.Path(__file__).parent,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        if cumulative.strip().isdigit():  # skip the header row
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def cmd_startup(args: argparse.Namespace) -> None:
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    totals = [run[args.module] / 1000 for run in runs]
+    best = min(totals)
+    print(
+        f"import {args.module}: best {best:.1f} ms, "
+        f"median {statistics.median(totals):.1f} ms over {args.repeat} runs"
+    )
+
+    fastest = runs[totals.index(best)]
+    heaviest = sorted(
+        (
+            name
+            for name in fastest
+            if "." not in name and name not in (args.module, "site", "encodings")
+        ),
+        key=fastest.get,
+        reverse=True,
+    )[:5]
+    for name in heaviest:
+        print(f"  {fastest[name] / 1000:7.1f} ms  {name}")
+
+    failed = False
+    loaded = [m for m in LAZY_MODULES if m in fastest]
+    if loaded:
+        print(f"FAIL: {', '.join(loaded)} imported at startup", file=sys.stderr)
+        failed = True
+    if best > args.max_ms:
+        print(
+            f"FAIL: {best:.1f} ms is over the {args.max_ms} ms budget", file=sys.stderr
+        )
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+EXTENSIONS = ("epub", "pdf", "mobi", "azw3")
+
+
+def build_library(
+    root: pathlib.Path,
+    files: int,
+    depth: int,
+    fanout: int,
+    hidden_ratio: float,
+    seed: int = 0,
+) -> dict:
+    """a synthetic library: `fanout` dirs per level, `depth` levels, files spread over the leaves.
+
+    a hidden_ratio share of leaf dirs and of files get a leading dot. the tree is
+    deterministic for a given seed and reused from an earlier run if the
+    parameters match, since a million files take a while to create.
+    """
+    params = {
+        "files": files,
+        "depth": depth,
+        "fanout": fanout,
+        "hidden_ratio": hidden_ratio,
+        "seed": seed,
+    }
+    marker = root / ".complete"
+    if marker.exists() and json.loads(marker.read_text()) == params:
+        return params
+    if root.exists():
+        shutil.rmtree(root)
+
+    rng = random.Random(seed)
+    leaves = [()]
+    for _ in range(depth):
+        leaves = [leaf + (i,) for leaf in leaves for i in range(fanout)]
+    leaf_dirs = []
+    for leaf in leaves:
+        parts = [
+            f"{'shelf' if level else 'collection'}_{i:03d}"
+            for level, i in enumerate(leaf)
+        ]
+        if parts and rng.random() < hidden_ratio:
+            parts[-1] = "." + parts[-1]
+        leaf_dirs.append(root.joinpath(*parts))
+        leaf_dirs[-1].mkdir(parents=True, exist_ok=True)
+
+    for i in range(files):
+        name = f"book_{i:07d}.{rng.choice(EXTENSIONS)}"
+        if rng.random() < hidden_ratio:
+            name = "." + name
+        open(leaf_dirs[i % len(leaf_dirs)] / name, "wb").close()
+    marker.write_text(json.dumps(params))
+    return params
+
+
+def measure(fn, repeat: int = 3) -> tuple[float, float, object]:
+    """(best-of-n seconds, peak traced MiB, result) for fn().
+
+    timed on its own first, then re-run under tracemalloc for the peak, since
+    tracing slows everything down a lot. the global rng is reseeded before every
+    run so random strategies walk the same subtrees each time.
+    """
+    seconds = float("inf")
+    with contextlib.redirect_stderr(io.StringIO()):
+        for _ in range(repeat):
+            random.seed(0)
+            start = time.perf_counter()
+            result = fn()
+            seconds = min(seconds, time.perf_counter() - start)
+        random.seed(0)
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return seconds, peak / 2**20, result
+
+
+def suite_cases(root: pathlib.Path, pattern: str, n: int, index_path: pathlib.Path):
+    """(name, fn) for every scan and selection mode."""
+    compiled = re.compile(pattern, re.IGNORECASE) if pattern else None
+    yield "get_all_files", lambda: len(get_all_files(root, compiled))
+    yield "get_all_files_parallel", lambda: len(
+        get_all_files(root, compiled, scan_workers=8)
+    )
+    for strategy in SELECT_STRATEGIES:
+        yield f"select_{strategy}", lambda strategy=strategy: len(
+            select_diverse_files(root, n, pattern, strategy=strategy)
+        )
+    # parallel walk feeding an O(buckets) strategy, memory should stay flat too
+    yield "select_reservoir_parallel", lambda: len(
+        select_diverse_files(root, n, pattern, strategy="reservoir", scan_workers=8)
+    )
+
+    def index_build():
+        if index_path.exists():
+            index_path.unlink()
+        return len(select_diverse_files(root, n, pattern, index_path=index_path))
+
+    yield "select_index_build", index_build
+    # index is warm after the build above, so this is the steady-state run
+    yield "select_index_warm", lambda: len(
+        select_diverse_files(root, n, pattern, index_path=index_path)
+    )
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=pathlib.Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cmd_suite(args: argparse.Namespace) -> None:
+    workdir = pathlib.Path(
+        args.workdir or tempfile.mkdtemp(prefix="book-picker-bench-")
+    )
+    results = []
+    try:
+        for size in args.sizes:
+            root = workdir / f"library-{size}"
+            print(f"building/reusing {size}-file library in {root}", file=sys.stderr)
+            start = time.perf_counter()
+            build_library(root, size, args.depth, args.fanout, args.hidden_ratio)
+            print(f"  ready in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+            for pattern in args.patterns:
+                index_path = workdir / f"index-{size}.sqlite"
+                for name, fn in suite_cases(root, pattern, args.n, index_path):
+                    if args.only and not any(o in name for o in args.only):
+                        continue
+                    seconds, peak_mib, count = measure(fn, args.repeat)
+                    results.append(
+                        {
+                            "size": size,
+                            "case": name,
+                            "pattern": pattern,
+                            "seconds": round(seconds, 4),
+                            "peak_mib": round(peak_mib, 2),
+                            "count": count,
+                        }
+                    )
+                    print(
+                        f"{size:>8} {name:<24} {pattern or '-':<10} "
+                        f"{seconds * 1000:9.1f} ms {peak_mib:8.1f} MiB  ({count})"
+                    )
+                if index_path.exists():
+                    index_path.unlink()
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {
+            "depth": args.depth,
+            "fanout": args.fanout,
+            "hidden_ratio": args.hidden_ratio,
+            "n": args.n,
+        },
+        "results": results,
+    }
+    if args.out:
+        pathlib.Path(args.out).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"wrote {args.out}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+def cmd_compare(args: argparse.Namespace) -> None:
+    old, new = (json.loads(pathlib.Path(p).read_text()) for p in (args.old, args.new))
+    key = lambda r: (r["size"], r["case"], r["pattern"])
+    baseline = {key(r): r for r in old["results"]}
+    regressions = 0
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    for r in new["results"]:
+        before = baseline.get(key(r))
+        if before is None:
+            continue
+        flags = []
+        for metric in ("seconds", "peak_mib"):
+            ratio = r[metric] / before[metric] if before[metric] else 1.0
+            if ratio > 1 + args.threshold:
+                flags.append(f"{metric} x{ratio:.2f}")
+        time_ratio = r["seconds"] / before["seconds"] if before["seconds"] else 1.0
+        print(
+            f"{r['size']:>8} {r['case']:<24} {r['pattern'] or '-':<10} "
+            f"{before['seconds'] * 1000:9.1f} -> {r['seconds'] * 1000:9.1f} ms "
+            f"x{time_ratio:.2f}  {'REGRESSION ' + ', '.join(flags) if flags else ''}"
+        )
+        regressions += bool(flags)
+    if regressions:
+        sys.exit(f"{regressions} cases regressed by more than {args.threshold:.0%}")
+
+
+def cmd_scan(args: argparse.Namespace) -> None:
+    tmp = None
+    if args.root:
+        root = pathlib.Path(args.root).resolve()
+    else:
+        tmp = pathlib.Path(tempfile.mkdtemp(prefix="book-picker-bench-"))
+        root = tmp
+        n = build_tree(root, args.top_dirs, args.subdirs, args.files)
+        print(
+            f"built synthetic tree: {args.top_dirs} top-level dirs, "
+            f"{args.top_dirs * args.subdirs} subdirs, {n} files",
+            file=sys.stderr,
+        )
+
+    try:
+        with simulated_latency(args.latency_ms):
+            baseline = None
+            for workers in args.workers:
+                elapsed, found = time_scan(root, workers, args.repeat)
+                baseline = baseline or elapsed
+                print(
+                    f"workers={workers:<3} {elapsed * 1000:9.1f} ms  "
+                    f"{found} files  {baseline / elapsed:5.2f}x vs first"
+                )
+    finally:
+        if tmp:
+            shutil.rmtree(tmp)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    scan = sub.add_parser("scan", help="serial vs parallel directory scanning")
+    scan.add_argument("--root", help="scan an existing directory instead")
+    scan.add_argument("--top-dirs", type=int, default=200)
+    scan.add_argument("--subdirs", type=int, default=10)
+    scan.add_argument("--files", type=int, default=5)
+    scan.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    scan.add_argument("--latency-ms", type=float, default=0.0)
+    scan.add_argument("--repeat", type=int, default=3)
+    scan.set_defaults(func=cmd_scan)
+
+    pipeline = sub.add_parser(
+        "pipeline", help="time to first/last posted book, dry run with a fake model"
+    )
+    pipeline.add_argument("--top-dirs", type=int, default=200)
+    pipeline.add_argument("--subdirs", type=int, default=10)
+    pipeline.add_argument("--files", type=int, default=5)
+    pipeline.add_argument("--latency-ms", type=float, default=0.0)
+    pipeline.add_argument("--review-ms", type=float, default=500.0)
+    pipeline.add_argument("-n", type=int, default=5)
+    pipeline.add_argument("--concurrency", type=int, default=4)
+    pipeline.add_argument("--scan-workers", type=int, default=1)
+    pipeline.add_argument("--review-mode", default="single")
+    pipeline.add_argument(
+        "--strategies", nargs="+", default=["grouped", "reservoir", "lazy"]
+    )
+    pipeline.set_defaults(func=cmd_pipeline)
+
+    startup = sub.add_parser("startup", help="python -X importtime for main")
+    startup.add_argument("--module", default="main")
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.add_argument("--max-ms", type=float, default=200.0)
+    startup.set_defaults(func=cmd_startup)
+
+    suite = sub.add_parser(
+        "suite", help="time and peak memory of every scan/selection mode, json out"
+    )
+    suite.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    suite.add_argument("--depth", type=int, default=2)
+    suite.add_argument("--fanout", type=int, default=30)
+    suite.add_argument("--hidden-ratio", type=float, default=0.02)
+    suite.add_argument("--patterns", nargs="+", default=["", r"\.pdf$"])
+    suite.add_argument("-n", type=int, default=5)
+    suite.add_argument("--repeat", type=int, default=3)
+    suite.add_argument("--only", nargs="+", help="only cases containing one of these")
+    suite.add_argument(
+        "--workdir", help="keep generated libraries here and reuse them next time"
+    )
+    suite.add_argument("--out", help="write json here instead of stdout")
+    suite.set_defaults(func=cmd_suite)
+
+    compare = sub.add_parser("compare", help="diff two suite json files")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=0.2)
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
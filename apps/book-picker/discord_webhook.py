@@ -0,0 +1,231 @@
+"""discord webhook sender that reuses one connection and paces itself off discord's rate limit headers."""
+
+import json
+import sys
+import time
+from typing import Any, Callable, Iterable, Iterator, TextIO
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+# gateway-ish failures where discord never processed the message, safe to resend.
+# a plain 500, a read timeout or a connection dropped mid-request might have
+# posted it already, so those aren't retried.
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+# discord's per-message limits for webhook embeds
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000  # summed over every embed's text fields
+MAX_TITLE_CHARS = 256
+MAX_DESCRIPTION_CHARS = 4096
+
+DRY_RUN_FORMATS = ("stdout", "json")
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def make_embed(title: str, url: str, description: str) -> dict[str, Any]:
+    """one embed per book, clipped to discord's field limits."""
+    return {
+        "title": _truncate(title, MAX_TITLE_CHARS),
+        "url": url,
+        "description": _truncate(description, MAX_DESCRIPTION_CHARS),
+    }
+
+
+def embed_chars(embed: dict[str, Any]) -> int:
+    """characters an embed counts against the per-message total."""
+    return len(embed.get("title", "")) + len(embed.get("description", ""))
+
+
+def pack_embeds(
+    embeds: Iterable[dict[str, Any]], content: str = ""
+) -> Iterator[dict[str, Any]]:
+    """pack embeds into as few webhook payloads as the limits allow, in order.
+
+    a payload is yielded as soon as the next embed wouldn't fit, so embeds can
+    be produced lazily. `content` goes on the first payload only.
+    """
+    batch = []
+    batch_chars = 0
+    for embed in embeds:
+        chars = embed_chars(embed)
+        if batch and (
+            len(batch) >= MAX_EMBEDS_PER_MESSAGE
+            or batch_chars + chars > MAX_EMBED_CHARS_PER_MESSAGE
+        ):
+            yield (
+                {"content": content, "embeds": batch} if content else {"embeds": batch}
+            )
+            content = ""
+            batch = []
+            batch_chars = 0
+        batch.append(embed)
+        batch_chars += chars
+    if batch or content:
+        yield {"content": content, "embeds": batch} if content else {"embeds": batch}
+
+
+class WebhookClient:
+    """posts json payloads to one webhook url.
+
+    - one requests.Session, so every message reuses the same tls connection
+    - reads X-RateLimit-Remaining / X-RateLimit-Reset-After and waits exactly
+      as long as needed before the next send once the bucket is empty
+    - on 429 waits for the reported retry_after and resends
+    - retries failed connects and 502/503/504 with exponential backoff
+    - posts with ?wait=true so each message exists before the next is sent,
+      which keeps ordering without fixed sleeps
+    """
+
+    def __init__(
+        self,
+        url: str,
+        session: requests.Session | None = None,
+        timeout: float = 15,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.url = url
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.clock = clock
+        self._remaining: int | None = None
+        self._reset_at = 0.0
+
+    def _wait(self, seconds: float, why: str) -> None:
+        if seconds > 0:
+            print(f"webhook: {why}, waiting {seconds:.2f}s", file=sys.stderr)
+            self.sleep(seconds)
+
+    def _track_rate_limit(self, resp: requests.Response) -> None:
+        """remember how much of the current bucket is left and when it resets."""
+        try:
+            remaining = resp.headers.get("X-RateLimit-Remaining")
+            reset_after = resp.headers.get("X-RateLimit-Reset-After")
+            if remaining is not None:
+                self._remaining = int(remaining)
+            if reset_after is not None:
+                self._reset_at = self.clock() + float(reset_after)
+        except ValueError:
+            pass  # garbled headers, fall back to reacting to 429s
+
+    @staticmethod
+    def _retry_after(resp: requests.Response) -> float:
+        """seconds to wait after a 429, from the json body or the Retry-After header."""
+        try:
+            return float(resp.json()["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            pass
+        try:
+            return float(resp.headers.get("Retry-After", 1))
+        except ValueError:
+            return 1.0
+
+    @staticmethod
+    def _nothing_sent(e: requests.exceptions.ConnectionError) -> bool:
+        """whether the request never left, so resending can't post it twice.
+
+        a connection dropped after the body went out (RemoteDisconnected,
+        ProtocolError) raises ConnectionError too, but discord may have posted it.
+        """
+        if isinstance(e, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(e.args[0], "reason", None) if e.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def send(self, payload: dict[str, Any]) -> requests.Response:
+        """post one message, raising requests exceptions once retries are exhausted."""
+        attempt = 0
+        while True:
+            if self._remaining == 0:
+                self._wait(self._reset_at - self.clock(), "rate limit bucket empty")
+                self._remaining = None
+
+            try:
+                resp = self.session.post(
+                    self.url,
+                    json=payload,
+                    params={"wait": "true"},
+                    timeout=self.timeout,
+                )
+            except requests.exceptions.ConnectionError as e:
+                if attempt >= self.max_retries or not self._nothing_sent(e):
+                    raise
+                self._wait(self.backoff * 2**attempt, f"connection failed ({e})")
+                attempt += 1
+                continue
+
+            self._track_rate_limit(resp)
+            if (
+                resp.status_code not in RETRYABLE_STATUSES
+                or attempt >= self.max_retries
+            ):
+                resp.raise_for_status()
+                return resp
+
+            if resp.status_code == 429:
+                # discord tells us exactly how long, no need for extra backoff
+                self._wait(self._retry_after(resp), "rate limited (429)")
+            else:
+                self._wait(
+                    self.backoff * 2**attempt, f"server error {resp.status_code}"
+                )
+            attempt += 1
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class DryRunResponse:
+    status_code = "dry-run"
+
+
+class DryRunSink:
+    """drop-in for WebhookClient that writes payloads out instead of posting them.
+
+    stdout prints each message roughly as discord would show it; json writes one
+    line per message with the seconds since the sink was created, which is what
+    the pipeline benchmark reads back.
+    """
+
+    def __init__(
+        self,
+        fmt: str = "stdout",
+        out: TextIO | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if fmt not in DRY_RUN_FORMATS:
+            raise ValueError(f"unknown dry run format {fmt!r}")
+        self.fmt = fmt
+        self.out = out or sys.stdout
+        self.clock = clock
+        self.started = clock()
+        self.sent: list[tuple[float, dict[str, Any]]] = []
+
+    def send(self, payload: dict[str, Any]) -> DryRunResponse:
+        elapsed = self.clock() - self.started
+        self.sent.append((elapsed, payload))
+        if self.fmt == "json":
+            self.out.write(json.dumps({"t": round(elapsed, 4), "payload": payload}))
+            self.out.write("\n")
+        else:
+            if payload.get("content"):
+                self.out.write(payload["content"] + "\n")
+            for embed in payload.get("embeds", []):
+                self.out.write(
+                    f"[{embed['title']}]({embed['url']})\n{embed['description']}\n"
+                )
+            self.out.write("---\n")
+        self.out.flush()
+        return DryRunResponse()
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,39 @@
+"""lazily loaded gemini provider.
+
+google.generativeai pulls in grpc and protobuf and takes a few hundred ms to
+import, which every run (and every test of the scanner) used to pay up front.
+here the sdk is only imported the first time a model is actually needed.
+"""
+
+import threading
+
+_lock = threading.Lock()
+_api_key: str | None = None
+_genai = None
+
+
+def configure(api_key: str) -> None:
+    """remember the api key, it's handed to the sdk once that gets loaded."""
+    global _api_key
+    with _lock:
+        _api_key = api_key
+        if _genai is not None:
+            _genai.configure(api_key=api_key)
+
+
+def load():
+    """import and configure the sdk once, returning the module. safe from any thread."""
+    global _genai
+    with _lock:
+        if _genai is None:
+            import google.generativeai as genai
+
+            if _api_key:
+                genai.configure(api_key=_api_key)
+            _genai = genai
+        return _genai
+
+
+def model(model_name: str):
+    """a genai.GenerativeModel for model_name."""
+    return load().GenerativeModel(model_name)
@@ -0,0 +1,143 @@
+"""persistent sqlite index of the library so repeat runs don't walk the whole tree."""
+
+import os
+import sqlite3
+import sys
+import pathlib
+from collections import defaultdict
+from typing import Iterator
+
+SCHEMA_VERSION = "2"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,          -- relative to root, '' is the root itself
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,          -- relative to root
+    dir TEXT NOT NULL,              -- relative dir the file was listed from
+    top_level TEXT NOT NULL,        -- first path component, the diversity bucket
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+"""
+
+
+def open_index(
+    index_path: pathlib.Path, root_dir: pathlib.Path, rebuild: bool = False
+) -> sqlite3.Connection:
+    """open (or create) the index db, wiping it if forced or built for another root."""
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(index_path)
+    conn.executescript(SCHEMA)
+
+    meta = dict(conn.execute("SELECT key, value FROM meta"))
+    stale = meta.get("root") != str(root_dir) or meta.get("version") != SCHEMA_VERSION
+    if rebuild or stale:
+        reason = "forced" if rebuild else "root/schema changed"
+        print(f"rebuilding index at {index_path} ({reason})", file=sys.stderr)
+        with conn:
+            conn.execute("DELETE FROM files")
+            conn.execute("DELETE FROM dirs")
+            conn.execute("DELETE FROM meta")
+            conn.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [("root", str(root_dir)), ("version", SCHEMA_VERSION)],
+            )
+    return conn
+
+
+def _scan_dir(
+    abs_dir: str, rel_dir: str
+) -> tuple[list[str], list[tuple[str, str, str, int, int]]]:
+    """list one directory, returning (subdir relpaths, file rows)."""
+    subdirs = []
+    rows = []
+    with os.scandir(abs_dir) as it:
+        for entry in it:
+            if entry.name.startswith("."):
+                continue  # hidden files and whole hidden subtrees are never indexed
+            rel = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            try:
+                # don't follow dir symlinks, do follow file ones
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(rel)
+                elif entry.is_file():
+                    st = entry.stat()
+                    top_level = rel.split(os.sep, 1)[0]
+                    rows.append((rel, rel_dir, top_level, st.st_size, st.st_mtime_ns))
+            except OSError as e:
+                print(f"warning: could not stat {entry.path}: {e}", file=sys.stderr)
+    return subdirs, rows
+
+
+def refresh_index(conn: sqlite3.Connection, root_dir: pathlib.Path) -> int:
+    """bring the index up to date, only relisting directories whose mtime changed.
+
+    adding/removing/renaming an entry bumps its parent dir's mtime, so an
+    unchanged dir can reuse its indexed children and only needs a single stat.
+    returns the number of directories that were actually relisted.
+    """
+    known_dirs = dict(conn.execute("SELECT path, mtime_ns FROM dirs"))
+    children = defaultdict(list)
+    for d in known_dirs:
+        if d:
+            children[os.path.dirname(d)].append(d)
+
+    root = str(root_dir)
+    seen = set()
+    rescanned = 0
+    stack = [""]
+    with conn:
+        while stack:
+            rel_dir = stack.pop()
+            abs_dir = os.path.join(root, rel_dir) if rel_dir else root
+            try:
+                # stat before listing so changes made mid-scan are caught next run
+                mtime_ns = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                continue  # vanished since its parent was listed, purged below
+            seen.add(rel_dir)
+
+            if known_dirs.get(rel_dir) == mtime_ns:
+                stack.extend(children[rel_dir])
+                continue
+
+            try:
+                subdirs, rows = _scan_dir(abs_dir, rel_dir)
+            except OSError as e:
+                print(f"warning: could not list {abs_dir}: {e}", file=sys.stderr)
+                continue
+            rescanned += 1
+            conn.execute("DELETE FROM files WHERE dir = ?", (rel_dir,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (path, dir, top_level, size, mtime_ns)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)",
+                (rel_dir, mtime_ns),
+            )
+            stack.extend(subdirs)
+
+        gone = [(d,) for d in known_dirs if d not in seen]
+        conn.executemany("DELETE FROM files WHERE dir = ?", gone)
+        conn.executemany("DELETE FROM dirs WHERE path = ?", gone)
+
+    print(
+        f"index refreshed: relisted {rescanned}/{len(seen)} dirs, dropped {len(gone)}",
+        file=sys.stderr,
+    )
+    return rescanned
+
+
+def iter_indexed_files(conn: sqlite3.Connection) -> Iterator[tuple[str, str]]:
+    """yield (top_level, relpath) for every indexed file."""
+    yield from conn.execute("SELECT top_level, path FROM files")
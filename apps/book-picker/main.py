@@ -1,15 +1,29 @@
 #!/usr/bin/env python3
 
 import os
+import json
+import queue
+import math
 import random
 import pathlib
 import urllib.parse
 import requests
 import sys
-import re
-import google.generativeai as genai
 import time
+import re
+import heapq
+import itertools
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+import discord_webhook
+import gemini
+import library_index
+import path_filter
+import pick_history
+import review_cache
 
 # --- Configuration ---
 ROOT_DIR = pathlib.Path(os.getenv("ROOT_DIR", "/data/books")).resolve()
@@ -19,42 +33,388 @@ N_FILES = int(os.getenv("N_FILES", "5"))
 PATTERN = os.getenv("PATTERN", "")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
+INDEX_PATH = os.getenv("INDEX_PATH", "")  # sqlite index file, empty = walk every run
+REBUILD_INDEX = os.getenv("REBUILD_INDEX", "").lower() in ("1", "true", "yes")
+SELECT_STRATEGY = os.getenv("SELECT_STRATEGY", "grouped").lower()
+PICK_HISTORY_PATH = os.getenv("PICK_HISTORY_PATH", "")  # pick log, empty = no history
+# weighted strategy: uniform, size or sqrt(size) per top-level item
+BUCKET_WEIGHT = os.getenv("BUCKET_WEIGHT", "sqrt").lower()
+RECENCY_HALF_LIFE_DAYS = float(os.getenv("RECENCY_HALF_LIFE_DAYS", "60"))
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "1"))  # >1 walks top dirs in parallel
+SCAN_BATCH = 64  # files per hand-over from a parallel walker
+REVIEW_CONCURRENCY = int(os.getenv("REVIEW_CONCURRENCY", "4"))  # parallel gemini calls
+# single: one gemini call per book, batch: one call for all books (per-book fallback)
+REVIEW_MODE = os.getenv("REVIEW_MODE", "single").lower()
+REVIEW_CACHE_PATH = os.getenv("REVIEW_CACHE_PATH", "")  # sqlite file, empty = no cache
+REVIEW_CACHE_TTL_DAYS = float(os.getenv("REVIEW_CACHE_TTL_DAYS", "30"))
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "5000"))
+# chance a cached review is reused instead of regenerated, <1 keeps some variety
+REVIEW_CACHE_REUSE = float(os.getenv("REVIEW_CACHE_REUSE", "0.8"))
+# messages: intro + one message per book, embeds: books packed 10 embeds per message
+POST_MODE = os.getenv("POST_MODE", "messages").lower()
+# stdout/json: print what would be posted instead of calling the webhook
+DRY_RUN = os.getenv("DRY_RUN", "").lower()
+
+# grouped: keep every candidate per bucket, then pick (simple, O(files) memory)
+# reservoir: keep one running pick per bucket while streaming (O(buckets) memory)
+# lazy: list the top level only, sample buckets, then walk just the sampled ones
+# weighted: like reservoir, but buckets weighted by size and recent picks down-weighted
+SELECT_STRATEGIES = ("grouped", "reservoir", "lazy", "weighted")
+BUCKET_WEIGHTS = {"uniform": 0.0, "size": 1.0, "sqrt": 0.5}  # exponent on file count
+# recently picked files keep at least this much weight, so a bucket never runs dry
+MIN_RECENCY_WEIGHT = 0.01
 
 
 # --- Core Logic ---
 
 
-def get_all_files(
-    root_dir: pathlib.Path, pattern: re.Pattern | None = None
-) -> list[pathlib.Path]:
-    """recursively find all files, optionally matching a pattern."""
-    print(f"scanning {root_dir} for files", file=sys.stderr)
-    # using rglob('*') is fine, filter later
-    all_files = [
-        p for p in root_dir.rglob("*") if p.is_file() and not p.name.startswith(".")
-    ]
-    print(f"found {len(all_files)} total files", file=sys.stderr)
+def _walk(
+    root: str,
+    stack: list[tuple[str, str]],
+    deferred_dirs: list[tuple[str, str]] | None = None,
+    keep_dir: Callable[[str], bool] | None = None,
+) -> Iterator[tuple[str, str]]:
+    """os.scandir walk from (relative dir, top-level bucket) starting points.
+
+    dirent type info decides dir vs file without an extra stat, hidden dirs are
+    pruned without descending into them, and the top-level bucket is carried
+    down instead of recomputed per file. if deferred_dirs is given, subdirs are
+    collected there instead of being descended into. keep_dir(relpath) returning
+    False prunes a subdir before it's ever listed.
+    """
+    pending = stack if deferred_dirs is None else deferred_dirs
+    while stack:
+        rel_dir, top_level = stack.pop()
+        try:
+            it = os.scandir(os.path.join(root, rel_dir) if rel_dir else root)
+        except OSError as e:
+            print(f"warning: could not list {rel_dir or root}: {e}", file=sys.stderr)
+            continue
+        with it:
+            for entry in it:
+                name = entry.name
+                if name.startswith("."):
+                    continue
+                rel = f"{rel_dir}{os.sep}{name}" if rel_dir else name
+                try:
+                    # don't follow dir symlinks (like rglob), do follow file ones
+                    if entry.is_dir(follow_symlinks=False):
+                        if keep_dir is None or keep_dir(rel):
+                            pending.append((rel, top_level or name))
+                    elif entry.is_file():
+                        yield top_level or name, rel
+                except OSError:
+                    continue  # broken entry, nothing to pick anyway
+
+
+def scan_files(
+    root_dir: pathlib.Path,
+    workers: int = 1,
+    keep_dir: Callable[[str], bool] | None = None,
+) -> Iterator[tuple[str, str]]:
+    """stream (top_level, relpath) for every non-hidden file under root_dir.
+
+    with workers > 1 each top-level dir is walked on its own thread, which hides
+    per-directory latency on network storage. output order is then arbitrary.
+    subdirs keep_dir rejects are skipped without listing them.
+    """
+    root = str(root_dir)
+    if workers <= 1:
+        yield from _walk(root, [("", "")], keep_dir=keep_dir)
+        return
+
+    top_dirs = []
+    yield from _walk(root, [("", "")], deferred_dirs=top_dirs, keep_dir=keep_dir)
 
-    if not all_files:
-        return []  # handle empty dir case gracefully
+    # workers hand over small batches through a bounded queue, so memory stays
+    # O(workers) however big the tree is and however slowly it's consumed
+    batches: queue.Queue = queue.Queue(maxsize=workers)
+    stop = threading.Event()
 
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False  # consumer went away
+
+    def walk_one(d: tuple[str, str]) -> None:
+        try:
+            batch = []
+            for item in _walk(root, [d], keep_dir=keep_dir):
+                batch.append(item)
+                if len(batch) >= SCAN_BATCH:
+                    if not put(batch):
+                        return
+                    batch = []
+            if batch:
+                put(batch)
+        except Exception as e:
+            put(e)
+        finally:
+            put(None)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+    try:
+        for d in top_dirs:
+            pool.submit(walk_one, d)
+        remaining = len(top_dirs)
+        while remaining:
+            batch = batches.get()
+            if batch is None:
+                remaining -= 1
+            elif isinstance(batch, Exception):
+                raise batch
+            else:
+                yield from batch
+    finally:
+        stop.set()
+        pool.shutdown(cancel_futures=True)
+
+
+def _iter_index(
+    root_dir: pathlib.Path, index_path: pathlib.Path, rebuild: bool = False
+) -> Iterator[tuple[str, str]]:
+    """refresh the on-disk index and stream (top_level, relpath) out of it."""
+    conn = library_index.open_index(index_path, root_dir, rebuild=rebuild)
+    try:
+        library_index.refresh_index(conn, root_dir)
+        yield from library_index.iter_indexed_files(conn)
+    finally:
+        conn.close()
+
+
+def _dir_pruner(
+    matcher: path_filter.PathFilter, prefix: str
+) -> Callable[[str], bool] | None:
+    """keep_dir callback for the walkers, None if the pattern can't prune anything."""
+    if matcher.prefixes is None:
+        return None
+    return lambda rel: matcher.may_contain(prefix + rel + os.sep)
+
+
+def iter_candidates(
+    root_dir: pathlib.Path,
+    pattern: re.Pattern | None = None,
+    index_path: pathlib.Path | None = None,
+    rebuild_index: bool = False,
+    scan_workers: int = 1,
+) -> Iterator[tuple[str, str]]:
+    """stream (top_level, relpath) candidates from a walk or the index, pattern-filtered.
+
+    when walking, directories the pattern can't match anything under aren't listed
+    at all, so they don't count towards the total either.
+    """
+    # pattern still sees the full path string as before, just without a Path per file
+    prefix = os.path.join(str(root_dir), "")
+    matcher = path_filter.PathFilter(pattern) if pattern else None
     if pattern:
         print(f"filtering with pattern: {pattern.pattern}", file=sys.stderr)
-        # use full path string for pattern matching as before
-        filtered_files = [p for p in all_files if pattern.search(str(p))]
+
+    if index_path:
+        print(f"using index {index_path} for {root_dir}", file=sys.stderr)
+        entries = _iter_index(root_dir, index_path, rebuild=rebuild_index)
+    else:
         print(
-            f"kept {len(filtered_files)}/{len(all_files)} files after filter",
-            file=sys.stderr,
+            f"scanning {root_dir} for files ({scan_workers} workers)", file=sys.stderr
         )
-        return filtered_files
-    else:
-        return all_files
+        entries = scan_files(
+            root_dir,
+            workers=scan_workers,
+            keep_dir=_dir_pruner(matcher, prefix) if matcher else None,
+        )
+
+    total = kept = 0
+    for top_level, rel in entries:
+        total += 1
+        if matcher is None or matcher.match(prefix + rel):
+            kept += 1
+            yield top_level, rel
+
+    print(f"found {total} total files", file=sys.stderr)
+    if pattern:
+        print(f"kept {kept}/{total} files after filter", file=sys.stderr)
+
+
+def get_all_files(
+    root_dir: pathlib.Path, pattern: re.Pattern | None = None, scan_workers: int = 1
+) -> list[pathlib.Path]:
+    """recursively find all files, optionally matching a pattern."""
+    return [
+        root_dir / rel
+        for _, rel in iter_candidates(root_dir, pattern, scan_workers=scan_workers)
+    ]
+
+
+def reservoir_by_bucket(
+    entries: Iterable[tuple[str, str]], rng: random.Random = random
+) -> dict[str, str]:
+    """keep one uniformly random relpath per top-level bucket from a stream.
+
+    size-1 reservoir per bucket: the k-th file seen in a bucket replaces the
+    held pick with probability 1/k, so every file in the bucket ends up equally
+    likely without ever holding more than one of them.
+    """
+    picks = {}
+    counts = {}
+    for top_level, rel in entries:
+        k = counts.get(top_level, 0) + 1
+        counts[top_level] = k
+        if k == 1 or rng.randrange(k) == 0:
+            picks[top_level] = rel
+    return picks
+
+
+def weighted_by_bucket(
+    entries: Iterable[tuple[str, str]],
+    weight_of: Callable[[str], float],
+    rng: random.Random = random,
+) -> dict[str, tuple[str, int, float]]:
+    """keep one weighted random relpath per bucket from a stream.
+
+    returns top_level -> (pick, file count, summed file weight). a size-1
+    weighted reservoir: each file replaces the held pick with probability
+    weight / weight seen so far in its bucket, which ends up picking every file
+    proportionally to its weight in one pass and O(buckets) memory.
+    """
+    picks = {}
+    for top_level, rel in entries:
+        w = weight_of(rel)
+        pick, count, total = picks.get(top_level, (rel, 0, 0.0))
+        total += w
+        if rng.random() * total < w:
+            pick = rel
+        picks[top_level] = (pick, count + 1, total)
+    return picks
+
+
+def sample_weighted(
+    weights: dict[str, float], k: int, rng: random.Random = random
+) -> list[str]:
+    """k distinct keys, drawn one after another proportionally to weight.
+
+    efraimidis-spirakis: every key gets log(u) / weight for a uniform u and the
+    k largest win, which is the same distribution as repeated weighted draws
+    without replacement in O(keys log k).
+    """
+    keyed = (
+        (math.log(1.0 - rng.random()) / w, key) for key, w in weights.items() if w > 0
+    )
+    return [key for _, key in heapq.nlargest(k, keyed)]
+
+
+def iter_lazy_picks(
+    root_dir: pathlib.Path,
+    n_files_requested: int,
+    pattern: re.Pattern | None = None,
+    rng: random.Random = random,
+) -> Iterator[str]:
+    """pick up to n relpaths from distinct top-level items without a full walk.
+
+    top-level entries are shuffled and walked one at a time until n of them
+    turned out non-empty (after the pattern). taking the first n non-empty
+    entries of a random permutation is a uniform sample of the non-empty
+    buckets, so this matches the other strategies' distribution while only
+    touching roughly n subtrees. each pick is yielded as soon as it's found.
+    """
+    root = str(root_dir)
+    prefix = os.path.join(root, "")
+    matcher = path_filter.PathFilter(pattern) if pattern else None
+    keep_dir = _dir_pruner(matcher, prefix) if matcher else None
+    # only list the top level, subtrees are walked on demand below
+    top_dirs = []
+    top_files = list(_walk(root, [("", "")], deferred_dirs=top_dirs, keep_dir=keep_dir))
+    top_level_items = [(name, True) for name, _ in top_dirs]
+    top_level_items += [(name, False) for name, _ in top_files]
+    rng.shuffle(top_level_items)
+    print(
+        f"lazy selection over {len(top_level_items)} top-level items", file=sys.stderr
+    )
+
+    found = 0
+    walked = 0
+    for top_level, is_dir in top_level_items:
+        if found >= n_files_requested:
+            break
+        walked += 1
+        if is_dir:
+            entries = _walk(root, [(top_level, top_level)], keep_dir=keep_dir)
+        else:
+            entries = [(top_level, top_level)]
+        if matcher:
+            entries = (e for e in entries if matcher.match(prefix + e[1]))
+        pick = reservoir_by_bucket(entries, rng).get(top_level)
+        if pick is None:
+            print(
+                f"top-level item {top_level} is empty or filtered out, trying another",
+                file=sys.stderr,
+            )
+            continue
+        found += 1
+        yield pick
+
+    print(f"walked {walked}/{len(top_level_items)} top-level items", file=sys.stderr)
 
 
 def select_diverse_files(
-    root_dir: pathlib.Path, n_files_requested: int, pattern_str: str = ""
+    root_dir: pathlib.Path,
+    n_files_requested: int,
+    pattern_str: str = "",
+    index_path: pathlib.Path | None = None,
+    rebuild_index: bool = False,
+    strategy: str = "grouped",
+    scan_workers: int = 1,
+    history: pick_history.PickHistory | None = None,
+    bucket_weight: str = "sqrt",
+    recency_half_life_days: float = 60.0,
 ) -> list[pathlib.Path]:
     """select n_files with diversity across top-level directories/files."""
+    return list(
+        iter_diverse_files(
+            root_dir,
+            n_files_requested,
+            pattern_str,
+            index_path,
+            rebuild_index,
+            strategy,
+            scan_workers,
+            history=history,
+            bucket_weight=bucket_weight,
+            recency_half_life_days=recency_half_life_days,
+        )
+    )
+
+
+def iter_diverse_files(
+    root_dir: pathlib.Path,
+    n_files_requested: int,
+    pattern_str: str = "",
+    index_path: pathlib.Path | None = None,
+    rebuild_index: bool = False,
+    strategy: str = "grouped",
+    scan_workers: int = 1,
+    history: pick_history.PickHistory | None = None,
+    bucket_weight: str = "sqrt",
+    recency_half_life_days: float = 60.0,
+) -> Iterator[pathlib.Path]:
+    """streaming select_diverse_files: the lazy strategy yields each pick as soon
+    as its subtree was walked, the others yield everything once the scan is done.
+
+    history, bucket_weight and recency_half_life_days only apply to the weighted
+    strategy, which picks a bucket with probability ~ file count ** exponent times
+    the mean recency weight of its files, then a file by its recency weight.
+    """
+    if strategy not in SELECT_STRATEGIES:
+        sys.exit(
+            f"invalid selection strategy '{strategy}', expected one of {SELECT_STRATEGIES}"
+        )
+    if strategy == "weighted" and bucket_weight not in BUCKET_WEIGHTS:
+        sys.exit(
+            f"invalid bucket weight '{bucket_weight}', expected one of {tuple(BUCKET_WEIGHTS)}"
+        )
+
     pattern = None
     if pattern_str:
         try:
@@ -62,38 +422,82 @@ def select_diverse_files(
         except re.error as e:
             sys.exit(f"invalid regex pattern: {e}")
 
-    candidate_files = get_all_files(root_dir, pattern)
-    if not candidate_files:
-        sys.exit(
-            f"be real: no files found"
-            + (f" matching pattern '{pattern_str}'" if pattern_str else "")
+    if strategy == "lazy" and index_path:
+        # the index already has every file without touching the library
+        print(
+            "index configured, using reservoir over it instead of lazy walks",
+            file=sys.stderr,
         )
+        strategy = "reservoir"
 
-    # map top-level entry -> list of candidate files within it
-    top_level_to_files = defaultdict(list)
-
-    for file_path in candidate_files:
-        try:
-            relative_path = file_path.relative_to(root_dir)
-            # top-level item is the first part of the relative path, or the file itself if directly in root
-            top_level_part = relative_path.parts[0]
-            top_level_item = root_dir / top_level_part
-            top_level_to_files[top_level_item].append(file_path)
-        except (ValueError, IndexError) as e:
-            # valueerror if not relative (shouldn't happen), indexerror if parts is empty (also shouldn't happen for file inside)
+    if strategy == "lazy":
+        found = 0
+        for rel in iter_lazy_picks(root_dir, n_files_requested, pattern):
+            found += 1
+            yield root_dir / rel
+        if not found:
+            sys.exit(
+                f"be real: no files found"
+                + (f" matching pattern '{pattern_str}'" if pattern_str else "")
+            )
+        if found < n_files_requested:
             print(
-                f"warning: skipped file with unexpected path structure: {file_path} ({e})",
+                f"warning: only {found} eligible top-level sources available, selecting one from each.",
                 file=sys.stderr,
             )
-            continue  # skip this file
+        return
+
+    candidates = iter_candidates(
+        root_dir, pattern, index_path, rebuild_index, scan_workers
+    )
+    # distinct buckets, uniformly unless the weighted strategy swaps this out
+    sample_buckets = random.sample
+    if strategy == "reservoir":
+        # file is picked per bucket while streaming, sampling buckets below is the same
+        picks = reservoir_by_bucket(candidates)
+        eligible_top_level_items = list(picks)
+        pick_from = picks.__getitem__
+    elif strategy == "weighted":
+        last_picked = history.last_picked if history else {}
+        half_life = recency_half_life_days * 86400
+        now = time.time()
+
+        def weight_of(rel: str) -> float:
+            ts = last_picked.get(rel)
+            if ts is None:
+                return 1.0  # the common case, never picked (or long enough ago)
+            factor = pick_history.recency_factor(now - ts, half_life)
+            return max(factor, MIN_RECENCY_WEIGHT)
+
+        weighted = weighted_by_bucket(candidates, weight_of)
+        exponent = BUCKET_WEIGHTS[bucket_weight]
+        bucket_weights = {
+            key: count**exponent * (total / count)
+            for key, (_, count, total) in weighted.items()
+        }
+        eligible_top_level_items = list(weighted)
+
+        def pick_from(key: str) -> str:
+            return weighted[key][0]
 
-    eligible_top_level_items = dict(
-        top_level_to_files
-    )  # convert back from defaultdict for sampling
+        def sample_buckets(keys: list[str], k: int) -> list[str]:
+            return sample_weighted(bucket_weights, k)
+
+    else:
+        # map top-level entry -> list of candidate relpaths within it
+        top_level_to_files = defaultdict(list)
+        for top_level, rel in candidates:
+            top_level_to_files[top_level].append(rel)
+        eligible_top_level_items = list(top_level_to_files)
+
+        def pick_from(key: str) -> str:
+            return random.choice(top_level_to_files[key])
 
     if not eligible_top_level_items:
-        # this case *shouldn't* be reachable if candidate_files is not empty, but belt and suspenders
-        sys.exit(f"be real: no top-level items seem to contain the candidate files?")
+        sys.exit(
+            f"be real: no files found"
+            + (f" matching pattern '{pattern_str}'" if pattern_str else "")
+        )
 
     num_eligible = len(eligible_top_level_items)
     print(
@@ -112,32 +516,12 @@ def select_diverse_files(
         )
 
     # sample n_to_select distinct top-level items
-    sampled_top_level_keys = random.sample(
-        list(eligible_top_level_items.keys()), n_to_select
-    )
+    sampled_top_level_keys = sample_buckets(eligible_top_level_items, n_to_select)
 
-    # for each sampled top-level item, pick one random file from its list
-    chosen_files = []
+    # one random file per sampled top-level item
+    # only the chosen few ever become Path objects
     for key in sampled_top_level_keys:
-        possible_files_in_item = eligible_top_level_items[key]
-        if possible_files_in_item:  # should always be true based on construction
-            selected_file = random.choice(possible_files_in_item)
-            chosen_files.append(selected_file)
-        else:
-            # this indicates a logic error somewhere above
-            print(
-                f"warning: sampled top-level item {key} had no files associated? skipping.",
-                file=sys.stderr,
-            )
-
-    if len(chosen_files) != n_to_select:
-        # again, indicates something funky happened
-        print(
-            f"warning: ended up with {len(chosen_files)} files, expected {n_to_select}. check logic.",
-            file=sys.stderr,
-        )
-
-    return chosen_files
+        yield root_dir / pick_from(key)
 
 
 # --- Helper Functions ---
@@ -155,139 +539,552 @@ def file_url(path: pathlib.Path, root_dir: pathlib.Path, base_url: str) -> str:
         return str(path)  # fallback, maybe not ideal
 
 
-def get_gemini_review(rel_path_str: str, model_name: str) -> str:
+# bump whenever the prompts change so cached reviews from old prompts aren't reused
+PROMPT_VERSION = "1"
+REVIEW_FAILED_PREFIX = "(review generation"  # placeholder texts, never cached
+PERSONA = "eigenrobot (detached, critical, +2sd ai; lowercase, abbr., millennial/zoomer slang mix)"
+
+
+def _response_text(response) -> tuple[str | None, str]:
+    """pull the text out of a gemini response, or (None, reason) if there is none."""
+    # consolidating the response checking logic slightly
+    if response.parts and hasattr(response.parts[0], "text") and response.parts[0].text:
+        return response.text.strip(), ""
+
+    reason = "unknown"
+    if response.prompt_feedback and response.prompt_feedback.block_reason:
+        reason = f"prompt blocked ({response.prompt_feedback.block_reason})"
+    elif not response.parts:
+        reason = "empty response parts"
+    elif not hasattr(response.parts[0], "text"):
+        reason = "response part has no text attribute"
+    elif not response.parts[0].text:
+        reason = "response text is empty"
+    # check for finish reason if available
+    if hasattr(response, "candidates") and response.candidates:
+        finish_reason = response.candidates[0].finish_reason
+        if finish_reason != 1:  # 1 is typically "STOP"
+            reason += f" (finish reason: {finish_reason})"
+    return None, reason
+
+
+def get_gemini_review(rel_path_str: str, model_name: str, model=None) -> str:
     """gets a review using the gemini api."""
     # reusing your function, looks fine. maybe make model configurable via env var too.
-    # added model_name param
-    model = genai.GenerativeModel(model_name)
+    # added model_name param, model can also be passed in directly (e.g. a stub in tests)
+    if model is None:
+        model = gemini.model(model_name)
 
     # slight tweak to the prompt to be more explicitly eigenrobot-y upfront
     prompt = f"""
-    **persona**: eigenrobot (detached, critical, +2sd ai; lowercase, abbr., millennial/zoomer slang mix).
+    **persona**: {PERSONA}.
     **task**: provide concise commentary/review (max 5 sentences) for book implied by filepath: '{rel_path_str}'.
     **output**: review text, ending with 'rating: x/10'. if unsure about title/content, briefly speculate or decline. just output the review/rating.
     """
     try:
         response = model.generate_content(
             prompt,
-            generation_config=genai.types.GenerationConfig(temperature=0.75),
+            generation_config={"temperature": 0.75},
             # consider adding safety_settings if needed, though default might be fine
         )
-
-        # consolidating the response checking logic slightly
-        if (
-            response.parts
-            and hasattr(response.parts[0], "text")
-            and response.parts[0].text
-        ):
-            return response.text.strip()
-        else:
-            reason = "unknown"
-            if response.prompt_feedback and response.prompt_feedback.block_reason:
-                reason = f"prompt blocked ({response.prompt_feedback.block_reason})"
-            elif not response.parts:
-                reason = "empty response parts"
-            elif not hasattr(response.parts[0], "text"):
-                reason = "response part has no text attribute"
-            elif not response.parts[0].text:
-                reason = "response text is empty"
-            # check for finish reason if available
-            if hasattr(response, "candidates") and response.candidates:
-                finish_reason = response.candidates[0].finish_reason
-                if finish_reason != 1:  # 1 is typically "STOP"
-                    reason += f" (finish reason: {finish_reason})"
-
-            return f"(review generation blocked/empty: {reason})"
+        text, reason = _response_text(response)
+        if text is None:
+            return f"{REVIEW_FAILED_PREFIX} blocked/empty: {reason})"
+        return text
 
     except Exception as e:
         print(f"gemini api call failed for {rel_path_str}: {e}", file=sys.stderr)
         # include exception type for better debugging
-        return f"(review generation failed: {type(e).__name__})"
+        return f"{REVIEW_FAILED_PREFIX} failed: {type(e).__name__})"
 
 
-# --- Main Execution ---
+def parse_batched_reviews(text: str, rel_path_strs: list[str]) -> dict[str, str]:
+    """map relpath -> review from a batched json reply, dropping anything malformed.
 
+    tolerates code fences or chatter around the array. entries are matched by
+    their path; if the model mangled a path but returned exactly one entry per
+    book, the entry's position is used instead.
+    """
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        return {}
+    try:
+        data = json.loads(text[start : end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, list):
+        return {}
 
-def main():
-    # --- Sanity Checks ---
-    if not WEBHOOK:
-        sys.exit("lol no webhook")
-    if not GEMINI_API_KEY:
-        sys.exit("lol no gemini api key")
-    if not ROOT_DIR.is_dir():
-        sys.exit(f"be real: root dir '{ROOT_DIR}' not found or not a directory")
+    wanted = set(rel_path_strs)
+    positional = len(data) == len(rel_path_strs)
+    reviews = {}
+    for i, item in enumerate(data):
+        if isinstance(item, dict):
+            path, review = item.get("path"), item.get("review")
+        elif isinstance(item, str):
+            path, review = None, item  # bare array of reviews, position is all we have
+        else:
+            continue
+        if not isinstance(review, str) or not review.strip():
+            continue
+        if path not in wanted:
+            if not positional:
+                continue
+            path = rel_path_strs[i]
+        reviews.setdefault(path, review.strip())
+    return reviews
 
-    genai.configure(api_key=GEMINI_API_KEY)
 
-    chosen = select_diverse_files(ROOT_DIR, N_FILES, PATTERN)
+def get_gemini_reviews_batched(
+    rel_path_strs: list[str], model_name: str, model=None, concurrency: int = 1
+) -> list[str]:
+    """review every book in one request, in input order.
 
-    if not chosen:
-        print("no files selected, exiting.", file=sys.stderr)
-        sys.exit(0)  # maybe not an error state if filtering just yielded nothing
+    books whose entry comes back missing or malformed are re-requested with
+    per-book get_gemini_review calls (up to `concurrency` at a time).
+    """
+    if model is None:
+        model = gemini.model(model_name)
 
-    print(
-        f"selected {len(chosen)} files from distinct top-level sources:",
-        file=sys.stderr,
-    )
-    for f in chosen:
-        try:
-            print(f" - {f.relative_to(ROOT_DIR)}", file=sys.stderr)
-        except ValueError:
-            print(f" - {f} (could not make relative)", file=sys.stderr)
-
-    # send intro message
-    intro_payload = {
-        "content": f"📚 **{len(chosen)} random book picks incoming** (via eigenrobot)"
-    }
+    prompt = f"""
+    **persona**: {PERSONA}.
+    **task**: for each filepath in the list below, provide concise commentary/review (max 5 sentences) for the book it implies.
+    **output**: a json array with exactly one object per filepath, in the same order: {{"path": "<filepath exactly as given>", "review": "<review text ending with 'rating: x/10'>"}}. if unsure about a title/content, briefly speculate or decline inside the review. output only the json.
+    **filepaths**: {json.dumps(rel_path_strs, ensure_ascii=False)}
+    """
+    reviews = {}
     try:
-        print(f"posting intro message to webhook", file=sys.stderr)
-        resp = requests.post(WEBHOOK, json=intro_payload, timeout=15)
-        resp.raise_for_status()
+        response = model.generate_content(
+            prompt,
+            generation_config={
+                "temperature": 0.75,
+                "response_mime_type": "application/json",
+            },
+        )
+        text, reason = _response_text(response)
+        if text is None:
+            print(f"batched review blocked/empty: {reason}", file=sys.stderr)
+        else:
+            reviews = parse_batched_reviews(text, rel_path_strs)
+    except Exception as e:
+        print(f"batched gemini api call failed: {e}", file=sys.stderr)
+
+    missing = [r for r in rel_path_strs if r not in reviews]
+    if missing:
         print(
-            f"intro message sent - webhook responded {resp.status_code}",
+            f"batched review missing {len(missing)}/{len(rel_path_strs)} entries, "
+            "falling back to per-book calls",
             file=sys.stderr,
         )
-    except requests.exceptions.RequestException as e:
-        sys.exit(f"failed to send intro message: {e}")
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            fallback = pool.map(
+                lambda r: get_gemini_review(r, model_name, model=model), missing
+            )
+            reviews.update(zip(missing, fallback))
+
+    return [reviews[r] for r in rel_path_strs]
+
+
+def submit_review(
+    rel_path_str: str,
+    pool: ThreadPoolExecutor,
+    model_name: str,
+    cache: review_cache.ReviewCache | None = None,
+    model=None,
+) -> Callable[[], str]:
+    """start one book's review on pool (or take it from the cache).
+
+    returns a getter that blocks until the review is ready and stores new ones
+    in the cache.
+    """
+    if cache:
+        cached = cache.get(rel_path_str, model_name, PROMPT_VERSION)
+        if cached is not None:
+            print(f"review cache: reusing review for {rel_path_str}", file=sys.stderr)
+            return lambda: cached
 
-    # small delay to help discord message ordering
-    time.sleep(1)
+    future = pool.submit(get_gemini_review, rel_path_str, model_name, model=model)
 
-    # send one message per book
-    for i, p in enumerate(chosen):
-        rel_path = p.relative_to(ROOT_DIR)
-        rel_path_str = str(rel_path)
-        url = file_url(p, ROOT_DIR, BASE_URL)
+    def review() -> str:
+        text = future.result()
+        if cache and not text.startswith(REVIEW_FAILED_PREFIX):
+            cache.put(rel_path_str, model_name, PROMPT_VERSION, text)
+        return text
+
+    return review
+
+
+def start_batch_reviews(
+    rel_path_strs: list[str],
+    pool: ThreadPoolExecutor,
+    model_name: str,
+    concurrency: int = 1,
+    cache: review_cache.ReviewCache | None = None,
+    model=None,
+) -> Callable[[int], str]:
+    """start one batched review request on pool, returning review_for(i) for the i-th path.
+
+    cached reviews are served without a model call, everything else goes into
+    the batch. review_for blocks until that book's review is ready and stores
+    new ones in the cache.
+    """
+    cached = {}
+    if cache:
+        for rel in rel_path_strs:
+            review = cache.get(rel, model_name, PROMPT_VERSION)
+            if review is not None:
+                cached[rel] = review
+        print(
+            f"review cache: reusing {len(cached)}/{len(rel_path_strs)} reviews",
+            file=sys.stderr,
+        )
+    to_generate = [rel for rel in rel_path_strs if rel not in cached]
+
+    # one request for everything, per-book fallbacks use the same concurrency cap
+    batch_future = None
+    if to_generate:
+        batch_future = pool.submit(
+            get_gemini_reviews_batched,
+            to_generate,
+            model_name,
+            model=model,
+            concurrency=concurrency,
+        )
+
+    def review_for(i: int) -> str:
+        rel = rel_path_strs[i]
+        if rel in cached:
+            return cached[rel]
+        review = batch_future.result()[to_generate.index(rel)]
+        if cache and not review.startswith(REVIEW_FAILED_PREFIX):
+            cache.put(rel, model_name, PROMPT_VERSION, review)
+        return review
+
+    return review_for
+
+
+def iter_submitted(
+    picks: Iterable[pathlib.Path],
+    pool: ThreadPoolExecutor,
+    mode: str,
+    model_name: str,
+    root_dir: pathlib.Path,
+    concurrency: int = 1,
+    cache: review_cache.ReviewCache | None = None,
+    model=None,
+) -> Iterator[tuple[pathlib.Path, Callable[[], str]]]:
+    """pair each pick with a getter for its review, requesting reviews as picks come in.
+
+    single mode submits a book's review the moment it's picked. batch mode needs
+    every path for its one request, so it waits for the selection to finish.
+    """
+    if mode == "batch":
+        chosen = list(picks)
+        for p in chosen:
+            print(f" - picked {p.relative_to(root_dir)}", file=sys.stderr)
+        review_for = start_batch_reviews(
+            [str(p.relative_to(root_dir)) for p in chosen],
+            pool,
+            model_name,
+            concurrency=concurrency,
+            cache=cache,
+            model=model,
+        )
+        for i, p in enumerate(chosen):
+            yield p, lambda i=i: review_for(i)
+        return
+
+    for p in picks:
+        rel = str(p.relative_to(root_dir))
+        print(f" - picked {rel}", file=sys.stderr)
+        yield p, submit_review(rel, pool, model_name, cache=cache, model=model)
+
+
+def run_in_background(items: Iterable, name: str = "pipeline") -> Iterator:
+    """drain `items` on a daemon thread and yield them here as they arrive.
+
+    keeps selection and review submission going while the caller blocks on
+    posting. anything the producer raises (sys.exit included) is re-raised here.
+    """
+    results = queue.Queue()
+
+    def produce():
+        try:
+            for item in items:
+                results.put((True, item))
+        except BaseException as e:
+            results.put((False, e))
+        else:
+            results.put((False, None))
+
+    threading.Thread(target=produce, name=name, daemon=True).start()
+    while True:
+        ok, item = results.get()
+        if not ok:
+            if item is not None:
+                raise item
+            return
+        yield item
+
+
+def iter_reviewed(
+    pending: Iterable[tuple[pathlib.Path, Callable[[], str]]],
+    root_dir: pathlib.Path,
+    base_url: str,
+) -> Iterator[tuple[str, str, str]]:
+    """yield (title, url, review) per pick, in pick order, as each review is ready."""
+    for i, (p, review) in enumerate(pending):
+        print(
+            f"({i + 1}) waiting on gemini review for {p.relative_to(root_dir)}",
+            file=sys.stderr,
+        )
         title_guess = p.stem  # still a guess, but best we got easily
+        yield title_guess, file_url(p, root_dir, base_url), review()
+
 
+def post_as_messages(
+    webhook: discord_webhook.WebhookClient | discord_webhook.DryRunSink,
+    reviewed: Iterable[tuple[str, str, str]],
+    intro: str,
+    on_posted: Callable[[list[int]], None] | None = None,
+) -> int:
+    """intro message, then one plain message per book. returns books handled.
+
+    on_posted gets the pick-order indices of books whose message went out.
+    """
+    try:
+        print(f"posting intro message to webhook", file=sys.stderr)
+        resp = webhook.send({"content": intro})
         print(
-            f"({i + 1}/{len(chosen)}) getting gemini review for {rel_path_str}",
+            f"intro message sent - webhook responded {resp.status_code}",
             file=sys.stderr,
         )
-        review_text = get_gemini_review(rel_path_str, MODEL_NAME)
+    except requests.exceptions.RequestException as e:
+        sys.exit(f"failed to send intro message: {e}")
 
+    # send one message per book, in pick order, as soon as its review is in
+    count = 0
+    for title_guess, url, review_text in reviewed:
+        count += 1
         # format: title with masked link for discord
         # use > for blockquote on review as before
         content = f"**{title_guess}**\n<{url}>\n> {review_text}"
-
-        book_payload = {"content": content}
         try:
             print(f"posting review for {title_guess}", file=sys.stderr)
-            resp = requests.post(WEBHOOK, json=book_payload, timeout=15)
-            resp.raise_for_status()
+            resp = webhook.send({"content": content})
             print(
                 f"book message sent - webhook responded {resp.status_code}",
                 file=sys.stderr,
             )
+            if on_posted:
+                on_posted([count - 1])
         except requests.exceptions.RequestException as e:
             # don't exit script if one message fails, just log it
+            # already retried inside the client, skip and continue
             print(f"error sending book message for {title_guess}: {e}", file=sys.stderr)
-            # maybe add a retry later? for now, just skip and continue
+    return count
+
+
+def post_as_embeds(
+    webhook: discord_webhook.WebhookClient | discord_webhook.DryRunSink,
+    reviewed: Iterable[tuple[str, str, str]],
+    intro: str,
+    on_posted: Callable[[list[int]], None] | None = None,
+) -> int:
+    """intro plus one embed per book, packed into as few messages as discord allows.
+    returns books handled, on_posted gets the indices of each message's books."""
+    count = 0
+    for n, payload in enumerate(
+        discord_webhook.pack_embeds(
+            (discord_webhook.make_embed(*book) for book in reviewed), content=intro
+        )
+    ):
+        first = count
+        count += len(payload["embeds"])
+        try:
+            print(
+                f"posting message {n + 1} with {len(payload['embeds'])} embeds",
+                file=sys.stderr,
+            )
+            resp = webhook.send(payload)
+            print(
+                f"embed message sent - webhook responded {resp.status_code}",
+                file=sys.stderr,
+            )
+            if on_posted:
+                on_posted(list(range(first, count)))
+        except requests.exceptions.RequestException as e:
+            if n == 0:
+                sys.exit(f"failed to send first message: {e}")
+            print(f"error sending embed message {n + 1}: {e}", file=sys.stderr)
+    return count
+
+
+def run_pipeline(
+    picks: Iterable[pathlib.Path],
+    webhook: discord_webhook.WebhookClient | discord_webhook.DryRunSink,
+    pool: ThreadPoolExecutor,
+    intro: str,
+    root_dir: pathlib.Path,
+    base_url: str,
+    model_name: str,
+    review_mode: str = "single",
+    post_mode: str = "messages",
+    concurrency: int = 1,
+    cache: review_cache.ReviewCache | None = None,
+    model=None,
+    on_posted: Callable[[list[pathlib.Path]], None] | None = None,
+) -> int:
+    """stream picks -> reviews -> posts, returning the number of books posted.
+
+    selection and review requests run on a background thread, so the intro goes
+    out as soon as the first pick exists and each book is posted as soon as its
+    review is in, while later books are still being picked and reviewed.
+    returns 0 without posting anything if nothing was picked. on_posted gets
+    the picks of every message that actually went out.
+    """
+    pending = run_in_background(
+        iter_submitted(
+            picks,
+            pool,
+            review_mode,
+            model_name,
+            root_dir,
+            concurrency=concurrency,
+            cache=cache,
+            model=model,
+        )
+    )
+    first = next(pending, None)
+    if first is None:
+        return 0
+    picked = []  # in pick order, filled as posting reaches each book
+
+    def tracked(items):
+        for p, review in items:
+            picked.append(p)
+            yield p, review
+
+    def posted(indices: list[int]) -> None:
+        on_posted([picked[i] for i in indices])
+
+    reviewed = iter_reviewed(
+        tracked(itertools.chain([first], pending)), root_dir, base_url
+    )
+    post = post_as_embeds if post_mode == "embeds" else post_as_messages
+    return post(webhook, reviewed, intro, on_posted=posted if on_posted else None)
 
-        # small delay between messages to avoid discord rate limits
-        time.sleep(1)  # increased slightly jic
 
-    print(f"all {len(chosen)} book recommendations processed.", file=sys.stderr)
+# --- Main Execution ---
+
+
+def main():
+    # --- Sanity Checks ---
+    if not WEBHOOK and not DRY_RUN:
+        sys.exit("lol no webhook")
+    if not GEMINI_API_KEY:
+        sys.exit("lol no gemini api key")
+    if not ROOT_DIR.is_dir():
+        sys.exit(f"be real: root dir '{ROOT_DIR}' not found or not a directory")
+    if REVIEW_MODE not in ("single", "batch"):
+        sys.exit(f"lol unknown review mode '{REVIEW_MODE}', use 'single' or 'batch'")
+    if POST_MODE not in ("messages", "embeds"):
+        sys.exit(f"lol unknown post mode '{POST_MODE}', use 'messages' or 'embeds'")
+    if DRY_RUN and DRY_RUN not in discord_webhook.DRY_RUN_FORMATS:
+        sys.exit(f"lol unknown dry run format '{DRY_RUN}', use 'stdout' or 'json'")
+
+    # the sdk itself is only imported once the first review is requested
+    gemini.configure(GEMINI_API_KEY)
+
+    history = None
+    if PICK_HISTORY_PATH:
+        # ten half-lives out a pick's weight is back to ~1, no point keeping it
+        history = pick_history.PickHistory(
+            pathlib.Path(PICK_HISTORY_PATH),
+            horizon_seconds=RECENCY_HALF_LIFE_DAYS * 86400 * 10,
+        )
+        print(f"pick history: {len(history)} recent picks", file=sys.stderr)
+
+    # picks are streamed: the lazy strategy hands over each one as soon as it's
+    # found, the others once the scan is done
+    picks = iter_diverse_files(
+        ROOT_DIR,
+        N_FILES,
+        PATTERN,
+        index_path=pathlib.Path(INDEX_PATH) if INDEX_PATH else None,
+        rebuild_index=REBUILD_INDEX,
+        strategy=SELECT_STRATEGY,
+        scan_workers=SCAN_WORKERS,
+        history=history,
+        bucket_weight=BUCKET_WEIGHT,
+        recency_half_life_days=RECENCY_HALF_LIFE_DAYS,
+    )
+
+    # reviews are requested as books get picked and run while we post the intro
+    # and the earlier books. posting still follows pick order, so it stays deterministic
+    print(
+        f"picking up to {N_FILES} files, requesting gemini reviews as they come in "
+        f"({REVIEW_MODE} mode, {REVIEW_CONCURRENCY} at a time)",
+        file=sys.stderr,
+    )
+    review_pool = ThreadPoolExecutor(
+        max_workers=max(1, REVIEW_CONCURRENCY), thread_name_prefix="review"
+    )
+    # warm the sdk import up on a review thread while the library gets scanned
+    review_pool.submit(gemini.load)
+    # lazy picks are still coming in when the intro goes out, so N_FILES is only
+    # an upper bound there: a small library or empty folders can come up short
+    count = f"up to {N_FILES}"
+    if SELECT_STRATEGY != "lazy" or INDEX_PATH:
+        # these strategies hand everything over at once after the scan anyway
+        picks = list(picks)
+        count = len(picks)
+    cache = None
+    if REVIEW_CACHE_PATH:
+        cache = review_cache.ReviewCache(
+            pathlib.Path(REVIEW_CACHE_PATH),
+            ttl_seconds=REVIEW_CACHE_TTL_DAYS * 86400,
+            max_entries=REVIEW_CACHE_MAX_ENTRIES,
+            reuse_probability=REVIEW_CACHE_REUSE,
+        )
+
+    if DRY_RUN:
+        webhook = discord_webhook.DryRunSink(DRY_RUN)
+    else:
+        # one pooled connection, paced by discord's own rate limit headers
+        webhook = discord_webhook.WebhookClient(WEBHOOK)
+    intro = f"📚 **{count} random book picks incoming** (via eigenrobot)"
+
+    def record_posted(paths: list[pathlib.Path]) -> None:
+        # only books someone actually saw get down-weighted
+        history.record([str(p.relative_to(ROOT_DIR)) for p in paths])
+
+    try:
+        posted = run_pipeline(
+            picks,
+            webhook,
+            review_pool,
+            intro,
+            ROOT_DIR,
+            BASE_URL,
+            MODEL_NAME,
+            review_mode=REVIEW_MODE,
+            post_mode=POST_MODE,
+            concurrency=REVIEW_CONCURRENCY,
+            cache=cache,
+            on_posted=record_posted if history and not DRY_RUN else None,
+        )
+    finally:
+        # don't keep generating reviews nobody will post if we bailed out early
+        review_pool.shutdown(cancel_futures=True)
+        webhook.close()
+        if cache:
+            cache.close()
+
+    if not posted:
+        print("no files selected, exiting.", file=sys.stderr)
+        sys.exit(0)  # maybe not an error state if filtering just yielded nothing
+    print(f"all {posted} book recommendations processed.", file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,213 @@
+"""cheap prefilter in front of the PATTERN regex.
+
+the regex is parsed once and split into checks that are much cheaper than
+running it on every path:
+
+- prefixes: `^/data/books/Fiction` means every match starts with that text,
+  which also lets whole directories be pruned before they're listed
+- suffixes: `\\.(pdf|epub)$` is an extension allowlist
+- literals: fixed runs like `fiction` that have to appear somewhere in the path
+
+the checks are only necessary conditions, so anything they let through still
+goes to the regex, unless the pattern is nothing but one of them (`fiction`,
+`\\.pdf$`, `^/data/books/x`), in which case the regex is skipped entirely.
+anything the analysis doesn't understand just leaves more work for the regex.
+"""
+
+import re
+from typing import Callable
+
+try:
+    from re import _constants as sre
+    from re import _parser as sre_parse
+except ImportError:
+    # private cpython modules (sre_constants/sre_parse before 3.11), every
+    # PathFilter is then just pattern.search
+    sre = sre_parse = None
+
+# cap on expanded alternatives like `(a|b)(c|d)`, past that it's left to the regex
+MAX_ALTERNATIVES = 64
+
+
+def _strings(item) -> set[str] | None:
+    """every string a parsed item can match, if it's a small fixed set."""
+    op, av = item
+    if op is sre.LITERAL:
+        return {chr(av)}
+    if op is sre.IN:
+        if any(o is not sre.LITERAL for o, _ in av):
+            return None  # negated, ranges, \d and friends
+        return {chr(a) for _, a in av}
+    if op is sre.SUBPATTERN:
+        _, add_flags, del_flags, sub = av
+        if add_flags or del_flags:
+            return None  # (?i:...) and co change how the inside matches
+        return _sequence_strings(sub)
+    if op is sre.BRANCH:
+        out = set()
+        for sub in av[1]:
+            strings = _sequence_strings(sub)
+            if strings is None:
+                return None
+            out |= strings
+        return out if len(out) <= MAX_ALTERNATIVES else None
+    return None
+
+
+def _sequence_strings(items) -> set[str] | None:
+    out = {""}
+    for item in items:
+        strings = _strings(item)
+        if strings is None:
+            return None
+        out = {a + b for a in out for b in strings}
+        if len(out) > MAX_ALTERNATIVES:
+            return None
+    return out
+
+
+class PathFilter:
+    """pattern.search(path) with cheap checks in front, same results.
+
+    match(path) is the drop-in for bool(pattern.search(path)). case folding is only
+    done here for ascii text, anything else goes to the regex.
+    """
+
+    def __init__(self, pattern: re.Pattern):
+        self.pattern = pattern
+        self.ignorecase = bool(pattern.flags & re.IGNORECASE)
+        self._no_checks()
+        try:
+            # sre_parse is None without the private modules, that lands here too
+            parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+        except Exception:
+            parsed = None  # leave it all to the regex
+        if parsed is not None:
+            try:
+                self._analyze(list(parsed), parsed.state.flags)
+            except AttributeError:
+                # the parser's internals moved under us, throw away any half done checks
+                self._no_checks()
+        self.match = self._compile()
+
+    def _no_checks(self) -> None:
+        self.prefixes: tuple[str, ...] | None = None
+        self.suffixes: tuple[str, ...] | None = None
+        # `$` also matches right before a final newline
+        self.suffixes_newline: tuple[str, ...] = ()
+        self.literals: list[tuple[str, ...]] = []
+        self.exact = False
+
+    def _analyze(self, items: list, flags: int) -> None:
+        multiline = flags & re.MULTILINE
+        start_anchored = bool(items) and items[0] in (
+            (sre.AT, sre.AT_BEGINNING_STRING),
+            *(() if multiline else ((sre.AT, sre.AT_BEGINNING),)),
+        )
+        end_anchor = items[-1] if items else None
+        end_newline = not multiline and end_anchor == (sre.AT, sre.AT_END)
+        end_anchored = end_newline or end_anchor == (sre.AT, sre.AT_END_STRING)
+        body = items[int(start_anchored) : len(items) - int(end_anchored)]
+
+        # split the body into runs of fixed items, anything else breaks a run
+        segments = []  # (first index, last index + 1, strings)
+        i = 0
+        while i < len(body):
+            j, run = i, {""}
+            while j < len(body):
+                strings = _strings(body[j])
+                if strings is None:
+                    break
+                grown = {a + b for a in run for b in strings}
+                if len(grown) > MAX_ALTERNATIVES:
+                    break
+                run, j = grown, j + 1
+            if j > i:
+                segments.append((i, j, run))
+                i = j
+            else:
+                i += 1
+
+        if self.ignorecase:
+            if not all(s.isascii() for *_, strings in segments for s in strings):
+                return  # non-ascii case folding is the regex's business
+            segments = [
+                (a, b, {s.lower() for s in strings}) for a, b, strings in segments
+            ]
+
+        whole = len(segments) == 1 and segments[0][:2] == (0, len(body))
+        for first, last, strings in segments:
+            if start_anchored and first == 0:
+                self.prefixes = tuple(strings)
+            elif end_anchored and last == len(body):
+                self.suffixes = tuple(strings)
+                if end_newline:
+                    self.suffixes_newline = tuple(s + "\n" for s in strings)
+            elif "" not in strings:
+                self.literals.append(tuple(strings))
+        # with both anchors a prefix and a suffix check don't add up to an equality check
+        self.exact = whole and not (start_anchored and end_anchored)
+
+    def _compile(self) -> Callable[[str], bool]:
+        """build match() as a closure over plain locals, it runs once per file."""
+        search = self.pattern.search
+        ignorecase, exact = self.ignorecase, self.exact
+        prefixes, suffixes = self.prefixes, None
+        head_len = tail_len = 0
+        if prefixes is not None:
+            head_len = max(map(len, prefixes))
+        if self.suffixes is not None:
+            suffixes = self.suffixes + self.suffixes_newline
+            tail_len = max(map(len, suffixes)) or 1
+        # plain loops, any() over a generator costs more than the check itself
+        required = [strings[0] for strings in self.literals if len(strings) == 1]
+        one_of = [strings for strings in self.literals if len(strings) > 1]
+
+        def match(path: str) -> bool:
+            # prefix and suffix checks only look at (and lowercase) the ends of the path
+            if suffixes is not None:
+                tail = path[-tail_len:]
+                if ignorecase:
+                    if not tail.isascii():
+                        return search(path) is not None
+                    tail = tail.lower()
+                if not tail.endswith(suffixes):
+                    return False
+            if prefixes is not None:
+                head = path[:head_len]
+                if ignorecase:
+                    if not head.isascii():
+                        return search(path) is not None
+                    head = head.lower()
+                if not head.startswith(prefixes):
+                    return False
+            if required or one_of:
+                s = path
+                if ignorecase:
+                    if not s.isascii():
+                        return search(path) is not None
+                    s = s.lower()
+                for lit in required:
+                    if lit not in s:
+                        return False
+                for strings in one_of:
+                    for lit in strings:
+                        if lit in s:
+                            break
+                    else:
+                        return False
+            return exact or search(path) is not None
+
+        return match
+
+    def may_contain(self, dir_path: str) -> bool:
+        """False if no path starting with dir_path (a directory, ending in a separator) can match."""
+        if self.prefixes is None:
+            return True
+        if self.ignorecase:
+            if not dir_path.isascii():
+                return True
+            dir_path = dir_path.lower()
+        return any(
+            dir_path.startswith(p) or p.startswith(dir_path) for p in self.prefixes
+        )
@@ -0,0 +1,89 @@
+"""append-only log of past picks, so the weighted strategy can avoid repeats.
+
+one line per pick: `<unix seconds> <json relpath>`. a handful of picks per run
+keeps this at a few kb a year; lines older than the horizon are dropped by an
+occasional rewrite instead of on every run.
+"""
+
+import json
+import math
+import os
+import pathlib
+import sys
+import time
+
+# rewrite the file once this many lines are past the horizon
+COMPACT_AFTER = 1000
+
+
+def recency_factor(age_seconds: float, half_life_seconds: float) -> float:
+    """weight multiplier for a file picked age_seconds ago.
+
+    0 right after a pick, 0.5 one half-life later, approaching 1 after that.
+    """
+    if half_life_seconds <= 0:
+        return 1.0
+    return 1.0 - 0.5 ** (max(age_seconds, 0.0) / half_life_seconds)
+
+
+class PickHistory:
+    """last pick time per relative path, loaded from and appended to one file."""
+
+    def __init__(self, path: pathlib.Path, horizon_seconds: float = math.inf):
+        self.path = path
+        self.horizon_seconds = horizon_seconds
+        self.last_picked: dict[str, float] = {}
+        self._stale_lines = 0
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            f = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        cutoff = time.time() - self.horizon_seconds
+        with f:
+            for line in f:
+                try:
+                    ts, rel = line.split(" ", 1)
+                    ts, rel = float(ts), json.loads(rel)
+                except ValueError:
+                    continue  # torn write or hand edit, skip it
+                if not isinstance(rel, str):
+                    continue
+                if ts < cutoff:
+                    self._stale_lines += 1
+                    continue
+                if rel in self.last_picked:
+                    self._stale_lines += 1  # one of the two lines is superseded
+                    ts = max(ts, self.last_picked[rel])
+                self.last_picked[rel] = ts
+
+    def record(self, rel_paths: list[str], now: float | None = None) -> None:
+        """append picks, then compact if enough dead lines piled up."""
+        now = time.time() if now is None else now
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for rel in rel_paths:
+                if rel in self.last_picked:
+                    self._stale_lines += 1
+                self.last_picked[rel] = now
+                f.write(f"{int(now)} {json.dumps(rel, ensure_ascii=False)}\n")
+        if self._stale_lines >= COMPACT_AFTER:
+            self.compact()
+
+    def compact(self) -> None:
+        """rewrite the file with one line per live path, swapped in atomically."""
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rel, ts in sorted(self.last_picked.items(), key=lambda kv: kv[1]):
+                f.write(f"{int(ts)} {json.dumps(rel, ensure_ascii=False)}\n")
+        os.replace(tmp, self.path)
+        print(
+            f"pick history: compacted to {len(self.last_picked)} entries",
+            file=sys.stderr,
+        )
+        self._stale_lines = 0
+
+    def __len__(self) -> int:
+        return len(self.last_picked)
@@ -0,0 +1,106 @@
+"""persistent sqlite cache of generated reviews, so repeat picks don't pay for a new one."""
+
+import pathlib
+import random
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    rel_path TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    review TEXT NOT NULL,
+    created_at REAL NOT NULL,       -- when it was generated, drives the ttl
+    last_used REAL NOT NULL,        -- when it was last served or stored, drives lru eviction
+    PRIMARY KEY (rel_path, model, prompt_version)
+);
+CREATE INDEX IF NOT EXISTS reviews_last_used ON reviews(last_used);
+"""
+
+
+class ReviewCache:
+    """reviews keyed by (relative path, model, prompt version) with a ttl and an lru size cap.
+
+    reuse_probability is the chance a fresh cached review is actually served;
+    otherwise the caller regenerates and the new review replaces the old one,
+    which keeps some variety for books that come up a lot.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        ttl_seconds: float,
+        max_entries: int,
+        reuse_probability: float = 1.0,
+    ):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # reviews are generated on worker threads, keep the connection usable from any of them
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.reuse_probability = reuse_probability
+
+    def get(
+        self,
+        rel_path: str,
+        model: str,
+        prompt_version: str,
+        rng: random.Random = random,
+        now: float | None = None,
+    ) -> str | None:
+        """return a cached review to reuse, or None if missing, expired or not reused this time."""
+        now = time.time() if now is None else now
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT review, created_at FROM reviews"
+                " WHERE rel_path = ? AND model = ? AND prompt_version = ?",
+                (rel_path, model, prompt_version),
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                return None
+            if rng.random() >= self.reuse_probability:
+                return None
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE reviews SET last_used = ?"
+                    " WHERE rel_path = ? AND model = ? AND prompt_version = ?",
+                    (now, rel_path, model, prompt_version),
+                )
+            return row[0]
+
+    def put(
+        self,
+        rel_path: str,
+        model: str,
+        prompt_version: str,
+        review: str,
+        now: float | None = None,
+    ) -> None:
+        """store a freshly generated review, then drop expired and least recently used entries."""
+        now = time.time() if now is None else now
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO reviews"
+                " (rel_path, model, prompt_version, review, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (rel_path, model, prompt_version, review, now, now),
+            )
+            self.conn.execute(
+                "DELETE FROM reviews WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self.conn.execute(
+                "DELETE FROM reviews WHERE rowid IN"
+                " (SELECT rowid FROM reviews ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
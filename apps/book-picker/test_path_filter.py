@@ -0,0 +1,192 @@
+import random
+import re
+import unittest
+import unittest.mock
+from types import SimpleNamespace
+
+import path_filter as path_filter_module
+from path_filter import PathFilter
+
+# pieces random patterns and paths are built from. the path chunks overlap with
+# the pattern literals so a fair share of the generated paths actually match,
+# and include the characters re's case folding treats specially
+PATTERN_PIECES = [
+    "a",
+    "b",
+    "fic",
+    "A",
+    r"\.pdf",
+    r"\.",
+    "/",
+    "[ab]",
+    "[^a]",
+    "(a|b)",
+    "(?:pdf|epub)",
+    "(fic|)",
+    ".",
+    ".*",
+    "a+",
+    "b?",
+    r"\d",
+    r"\b",
+    r"\s",
+    "(?i:a)",
+    "(?=a)",
+    "é",
+    "[a-c]",
+]
+PATH_CHUNKS = [
+    "a",
+    "b",
+    "A",
+    "B",
+    "fic",
+    "FIC",
+    ".pdf",
+    ".PDF",
+    ".epub",
+    "pdf",
+    "/",
+    "1",
+    " ",
+    "\n",
+    "é",
+    "É",
+    "ſ",  # folds to s
+    "K",  # kelvin sign, folds to k
+    "İ",
+]
+FLAG_CHOICES = [0, re.IGNORECASE, re.IGNORECASE | re.MULTILINE, re.MULTILINE]
+
+
+def random_pattern(rng: random.Random) -> str:
+    def sequence():
+        return "".join(rng.choice(PATTERN_PIECES) for _ in range(rng.randint(1, 4)))
+
+    body = sequence()
+    if rng.random() < 0.2:
+        body += "|" + sequence()
+    start = rng.choice(["", "", "^", r"\A"])
+    end = rng.choice(["", "", "$", r"\Z"])
+    return start + body + end
+
+
+def random_path(rng: random.Random) -> str:
+    return "".join(rng.choice(PATH_CHUNKS) for _ in range(rng.randint(0, 8)))
+
+
+class TestPathFilterEquivalence(unittest.TestCase):
+    """property tests: the filter has to agree with the plain regex on everything."""
+
+    def test_match_agrees_with_regex(self):
+        rng = random.Random(1234)
+        for _ in range(3000):
+            pattern = re.compile(random_pattern(rng), rng.choice(FLAG_CHOICES))
+            path_filter = PathFilter(pattern)
+            for _ in range(60):
+                path = random_path(rng)
+                self.assertEqual(
+                    path_filter.match(path),
+                    pattern.search(path) is not None,
+                    f"pattern {pattern!r} on path {path!r}",
+                )
+
+    def test_pruned_dirs_never_contain_matches(self):
+        rng = random.Random(99)
+        for _ in range(3000):
+            pattern = re.compile(random_pattern(rng), rng.choice(FLAG_CHOICES))
+            path_filter = PathFilter(pattern)
+            for _ in range(30):
+                dir_path = random_path(rng) + "/"
+                if path_filter.may_contain(dir_path):
+                    continue
+                for _ in range(10):
+                    path = dir_path + random_path(rng)
+                    self.assertIsNone(
+                        pattern.search(path), f"pattern {pattern!r} pruned {path!r}"
+                    )
+
+    def test_library_style_paths(self):
+        """realistic patterns against realistic paths, with PATTERN's usual ignorecase."""
+        paths = [
+            "/data/books/Fiction/Herbert/Dune.epub",
+            "/data/books/fiction/le guin/the dispossessed.PDF",
+            "/data/books/Nonfiction/Sapiens.pdf",
+            "/data/books/Sci-Fi/Ted Chiang/Exhalation.mobi",
+            "/data/books/Fantasy/Ursula/Earthsea.pdf.part",
+            "/data/books/Ænglisc/Beowulf.pdf",
+            "/data/books/loose.pdf\n",
+        ]
+        patterns = [
+            r"\.pdf$",
+            r"\.(pdf|epub)$",
+            "fiction",
+            "sci-fi|fantasy",
+            "^/data/books/fiction/",
+            r"^/data/books/(fiction|fantasy)/.*\.pdf$",
+            r"herbert/.*\.epub",
+            r"\.pdf\Z",
+        ]
+        for pattern_str in patterns:
+            pattern = re.compile(pattern_str, re.IGNORECASE)
+            path_filter = PathFilter(pattern)
+            for path in paths:
+                self.assertEqual(
+                    path_filter.match(path),
+                    pattern.search(path) is not None,
+                    f"{pattern_str!r} on {path!r}",
+                )
+
+
+class TestPathFilterAnalysis(unittest.TestCase):
+    def _filter(self, pattern_str: str) -> PathFilter:
+        return PathFilter(re.compile(pattern_str, re.IGNORECASE))
+
+    def test_common_patterns_skip_the_regex(self):
+        for pattern_str in [r"\.pdf$", r"\.(pdf|epub)$", "fiction", "sci-fi|fantasy"]:
+            self.assertTrue(self._filter(pattern_str).exact, pattern_str)
+
+    def test_extension_allowlist(self):
+        path_filter = self._filter(r"\.(pdf|epub)$")
+        self.assertEqual(sorted(path_filter.suffixes), [".epub", ".pdf"])
+
+    def test_literals_and_residual_regex(self):
+        path_filter = self._filter(r"herbert/.*\.epub$")
+        self.assertEqual(path_filter.literals, [("herbert/",)])
+        self.assertEqual(path_filter.suffixes, (".epub",))
+        self.assertFalse(path_filter.exact)
+
+    def test_prefix_prunes_directories(self):
+        path_filter = self._filter("^/data/books/Fiction/")
+        self.assertTrue(path_filter.may_contain("/data/"))
+        self.assertTrue(path_filter.may_contain("/data/books/fiction/herbert/"))
+        self.assertFalse(path_filter.may_contain("/data/books/Nonfiction/"))
+
+    def test_unanalyzable_patterns_fall_back_to_the_regex(self):
+        path_filter = self._filter(r"\d{4}")
+        self.assertEqual(
+            (path_filter.prefixes, path_filter.suffixes, path_filter.literals),
+            (None, None, []),
+        )
+        self.assertTrue(path_filter.match("/books/1984.epub"))
+        self.assertTrue(path_filter.may_contain("/anything/"))
+
+    def test_missing_re_internals_fall_back_to_the_regex(self):
+        paths = ["/data/books/Fiction/dune.epub", "/data/books/x.pdf", "/other.epub"]
+        pattern_str = r"^/data/books/.*\.epub$"
+        expected = [bool(re.search(pattern_str, p, re.IGNORECASE)) for p in paths]
+        # what a python without re._parser gets, and one whose internals were renamed
+        for name, stand_in in [("sre_parse", None), ("sre", SimpleNamespace())]:
+            with unittest.mock.patch.object(path_filter_module, name, stand_in):
+                path_filter = self._filter(pattern_str)
+            self.assertEqual(
+                (path_filter.prefixes, path_filter.suffixes, path_filter.exact),
+                (None, None, False),
+                name,
+            )
+            self.assertEqual([path_filter.match(p) for p in paths], expected, name)
+            self.assertTrue(path_filter.may_contain("/anything/"))
+
+
+if __name__ == "__main__":
+    unittest.main()
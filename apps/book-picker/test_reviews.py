@@ -0,0 +1,426 @@
+import io
+import json
+import random
+import pathlib
+import shutil
+import tempfile
+import threading
+import contextlib
+import unittest
+import unittest.mock
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import requests
+
+import main
+from main import (
+    PROMPT_VERSION,
+    get_gemini_review,
+    get_gemini_reviews_batched,
+    parse_batched_reviews,
+    iter_submitted,
+    run_pipeline,
+)
+from discord_webhook import DryRunSink
+from review_cache import ReviewCache
+
+
+class StubResponse:
+    """just enough of a gemini GenerateContentResponse for the review code."""
+
+    def __init__(self, text: str):
+        self.parts = [SimpleNamespace(text=text)] if text else []
+        self.text = text
+        self.prompt_feedback = None
+        self.candidates = [SimpleNamespace(finish_reason=1)]
+
+
+class StubModel:
+    """offline stand-in for genai.GenerativeModel.
+
+    `reply` gets the prompt and returns the response text (or raises).
+    batched prompts are told apart from single ones by their json filepath list.
+    """
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.prompts = []
+
+    def generate_content(self, prompt, generation_config=None):
+        self.prompts.append(prompt)
+        return StubResponse(self.reply(prompt))
+
+    @property
+    def batch_calls(self):
+        return sum("**filepaths**" in p for p in self.prompts)
+
+    @property
+    def single_calls(self):
+        return len(self.prompts) - self.batch_calls
+
+
+PATHS = ["Fiction/dune.epub", "Nonfiction/sapiens.pdf", "loose_book.mobi"]
+
+
+def single_reply(prompt):
+    for path in PATHS:
+        if f"'{path}'" in prompt:
+            return f"single review of {path}. rating: 5/10"
+    raise AssertionError(f"unexpected prompt: {prompt}")
+
+
+def batch_reply_for(entries):
+    """reply with `entries` for batched prompts, per-book text otherwise."""
+
+    def reply(prompt):
+        if "**filepaths**" in prompt:
+            return json.dumps(entries)
+        return single_reply(prompt)
+
+    return reply
+
+
+class TestParseBatchedReviews(unittest.TestCase):
+    def test_well_formed(self):
+        text = json.dumps([{"path": p, "review": f"r {p}"} for p in PATHS])
+        self.assertEqual(
+            parse_batched_reviews(text, PATHS), {p: f"r {p}" for p in PATHS}
+        )
+
+    def test_code_fences_and_chatter(self):
+        body = json.dumps([{"path": p, "review": f"r {p}"} for p in PATHS])
+        text = f"sure thing lol\n```json\n{body}\n```\nhope this helps"
+        self.assertEqual(len(parse_batched_reviews(text, PATHS)), 3)
+
+    def test_mangled_paths_fall_back_to_position(self):
+        text = json.dumps([{"path": "???", "review": f"r{i}"} for i in range(3)])
+        self.assertEqual(
+            parse_batched_reviews(text, PATHS),
+            {PATHS[0]: "r0", PATHS[1]: "r1", PATHS[2]: "r2"},
+        )
+
+    def test_mangled_paths_without_alignment_are_dropped(self):
+        text = json.dumps(
+            [{"path": "???", "review": "r"}, {"path": PATHS[1], "review": "ok"}]
+        )
+        self.assertEqual(parse_batched_reviews(text, PATHS), {PATHS[1]: "ok"})
+
+    def test_malformed_entries_are_dropped(self):
+        text = json.dumps(
+            [
+                {"path": PATHS[0], "review": ""},
+                {"path": PATHS[1], "review": 7},
+                {"path": PATHS[2], "review": "fine"},
+                42,
+            ]
+        )
+        self.assertEqual(parse_batched_reviews(text, PATHS), {PATHS[2]: "fine"})
+
+    def test_garbage(self):
+        self.assertEqual(parse_batched_reviews("no json here", PATHS), {})
+        self.assertEqual(parse_batched_reviews("[not, json]", PATHS), {})
+        self.assertEqual(parse_batched_reviews('{"a": [1]}', PATHS), {})
+
+
+class TestGeminiReviews(unittest.TestCase):
+    def setUp(self):
+        # review code logs failures/fallbacks to stderr
+        self.enterContext(contextlib.redirect_stderr(io.StringIO()))
+
+    def test_single_review(self):
+        model = StubModel(single_reply)
+        review = get_gemini_review(PATHS[0], "stub", model=model)
+        self.assertEqual(review, f"single review of {PATHS[0]}. rating: 5/10")
+
+    def test_single_review_empty_and_failing(self):
+        review = get_gemini_review(PATHS[0], "stub", model=StubModel(lambda p: ""))
+        self.assertTrue(review.startswith("(review generation blocked/empty"))
+
+        def boom(prompt):
+            raise RuntimeError("quota")
+
+        review = get_gemini_review(PATHS[0], "stub", model=StubModel(boom))
+        self.assertEqual(review, "(review generation failed: RuntimeError)")
+
+    def test_batched_one_call(self):
+        entries = [{"path": p, "review": f"batched {p}"} for p in PATHS]
+        model = StubModel(batch_reply_for(entries))
+        reviews = get_gemini_reviews_batched(PATHS, "stub", model=model)
+        self.assertEqual(reviews, [f"batched {p}" for p in PATHS])
+        self.assertEqual((model.batch_calls, model.single_calls), (1, 0))
+
+    def test_batched_falls_back_for_missing_entries(self):
+        # out of order, one missing, one malformed
+        entries = [
+            {"path": PATHS[2], "review": f"batched {PATHS[2]}"},
+            {"path": PATHS[0], "review": None},
+        ]
+        model = StubModel(batch_reply_for(entries))
+        reviews = get_gemini_reviews_batched(PATHS, "stub", model=model, concurrency=2)
+        self.assertEqual(
+            reviews,
+            [
+                f"single review of {PATHS[0]}. rating: 5/10",
+                f"single review of {PATHS[1]}. rating: 5/10",
+                f"batched {PATHS[2]}",
+            ],
+        )
+        self.assertEqual((model.batch_calls, model.single_calls), (1, 2))
+
+    def test_batched_falls_back_entirely_when_batch_fails(self):
+        def reply(prompt):
+            if "**filepaths**" in prompt:
+                raise RuntimeError("batch exploded")
+            return single_reply(prompt)
+
+        model = StubModel(reply)
+        reviews = get_gemini_reviews_batched(PATHS, "stub", model=model)
+        self.assertEqual(
+            reviews, [f"single review of {p}. rating: 5/10" for p in PATHS]
+        )
+        self.assertEqual((model.batch_calls, model.single_calls), (1, 3))
+
+
+class TestReviewCache(unittest.TestCase):
+    def setUp(self):
+        self.enterContext(contextlib.redirect_stderr(io.StringIO()))
+        self.test_dir = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.test_dir)
+
+    def _cache(self, **kwargs):
+        kwargs.setdefault("ttl_seconds", 100)
+        kwargs.setdefault("max_entries", 10)
+        cache = ReviewCache(self.test_dir / "reviews.sqlite", **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_roundtrip_and_keying(self):
+        """reviews are keyed by path, model and prompt version."""
+        cache = self._cache()
+        cache.put("a.epub", "model-1", "1", "great", now=0)
+        self.assertEqual(cache.get("a.epub", "model-1", "1", now=1), "great")
+        self.assertIsNone(cache.get("a.epub", "model-2", "1", now=1))
+        self.assertIsNone(cache.get("a.epub", "model-1", "2", now=1))
+        self.assertIsNone(cache.get("b.epub", "model-1", "1", now=1))
+
+    def test_persists_across_instances(self):
+        self._cache().put("a.epub", "m", "1", "great")
+        self.assertEqual(self._cache().get("a.epub", "m", "1"), "great")
+
+    def test_ttl(self):
+        cache = self._cache(ttl_seconds=100)
+        cache.put("a.epub", "m", "1", "great", now=0)
+        self.assertEqual(cache.get("a.epub", "m", "1", now=100), "great")
+        self.assertIsNone(cache.get("a.epub", "m", "1", now=101))
+
+    def test_lru_eviction(self):
+        """past the size cap the least recently used entry goes first."""
+        cache = self._cache(max_entries=2)
+        cache.put("a", "m", "1", "ra", now=0)
+        cache.put("b", "m", "1", "rb", now=1)
+        cache.get("a", "m", "1", now=2)  # a is now more recent than b
+        cache.put("c", "m", "1", "rc", now=3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b", "m", "1", now=4))
+        self.assertEqual(cache.get("a", "m", "1", now=4), "ra")
+
+    def test_reuse_probability(self):
+        """cached reviews are only served reuse_probability of the time."""
+        cache = self._cache(reuse_probability=0.25)
+        cache.put("a", "m", "1", "ra", now=0)
+        rng = random.Random(7)
+        hits = sum(
+            cache.get("a", "m", "1", rng=rng, now=1) is not None for _ in range(4000)
+        )
+        self.assertAlmostEqual(hits / 4000, 0.25, delta=0.03)
+        self.assertIsNone(self._cache(reuse_probability=0).get("a", "m", "1", now=1))
+
+    def test_submitted_reviews_use_cache(self):
+        """cache hits skip the model, new reviews get stored, failures don't."""
+        cache = self._cache(ttl_seconds=10**9)
+        cache.put(PATHS[0], "stub", PROMPT_VERSION, "cached review")
+
+        def reply(prompt):
+            if f"'{PATHS[2]}'" in prompt:
+                return ""  # blocked/empty
+            return single_reply(prompt)
+
+        root = pathlib.Path("/books")
+        for mode in ("single", "batch"):
+            model = StubModel(reply)
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                pending = iter_submitted(
+                    (root / p for p in PATHS),
+                    pool,
+                    mode,
+                    "stub",
+                    root,
+                    cache=cache,
+                    model=model,
+                )
+                reviews = [review() for _, review in pending]
+            self.assertEqual(reviews[0], "cached review")
+            self.assertEqual(reviews[1], f"single review of {PATHS[1]}. rating: 5/10")
+            self.assertTrue(reviews[2].startswith("(review generation"))
+            self.assertFalse(any(PATHS[0] in p for p in model.prompts))
+
+        self.assertEqual(cache.get(PATHS[1], "stub", PROMPT_VERSION), reviews[1])
+        self.assertIsNone(cache.get(PATHS[2], "stub", PROMPT_VERSION))
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.enterContext(contextlib.redirect_stderr(io.StringIO()))
+        self.root = pathlib.Path("/books")
+        self.pool = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(self.pool.shutdown)
+
+    def _run(self, picks, model, **kwargs):
+        out = io.StringIO()
+        sink = DryRunSink("json", out=out)
+        posted = run_pipeline(
+            picks,
+            sink,
+            self.pool,
+            "intro",
+            self.root,
+            "https://x",
+            "stub",
+            model=model,
+            **kwargs,
+        )
+        sent = [json.loads(line)["payload"] for line in out.getvalue().splitlines()]
+        return posted, sent
+
+    def test_posts_in_pick_order(self):
+        for mode in ("single", "batch"):
+            entries = [{"path": p, "review": f"batched {p}"} for p in PATHS]
+            model = StubModel(batch_reply_for(entries))
+            posted, sent = self._run(
+                (self.root / p for p in PATHS), model, review_mode=mode
+            )
+            self.assertEqual(posted, 3)
+            self.assertEqual(sent[0], {"content": "intro"})
+            self.assertEqual(
+                [m["content"].split("\n")[0] for m in sent[1:]],
+                ["**dune**", "**sapiens**", "**loose_book**"],
+            )
+
+    def test_first_book_posts_before_selection_finishes(self):
+        """the first pick is reviewed and posted while later picks are still pending."""
+        first_posted = threading.Event()
+        sink_send = DryRunSink.send
+
+        def send(sink, payload):
+            if "dune" in payload.get("content", ""):
+                first_posted.set()
+            return sink_send(sink, payload)
+
+        def picks():
+            yield self.root / PATHS[0]
+            # a slow walk for the rest, only finishes once the first book is out
+            self.assertTrue(first_posted.wait(5))
+            yield self.root / PATHS[1]
+
+        with unittest.mock.patch.object(DryRunSink, "send", send):
+            posted, sent = self._run(picks(), StubModel(single_reply))
+        self.assertEqual(posted, 2)
+
+    def test_embeds(self):
+        posted, sent = self._run(
+            (self.root / p for p in PATHS), StubModel(single_reply), post_mode="embeds"
+        )
+        self.assertEqual(posted, 3)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(len(sent[0]["embeds"]), 3)
+
+    def test_on_posted_gets_only_sent_books(self):
+        for post_mode in ("messages", "embeds"):
+            recorded = []
+            posted, sent = self._run(
+                (self.root / p for p in PATHS),
+                StubModel(single_reply),
+                post_mode=post_mode,
+                on_posted=recorded.extend,
+            )
+            self.assertEqual(recorded, [self.root / p for p in PATHS])
+
+        # a failed intro ends the run, nobody saw those books
+        recorded = []
+        with unittest.mock.patch.object(
+            DryRunSink, "send", side_effect=requests.exceptions.ConnectionError
+        ):
+            with self.assertRaises(SystemExit):
+                self._run(
+                    (self.root / p for p in PATHS),
+                    StubModel(single_reply),
+                    on_posted=recorded.extend,
+                )
+        self.assertEqual(recorded, [])
+
+    def test_nothing_picked_posts_nothing(self):
+        posted, sent = self._run(iter([]), StubModel(single_reply))
+        self.assertEqual((posted, sent), (0, []))
+
+    def test_selection_errors_reach_the_caller(self):
+        def picks():
+            yield self.root / PATHS[0]
+            raise SystemExit("be real: no files found")
+
+        with self.assertRaises(SystemExit):
+            self._run(picks(), StubModel(single_reply))
+
+
+class TestIntro(unittest.TestCase):
+    """the intro main() posts never promises more books than it can deliver."""
+
+    def setUp(self):
+        self.enterContext(contextlib.redirect_stderr(io.StringIO()))
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        # two top-level folders and an empty one, fewer buckets than N_FILES
+        self.root = pathlib.Path(tmp)
+        for name in ("scifi", "history"):
+            (self.root / name).mkdir()
+            (self.root / name / f"{name}.epub").write_text("x")
+        (self.root / "empty").mkdir()
+
+    def _intro(self, strategy: str) -> tuple[str, int]:
+        out = io.StringIO()
+        patches = {
+            "ROOT_DIR": self.root,
+            "N_FILES": 5,
+            "SELECT_STRATEGY": strategy,
+            "INDEX_PATH": "",
+            "PICK_HISTORY_PATH": "",
+            "REVIEW_CACHE_PATH": "",
+            "GEMINI_API_KEY": "k",
+            "DRY_RUN": "json",
+        }
+        with contextlib.ExitStack() as stack:
+            for name, value in patches.items():
+                stack.enter_context(unittest.mock.patch(f"main.{name}", value))
+            stack.enter_context(unittest.mock.patch("gemini.configure"))
+            stack.enter_context(unittest.mock.patch("gemini.load"))
+            stack.enter_context(
+                unittest.mock.patch("main.get_gemini_review", lambda *a, **k: "ok")
+            )
+            stack.enter_context(contextlib.redirect_stdout(out))
+            main.main()
+        sent = [json.loads(line)["payload"] for line in out.getvalue().splitlines()]
+        return sent[0]["content"], len(sent) - 1
+
+    def test_lazy_intro_is_an_upper_bound(self):
+        intro, books = self._intro("lazy")
+        self.assertEqual(books, 2)
+        self.assertIn("up to 5 random book picks incoming", intro)
+
+    def test_grouped_intro_counts_the_picks(self):
+        intro, books = self._intro("grouped")
+        self.assertEqual(books, 2)
+        self.assertIn("**2 random book picks incoming**", intro)
+
+
+if __name__ == "__main__":
+    unittest.main()
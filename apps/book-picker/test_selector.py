@@ -2,13 +2,28 @@ import unittest
 import tempfile
 import pathlib
 import shutil
+import os
 import sys
 import re
+import io
+import random
+import contextlib
+import subprocess
+import time
+import threading
+from collections import Counter
+from unittest import mock
 
 from main import (
+    scan_files,
     get_all_files,
+    iter_candidates,
+    reservoir_by_bucket,
+    sample_weighted,
     select_diverse_files,
 )
+import library_index
+import pick_history
 
 
 # mock the exit function to test sys.exit calls
@@ -21,6 +36,19 @@ def mock_sys_exit(code):
     raise MockExit(code)
 
 
+# chi-square critical values at p=0.001, keyed by degrees of freedom.
+# with fixed seeds these tests are deterministic, the threshold just keeps
+# them honest if the seed or the sampling code changes.
+CHI2_CRITICAL_P001 = {2: 13.82, 4: 18.47, 5: 20.52}
+
+
+def chi_square(observed: Counter, expected: dict) -> float:
+    total = sum(observed.values())
+    return sum(
+        (observed[k] - total * p) ** 2 / (total * p) for k, p in expected.items()
+    )
+
+
 class TestBookSelection(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -98,6 +126,47 @@ class TestBookSelection(unittest.TestCase):
         ]
         self.assertCountEqual(files, expected_txt)
 
+    def test_parallel_scan_matches_serial(self):
+        """fanning top-level dirs out to workers finds the same files."""
+        files = get_all_files(self.test_dir, scan_workers=4)
+        self.assertCountEqual(files, list(self.expected_files.keys()))
+        self.assertCountEqual(
+            scan_files(self.test_dir, workers=4), scan_files(self.test_dir)
+        )
+
+    def test_parallel_scan_streams_and_stops(self):
+        """big trees come through in batches, and dropping the scan stops the walkers."""
+        with tempfile.TemporaryDirectory() as tmp:
+            root = pathlib.Path(tmp)
+            for d in range(6):
+                (root / f"d{d}").mkdir()
+                for i in range(300):
+                    (root / f"d{d}" / f"f{i}.txt").touch()
+            self.assertEqual(sum(1 for _ in scan_files(root, workers=4)), 1800)
+
+            scan = scan_files(root, workers=4)
+            next(scan)
+            scan.close()
+            self.assertFalse(
+                [t for t in threading.enumerate() if t.name.startswith("scan")]
+            )
+
+    def test_anchored_pattern_prunes_directories(self):
+        """a pattern anchored at a collection never lists the other collections."""
+        pattern = re.compile(
+            "^" + re.escape(os.path.join(str(self.test_dir), "collectionb", "")),
+            re.IGNORECASE,
+        )
+        for workers in (1, 4):
+            with mock.patch("main.os.scandir", wraps=os.scandir) as scandir:
+                files = get_all_files(self.test_dir, pattern, scan_workers=workers)
+            self.assertCountEqual(
+                files, [f for f in self.expected_files if pattern.search(str(f))]
+            )
+            listed = {os.path.basename(call.args[0]) for call in scandir.call_args_list}
+            self.assertNotIn("CollectionA", listed)
+            self.assertIn("SubfolderB", listed)
+
     def test_basic_selection_no_pattern(self):
         """test selecting 3 files, should get 3 from distinct origins."""
         n_select = 3
@@ -158,6 +227,325 @@ class TestBookSelection(unittest.TestCase):
             select_diverse_files(self.test_dir, 3, "*invalid_regex[")
         # check exit code or message
 
+    def test_reservoir_strategy_properties(self):
+        """reservoir strategy keeps the distinct-origin guarantees."""
+        selected = select_diverse_files(self.test_dir, 5, "", strategy="reservoir")
+        origins = set(self.expected_files[f] for f in selected)
+        self.assertEqual(origins, self.expected_eligible_origins)
+
+        selected = select_diverse_files(
+            self.test_dir, 2, r"\.txt$", strategy="reservoir"
+        )
+        self.assertTrue(all(f.name.endswith(".txt") for f in selected))
+        self.assertEqual(len(set(self.expected_files[f] for f in selected)), 2)
+
+    def test_invalid_strategy(self):
+        """unknown selection strategies are rejected."""
+        with self.assertRaises(MockExit):
+            select_diverse_files(self.test_dir, 3, "", strategy="nope")
+
+    def test_reservoir_uniform_within_bucket(self):
+        """every file in a bucket is equally likely to be the bucket's pick."""
+        rng = random.Random(1234)
+        entries = [("A", "A/only")] + [("C", f"C/{i}") for i in range(5)]
+        picks = Counter()
+        for _ in range(5000):
+            result = reservoir_by_bucket(entries, rng)
+            self.assertEqual(result["A"], "A/only")
+            picks[result["C"]] += 1
+
+        expected = {f"C/{i}": 1 / 5 for i in range(5)}
+        self.assertLess(chi_square(picks, expected), CHI2_CRITICAL_P001[4])
+
+    def test_reservoir_selection_distribution(self):
+        """end to end: buckets uniform, files uniform within their bucket."""
+        random.seed(4321)
+        picks = Counter()
+        with contextlib.redirect_stderr(io.StringIO()):
+            for _ in range(3000):
+                (chosen,) = select_diverse_files(
+                    self.test_dir, 1, "", strategy="reservoir"
+                )
+                picks[chosen] += 1
+
+        bucket_sizes = Counter(self.expected_files.values())
+        expected = {
+            f: 1 / len(bucket_sizes) / bucket_sizes[origin]
+            for f, origin in self.expected_files.items()
+        }
+        self.assertLess(chi_square(picks, expected), CHI2_CRITICAL_P001[5])
+
+    def test_weighted_selection_distribution(self):
+        """buckets weighted by file count (or its sqrt), files uniform within."""
+        bucket_sizes = Counter(self.expected_files.values())
+        for bucket_weight, exponent in (("size", 1.0), ("sqrt", 0.5)):
+            random.seed(2468)
+            picks = Counter()
+            with contextlib.redirect_stderr(io.StringIO()):
+                for _ in range(3000):
+                    (chosen,) = select_diverse_files(
+                        self.test_dir,
+                        1,
+                        "",
+                        strategy="weighted",
+                        bucket_weight=bucket_weight,
+                    )
+                    picks[chosen] += 1
+
+            weights = {b: size**exponent for b, size in bucket_sizes.items()}
+            expected = {
+                f: weights[origin] / sum(weights.values()) / bucket_sizes[origin]
+                for f, origin in self.expected_files.items()
+            }
+            self.assertLess(chi_square(picks, expected), CHI2_CRITICAL_P001[5])
+
+    def test_weighted_avoids_recent_picks(self):
+        """a file picked just now is (almost) never picked again, its bucket-mate is."""
+        recent = self.test_dir / "CollectionA" / "a_book1.pdf"
+        with tempfile.TemporaryDirectory() as tmp:
+            history = pick_history.PickHistory(pathlib.Path(tmp) / "picks.log")
+            history.record([str(recent.relative_to(self.test_dir))])
+            random.seed(1357)
+            picks = Counter()
+            with contextlib.redirect_stderr(io.StringIO()):
+                for _ in range(500):
+                    chosen = select_diverse_files(
+                        self.test_dir, 4, "", strategy="weighted", history=history
+                    )
+                    self.assertEqual(
+                        len({self.expected_files[f] for f in chosen}), len(chosen)
+                    )
+                    picks.update(chosen)
+        sibling = self.test_dir / "CollectionA" / "a_book2.mobi"
+        self.assertGreater(picks[sibling], 400)
+        self.assertLess(picks[recent], 20)
+
+    def test_invalid_bucket_weight(self):
+        with self.assertRaises(MockExit):
+            select_diverse_files(
+                self.test_dir, 1, "", strategy="weighted", bucket_weight="vibes"
+            )
+
+    def test_sample_weighted(self):
+        rng = random.Random(11)
+        weights = {"a": 1.0, "b": 2.0, "c": 7.0, "never": 0.0}
+        picks = Counter(sample_weighted(weights, 1, rng)[0] for _ in range(5000))
+        expected = {"a": 0.1, "b": 0.2, "c": 0.7}
+        self.assertLess(chi_square(picks, expected), CHI2_CRITICAL_P001[2])
+        self.assertEqual(sorted(sample_weighted(weights, 10, rng)), ["a", "b", "c"])
+
+    def test_lazy_strategy_properties(self):
+        """lazy strategy keeps the distinct-origin guarantees and honours patterns."""
+        selected = select_diverse_files(self.test_dir, 5, "", strategy="lazy")
+        origins = set(self.expected_files[f] for f in selected)
+        self.assertEqual(origins, self.expected_eligible_origins)
+
+        # most top-level items are filtered out here, so it has to retry
+        selected = select_diverse_files(self.test_dir, 2, r"\.txt$", strategy="lazy")
+        self.assertTrue(all(f.name.endswith(".txt") for f in selected))
+        self.assertEqual(
+            set(self.expected_files[f] for f in selected),
+            {self.test_dir / "root_book1.txt", self.test_dir / "CollectionB"},
+        )
+
+        with self.assertRaises(MockExit):
+            select_diverse_files(self.test_dir, 3, "NOTHING_XYZ", strategy="lazy")
+
+    def test_lazy_strategy_walks_only_sampled_subtrees(self):
+        """picking one file lists the root plus at most a couple of subtrees."""
+        random.seed(99)
+        with mock.patch("main.os.scandir", wraps=os.scandir) as scandir:
+            select_diverse_files(self.test_dir, 1, "", strategy="lazy")
+        # a full walk lists 5 dirs; worst case here is root + empty C + all of B
+        self.assertLessEqual(scandir.call_count, 4)
+
+    def test_lazy_selection_distribution(self):
+        """lazy sampling is uniform over non-empty buckets and within them."""
+        random.seed(2468)
+        picks = Counter()
+        with contextlib.redirect_stderr(io.StringIO()):
+            for _ in range(3000):
+                (chosen,) = select_diverse_files(self.test_dir, 1, "", strategy="lazy")
+                picks[chosen] += 1
+
+        bucket_sizes = Counter(self.expected_files.values())
+        expected = {
+            f: 1 / len(bucket_sizes) / bucket_sizes[origin]
+            for f, origin in self.expected_files.items()
+        }
+        self.assertLess(chi_square(picks, expected), CHI2_CRITICAL_P001[5])
+
+
+class TestLibraryIndex(unittest.TestCase):
+    def setUp(self):
+        # fresh tree per test since these tests mutate it
+        self.test_dir = pathlib.Path(tempfile.mkdtemp())
+        self.root = self.test_dir / "library"
+        self.index_path = self.test_dir / "cache" / "index.sqlite"
+        (self.root / "CollectionA" / "Sub").mkdir(parents=True)
+        (self.root / "CollectionB").mkdir()
+        (self.root / "root_book.txt").write_text("root")
+        (self.root / ".hidden.txt").write_text("hidden")
+        (self.root / "CollectionA" / "a.pdf").write_text("a")
+        (self.root / "CollectionA" / "Sub" / "a_sub.epub").write_text("asub")
+        (self.root / "CollectionB" / "b.txt").write_text("b")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _indexed(self, pattern=None):
+        # same path main takes when INDEX_PATH is set
+        return [
+            self.root / rel
+            for _, rel in iter_candidates(self.root, pattern, self.index_path)
+        ]
+
+    def test_index_matches_walk(self):
+        """the index should list exactly what a full walk finds."""
+        self.assertCountEqual(self._indexed(), get_all_files(self.root))
+        self.assertTrue(self.index_path.exists())
+
+    def test_index_pattern(self):
+        """pattern filtering works the same on indexed files."""
+        pattern = re.compile(r"\.txt$", re.IGNORECASE)
+        self.assertCountEqual(
+            self._indexed(pattern=pattern), get_all_files(self.root, pattern)
+        )
+
+    def test_index_stores_buckets_and_stats(self):
+        """rows carry top-level bucket, size and mtime."""
+        conn = library_index.open_index(self.index_path, self.root)
+        library_index.refresh_index(conn, self.root)
+        rows = {
+            r[0]: r[1:] for r in conn.execute("SELECT path, top_level, size FROM files")
+        }
+        conn.close()
+        self.assertEqual(
+            rows[str(pathlib.Path("CollectionA", "Sub", "a_sub.epub"))],
+            ("CollectionA", 4),
+        )
+        self.assertEqual(rows["root_book.txt"], ("root_book.txt", 4))
+
+    def test_incremental_refresh_only_relists_changed_dirs(self):
+        """second run relists nothing; touching one dir relists just that dir."""
+        conn = library_index.open_index(self.index_path, self.root)
+        self.assertEqual(library_index.refresh_index(conn, self.root), 4)
+        self.assertEqual(library_index.refresh_index(conn, self.root), 0)
+
+        new_file = self.root / "CollectionA" / "Sub" / "new.mobi"
+        new_file.write_text("new")
+        self.assertEqual(library_index.refresh_index(conn, self.root), 1)
+        paths = {rel for _, rel in library_index.iter_indexed_files(conn)}
+        self.assertIn(str(new_file.relative_to(self.root)), paths)
+        conn.close()
+
+    def test_removed_dirs_are_purged(self):
+        """deleting a subtree drops its files from the index."""
+        self._indexed()
+        shutil.rmtree(self.root / "CollectionA")
+        self.assertCountEqual(self._indexed(), get_all_files(self.root))
+
+    def test_hidden_dirs_are_pruned(self):
+        """files under hidden dirs are skipped by both the walk and the index."""
+        (self.root / "CollectionA" / ".cache").mkdir()
+        (self.root / "CollectionA" / ".cache" / "thumb.jpg").write_text("t")
+        walked = get_all_files(self.root)
+        self.assertNotIn(self.root / "CollectionA" / ".cache" / "thumb.jpg", walked)
+        self.assertCountEqual(self._indexed(), walked)
+
+    def test_scan_files_yields_buckets(self):
+        """scan_files streams (top_level, relpath) tuples."""
+        entries = set(scan_files(self.root))
+        self.assertEqual(
+            entries,
+            {
+                ("root_book.txt", "root_book.txt"),
+                ("CollectionA", str(pathlib.Path("CollectionA", "a.pdf"))),
+                ("CollectionA", str(pathlib.Path("CollectionA", "Sub", "a_sub.epub"))),
+                ("CollectionB", str(pathlib.Path("CollectionB", "b.txt"))),
+            },
+        )
+
+    def test_rebuild_flag(self):
+        """forcing a rebuild relists everything even when nothing changed."""
+        self._indexed()
+        conn = library_index.open_index(self.index_path, self.root, rebuild=True)
+        self.assertEqual(library_index.refresh_index(conn, self.root), 4)
+        conn.close()
+
+    def test_selection_from_index(self):
+        """select_diverse_files reads from the index when given one."""
+        selected = select_diverse_files(self.root, 3, "", index_path=self.index_path)
+        self.assertEqual(len(selected), 3)
+        self.assertTrue(set(selected) <= set(get_all_files(self.root)))
+
+
+class TestPickHistory(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.test_dir)
+        self.path = self.test_dir / "picks.log"
+
+    def test_roundtrip_keeps_latest_pick(self):
+        history = pick_history.PickHistory(self.path)
+        history.record(["a.epub", "dir/b ✨.pdf"], now=1000)
+        history.record(["a.epub"], now=2000)
+        reloaded = pick_history.PickHistory(self.path)
+        self.assertEqual(reloaded.last_picked, {"a.epub": 2000, "dir/b ✨.pdf": 1000})
+
+    def test_append_only_and_skips_garbage(self):
+        pick_history.PickHistory(self.path).record(["a.epub"], now=1000)
+        with open(self.path, "a") as f:
+            f.write('1500 "torn\n')  # half-written line
+        pick_history.PickHistory(self.path).record(["b.epub"], now=2000)
+        lines = self.path.read_text().splitlines()
+        self.assertEqual(lines[0], '1000 "a.epub"')
+        self.assertEqual(lines[-1], '2000 "b.epub"')
+        self.assertEqual(
+            set(pick_history.PickHistory(self.path).last_picked), {"a.epub", "b.epub"}
+        )
+
+    def test_horizon_and_compaction(self):
+        history = pick_history.PickHistory(self.path)
+        history.record(["old.epub"], now=0)  # way past any horizon
+        for i in range(5):
+            history.record(["a.epub"], now=time.time() - 10 + i)
+
+        loaded = pick_history.PickHistory(self.path, horizon_seconds=3600)
+        self.assertEqual(set(loaded.last_picked), {"a.epub"})
+        with mock.patch.object(pick_history, "COMPACT_AFTER", 5):
+            with contextlib.redirect_stderr(io.StringIO()):
+                loaded.record(["b.epub"])
+        self.assertEqual(len(self.path.read_text().splitlines()), 2)
+        self.assertEqual(
+            set(pick_history.PickHistory(self.path).last_picked), {"a.epub", "b.epub"}
+        )
+
+    def test_recency_factor(self):
+        day = 86400
+        self.assertEqual(pick_history.recency_factor(0, 30 * day), 0.0)
+        self.assertAlmostEqual(pick_history.recency_factor(30 * day, 30 * day), 0.5)
+        self.assertGreater(pick_history.recency_factor(300 * day, 30 * day), 0.999)
+        self.assertEqual(pick_history.recency_factor(float("inf"), 30 * day), 1.0)
+
+
+class TestStartup(unittest.TestCase):
+    def test_gemini_sdk_is_not_imported_up_front(self):
+        """the scanner/selector must stay cheap to import, the sdk loads on first review."""
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, main; print(sorted(m for m in sys.modules"
+                " if m.startswith(('google.generativeai', 'google.protobuf', 'grpc'))))",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=pathlib.Path(__file__).parent,
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
+
 
 if __name__ == "__main__":
     unittest.main()
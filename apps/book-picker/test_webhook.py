@@ -0,0 +1,247 @@
+import io
+import json
+import contextlib
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from discord_webhook import (
+    MAX_DESCRIPTION_CHARS,
+    DryRunSink,
+    WebhookClient,
+    make_embed,
+    pack_embeds,
+)
+
+
+class StubDiscord(ThreadingHTTPServer):
+    """local stand-in for a discord webhook endpoint.
+
+    replies are popped from `script` as (status, headers, body) tuples, falling
+    back to a plain 200 once it runs out. None drops the connection after reading
+    the request instead of replying. every request is recorded along with
+    the client port it came in on, so connection reuse is observable.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, script):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.script = list(script)
+        self.received = []
+        self.client_ports = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/webhooks/1/token"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like discord
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append((self.path, json.loads(body)))
+        self.server.client_ports.append(self.client_address[1])
+
+        step = (
+            self.server.script.pop(0) if self.server.script else (200, {}, {"id": "1"})
+        )
+        if step is None:
+            self.close_connection = True
+            return
+        status, headers, reply = step
+        data = json.dumps(reply).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # keep test output clean
+
+
+class FakeTime:
+    """records requested sleeps instead of sleeping, and advances the clock by them."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+
+    def clock(self):
+        return self.now
+
+
+class TestWebhookClient(unittest.TestCase):
+    def setUp(self):
+        # the client logs every wait to stderr
+        self.enterContext(contextlib.redirect_stderr(io.StringIO()))
+
+    def _client(self, script, **kwargs):
+        server = StubDiscord(script)
+        threading.Thread(
+            target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+        ).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        fake_time = FakeTime()
+        client = WebhookClient(
+            server.url, sleep=fake_time.sleep, clock=fake_time.clock, **kwargs
+        )
+        self.addCleanup(client.close)
+        return server, client, fake_time
+
+    def test_reuses_one_connection_and_waits_for_messages(self):
+        server, client, fake_time = self._client([])
+        for i in range(5):
+            client.send({"content": f"msg {i}"})
+        self.assertEqual(
+            [b["content"] for _, b in server.received], [f"msg {i}" for i in range(5)]
+        )
+        self.assertEqual(len(set(server.client_ports)), 1)
+        self.assertTrue(all(path.endswith("?wait=true") for path, _ in server.received))
+        self.assertEqual(fake_time.sleeps, [])  # no fixed pacing anymore
+
+    def test_waits_for_bucket_reset_when_remaining_hits_zero(self):
+        script = [
+            (200, {"X-RateLimit-Remaining": "1", "X-RateLimit-Reset-After": "2.5"}, {}),
+            (
+                200,
+                {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "1.75"},
+                {},
+            ),
+        ]
+        server, client, fake_time = self._client(script)
+        client.send({"content": "a"})
+        client.send({"content": "b"})
+        self.assertEqual(fake_time.sleeps, [])
+        client.send({"content": "c"})
+        self.assertEqual(fake_time.sleeps, [1.75])
+        self.assertEqual(len(server.received), 3)
+
+    def test_429_waits_retry_after_and_resends(self):
+        script = [(429, {"Retry-After": "9"}, {"retry_after": 0.6, "global": False})]
+        server, client, fake_time = self._client(script)
+        resp = client.send({"content": "a"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(fake_time.sleeps, [0.6])
+        self.assertEqual([b for _, b in server.received], [{"content": "a"}] * 2)
+
+    def test_server_errors_back_off_exponentially(self):
+        script = [(502, {}, {}), (503, {}, {}), (504, {}, {})]
+        server, client, fake_time = self._client(script, backoff=0.5)
+        client.send({"content": "a"})
+        self.assertEqual(fake_time.sleeps, [0.5, 1.0, 2.0])
+        self.assertEqual(len(server.received), 4)
+
+    def test_gives_up_after_max_retries(self):
+        server, client, fake_time = self._client([(503, {}, {})] * 3, max_retries=2)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            client.send({"content": "a"})
+        self.assertEqual(len(server.received), 3)
+
+    def test_non_retryable_errors_raise_immediately(self):
+        for status in (400, 404, 500):
+            server, client, fake_time = self._client([(status, {}, {})])
+            with self.assertRaises(requests.exceptions.HTTPError):
+                client.send({"content": "a"})
+            self.assertEqual(len(server.received), 1)
+            self.assertEqual(fake_time.sleeps, [])
+
+    def test_connection_errors_are_retried(self):
+        # nothing listens on this port once the server is gone
+        server, client, fake_time = self._client([])
+        server.shutdown()
+        server.server_close()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.send({"content": "a"})
+        self.assertEqual(fake_time.sleeps, [1.0, 2.0, 4.0, 8.0, 16.0])
+
+    def test_dropped_after_sending_is_not_retried(self):
+        # discord might have posted it already, a resend could duplicate it
+        server, client, fake_time = self._client([None])
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.send({"content": "a"})
+        self.assertEqual(len(server.received), 1)
+        self.assertEqual(fake_time.sleeps, [])
+
+
+class TestEmbedPacking(unittest.TestCase):
+    def test_ten_embeds_per_message(self):
+        embeds = [make_embed(f"book {i}", f"https://x/{i}", "meh") for i in range(23)]
+        payloads = list(pack_embeds(embeds, content="intro"))
+        self.assertEqual([len(p["embeds"]) for p in payloads], [10, 10, 3])
+        self.assertEqual(payloads[0]["content"], "intro")
+        self.assertNotIn("content", payloads[1])
+        self.assertEqual(
+            [e["title"] for p in payloads for e in p["embeds"]],
+            [f"book {i}" for i in range(23)],
+        )
+
+    def test_typical_run_is_one_message(self):
+        embeds = [
+            make_embed(f"book {i}", f"https://x/{i}", "r" * 500) for i in range(5)
+        ]
+        payloads = list(pack_embeds(embeds, content="intro"))
+        self.assertEqual(len(payloads), 1)
+
+    def test_splits_on_character_budget(self):
+        # 4 x 2500 chars only fits 2 per message under the 6000 total
+        embeds = [make_embed(f"b{i}", "https://x", "r" * 2498) for i in range(4)]
+        payloads = list(pack_embeds(embeds))
+        self.assertEqual([len(p["embeds"]) for p in payloads], [2, 2])
+
+    def test_long_fields_are_truncated(self):
+        embed = make_embed("t" * 300, "https://x", "r" * 5000)
+        self.assertEqual(len(embed["title"]), 256)
+        self.assertEqual(len(embed["description"]), MAX_DESCRIPTION_CHARS)
+        self.assertTrue(embed["description"].endswith("…"))
+
+    def test_lazy_and_empty(self):
+        self.assertEqual(
+            list(pack_embeds([], content="intro")), [{"content": "intro", "embeds": []}]
+        )
+        self.assertEqual(list(pack_embeds([])), [])
+
+
+class TestDryRunSink(unittest.TestCase):
+    def test_stdout(self):
+        out = io.StringIO()
+        sink = DryRunSink("stdout", out=out)
+        resp = sink.send({"content": "intro", "embeds": [make_embed("t", "u", "d")]})
+        self.assertEqual(resp.status_code, "dry-run")
+        self.assertEqual(out.getvalue(), "intro\n[t](u)\nd\n---\n")
+
+    def test_json_lines_with_elapsed_time(self):
+        out = io.StringIO()
+        fake_time = FakeTime()
+        sink = DryRunSink("json", out=out, clock=fake_time.clock)
+        sink.send({"content": "a"})
+        fake_time.sleep(1.5)
+        sink.send({"content": "b"})
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            lines,
+            [
+                {"t": 0.0, "payload": {"content": "a"}},
+                {"t": 1.5, "payload": {"content": "b"}},
+            ],
+        )
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            DryRunSink("discord")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,815 @@
+#!/usr/bin/env python3
+"""ad-hoc scenarios for qbit-folder-sync against a fake qbittorrent. not run in the image build.
+
+usage:
+    python benchmark.py daemon                      # completion -> link latency, idle api traffic
+    python benchmark.py daemon --poll-interval 0.2  # same, polling faster
+    python benchmark.py trackers --torrents 5000    # api calls per sync run, caches cold and warm
+    python benchmark.py workers --latency-ms 10     # sync time per worker count, slow api
+    python benchmark.py linker --files 20000        # per-file link/mkdir vs planned, no api
+    python benchmark.py copy --loopback btrfs xfs   # copy2 vs reflink/copy_file_range (root)
+    python benchmark.py topology                    # cross-device output, per LINK_POLICY
+    python benchmark.py verify                      # damage OUTPUT_DIR, time the repairing resync
+    python benchmark.py dedupe                      # copy mode with cross-seeds, index on/off
+    python benchmark.py gc --torrents 2000          # orphan collection vs an rglob set-diff
+"""
+
+import argparse
+import contextlib
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+import main
+from test_sync import OTHER_TRACKERS, TRACKERS, FakeQbit, make_torrent, wait_for
+
+COPY_BENCH_CHUNK = 1024 * 1024
+
+
+def cmd_daemon(args: argparse.Namespace) -> None:
+    if not args.verbose:
+        logging.getLogger("qbit-sync").setLevel(logging.WARNING)
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir, output_dir = Path(tmp) / "downloads", Path(tmp) / "output"
+        fake = FakeQbit(input_dir).start()
+        for i in range(args.torrents):
+            files = make_torrent(input_dir, f"seeded.{i}", args.files, 1024)
+            fake.add_torrent(f"seeded.{i}", files, TRACKERS, "stalledUP")
+        late = [
+            (
+                name,
+                fake.add_torrent(
+                    name,
+                    make_torrent(input_dir, name, args.files, 1024),
+                    TRACKERS,
+                ),
+            )
+            for name in ("late.one", "late.two")
+        ]
+
+        main.config.update(
+            qbit_url=fake.url,
+            input_dir=input_dir,
+            output_dir=output_dir,
+            desired_trackers={"tracker.example"},
+            link_mode="hardlink",
+        )
+        client = main.connect_client(retries=0, delay=0)
+        if client is None:
+            sys.exit("could not connect to the fake qbittorrent")
+        syncer = main.QbitSync(client, main.config)
+        stop = threading.Event()
+        watcher = threading.Thread(target=syncer.watch, args=(args.poll_interval, stop))
+        start = time.perf_counter()
+        watcher.start()
+
+        expected = args.torrents * args.files
+        initial_ok = wait_for(
+            lambda: sum(1 for p in output_dir.rglob("*.bin")) >= expected, timeout=30
+        )
+        print(f"initial sync: {expected} files in {time.perf_counter() - start:.2f}s")
+        if not initial_ok:
+            failures.append("initial sync never finished")
+
+        calls = fake.total_calls()
+        time.sleep(args.idle)
+        idle_calls = fake.total_calls() - calls
+        polls = max(args.idle / args.poll_interval, 1)
+        print(
+            f"idle {args.idle:.1f}s: {idle_calls} api calls ({idle_calls / polls:.2f} per poll)"
+        )
+        if idle_calls > polls + 1:
+            failures.append("idle polling did more than one request per poll")
+
+        for i, (name, torrent_hash) in enumerate(late):
+            if i == 1:
+                fake.forbidden = (
+                    1  # session expired: next poll 403s, daemon logs back in
+                )
+            first = output_dir / main.sanitize_filename(name) / name / "part00.bin"
+            completed_at = time.perf_counter()
+            fake.complete(torrent_hash)
+            linked = wait_for(first.exists, timeout=args.poll_interval * 4 + 5)
+            latency = time.perf_counter() - completed_at
+            note = " (after a 403)" if i == 1 else ""
+            if linked:
+                print(f"completion -> link{note}: {latency * 1000:.0f} ms")
+            else:
+                failures.append(f"'{name}' was never linked{note}")
+
+        stop.set()
+        watcher.join()
+        fake.stop()
+        print("api calls by endpoint:")
+        for endpoint, count in fake.calls.most_common():
+            print(f"  {count:5d}  {endpoint}")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+def cmd_trackers(args: argparse.Namespace) -> None:
+    if not args.verbose:
+        logging.getLogger("qbit-sync").setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir, output_dir = Path(tmp) / "downloads", Path(tmp) / "output"
+        fake = FakeQbit(input_dir).start()
+        # mostly single-tracker torrents, some with no working tracker right now
+        # and some multi-tracker ones where the current tracker isn't the desired one
+        kinds = Counter()
+        desired_names = []
+        for i in range(args.torrents):
+            roll = rng.random()
+            if roll < 0.5:
+                kind, trackers, working = "desired", TRACKERS, True
+            elif roll < 0.8:
+                kind, trackers, working = "other", OTHER_TRACKERS, True
+            elif roll < 0.9:
+                kind, trackers, working = "no working tracker", TRACKERS, False
+            else:
+                kind, trackers, working = (
+                    "multi-tracker",
+                    OTHER_TRACKERS + TRACKERS,
+                    True,
+                )
+            kinds[kind] += 1
+            name = f"t{i:05d}"
+            if kind == "desired":
+                desired_names.append(name)
+            files = make_torrent(input_dir, name, 1, 16)
+            fake.add_torrent(name, files, trackers, "stalledUP", working)
+        print(
+            f"{args.torrents} completed torrents: "
+            + ", ".join(f"{n} {kind}" for kind, n in kinds.items())
+        )
+
+        main.config.update(
+            qbit_url=fake.url,
+            input_dir=input_dir,
+            output_dir=output_dir,
+            desired_trackers={"tracker.example"},
+            link_mode="hardlink",
+            state_dir=Path(tmp) / "state",
+        )
+        ambiguous = kinds["no working tracker"] + kinds["multi-tracker"]
+        some_desired = output_dir / main.sanitize_filename(desired_names[0])
+        runs = [
+            ("cold cache, full resync", True, None),
+            ("warm cache, full resync", True, None),
+            ("synced state, nothing changed", False, None),
+            ("synced state, one output dir deleted", False, some_desired),
+        ]
+        lookups, reprocessed = [], []
+        for label, full_resync, delete in runs:
+            if delete:
+                shutil.rmtree(delete)
+            main.config["full_resync"] = full_resync
+            client = main.connect_client(retries=0, delay=0)
+            before = Counter(fake.calls)
+            start = time.perf_counter()
+            main.QbitSync(client, main.config).sync_torrents()
+            elapsed = time.perf_counter() - start
+            calls = fake.calls - before
+            lookups.append(calls["torrents/trackers"])
+            reprocessed.append(calls["torrents/files"])
+            print(
+                f"{label}: {sum(calls.values())} api calls, "
+                f"{calls['torrents/trackers']} tracker lookups, "
+                f"{calls['torrents/files']} torrents linked in {elapsed:.2f}s"
+            )
+        print(f"(one tracker lookup per torrent before: {args.torrents})")
+        fake.stop()
+
+    if lookups[0] > ambiguous:
+        sys.exit(
+            f"FAIL: {lookups[0]} tracker lookups for {ambiguous} ambiguous torrents"
+        )
+    if lookups[1]:
+        sys.exit("FAIL: tracker lookups with a warm cache")
+    if reprocessed[2:] != [0, 1]:
+        sys.exit(f"FAIL: expected 0 then 1 torrents re-linked, got {reprocessed[2:]}")
+
+
+def cmd_workers(args: argparse.Namespace) -> None:
+    if not args.verbose:
+        logging.getLogger("qbit-sync").setLevel(logging.WARNING)
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = Path(tmp) / "downloads"
+        fake = FakeQbit(input_dir).start()
+        fake.latency = args.latency_ms / 1000
+        for i in range(args.torrents):
+            name = f"t{i:05d}"
+            fake.add_torrent(
+                name,
+                make_torrent(input_dir, name, args.files, 16),
+                TRACKERS,
+                "stalledUP",
+            )
+        print(
+            f"{args.torrents} torrents x {args.files} files, "
+            f"{args.latency_ms:g} ms per api call, {args.http_pool} http connections"
+        )
+        for workers in args.workers:
+            output_dir = Path(tmp) / f"output-{workers}"
+            main.config.update(
+                qbit_url=fake.url,
+                input_dir=input_dir,
+                output_dir=output_dir,
+                desired_trackers={"tracker.example"},
+                link_mode="hardlink",
+                full_resync=True,
+                workers=workers,
+                http_pool_size=args.http_pool,
+            )
+            client = main.connect_client(retries=0, delay=0)
+            syncer = main.QbitSync(client, main.config)
+            connections = fake.connections
+            start = time.perf_counter()
+            counts = syncer._sync_all(client.torrents(filter="completed"))
+            elapsed = time.perf_counter() - start
+            linked = sum(1 for _ in output_dir.rglob("*.bin"))
+            print(
+                f"  {workers:3d} workers: {elapsed:6.2f}s, "
+                f"{fake.connections - connections} connections opened, "
+                f"{counts['synced']} synced / {counts['failed']} failed, {linked} files"
+            )
+            if (
+                counts["synced"] != args.torrents
+                or linked != args.torrents * args.files
+            ):
+                failures.append(f"{workers} workers: counts or links don't add up")
+        fake.stop()
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+def naive_link(pairs: list[tuple[str, str]]) -> None:
+    """what the linker did per file before plans: stat, mkdir -p, link."""
+    for src, dst in pairs:
+        src, dst = Path(src), Path(dst)
+        if dst.exists():
+            continue
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        os.link(src, dst)
+
+
+def cmd_linker(args: argparse.Namespace) -> None:
+    logging.getLogger("qbit-sync").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = Path(tmp) / "downloads"
+        rels = [
+            f"scans/vol{i % args.dirs:03d}/page{i:06d}.jpg" for i in range(args.files)
+        ]
+        for rel in rels:
+            (input_dir / rel).parent.mkdir(parents=True, exist_ok=True)
+            (input_dir / rel).touch()
+        print(f"{args.files} files in {args.dirs} dirs")
+
+        def pairs_for(output_dir: Path):
+            return [
+                (os.path.join(input_dir, rel), os.path.join(output_dir, "scans", rel))
+                for rel in rels
+            ]
+
+        def planned(output_dir: Path) -> None:
+            syncer = main.QbitSync(
+                None,
+                {
+                    **main.config,
+                    "input_dir": input_dir,
+                    "output_dir": output_dir,
+                    "desired_trackers": {"tracker.example"},
+                },
+            )
+            plan = syncer._plan_links(pairs_for(output_dir))
+            syncer._execute_plan(plan)
+
+        for label, link in (("per file", naive_link), ("planned", planned)):
+            times = {"fresh": [], "rerun": []}
+            for run in range(args.repeat):
+                output_dir = Path(tmp) / f"out-{label.replace(' ', '-')}-{run}"
+                for phase in times:
+                    start = time.perf_counter()
+                    if link is naive_link:
+                        naive_link(pairs_for(output_dir))
+                    else:
+                        planned(output_dir)
+                    times[phase].append(time.perf_counter() - start)
+                shutil.rmtree(output_dir)
+            print(
+                f"  {label:>8}: fresh {min(times['fresh']) * 1000:7.1f} ms, "
+                f"rerun (all present) {min(times['rerun']) * 1000:7.1f} ms"
+            )
+
+
+@contextlib.contextmanager
+def loopback(fstype: str, size_mb: int, workdir: Path):
+    """mount a fresh image formatted with fstype, needs root and mkfs.<fstype>."""
+    image, mountpoint = workdir / f"{fstype}.img", workdir / fstype
+    with open(image, "wb") as f:
+        f.truncate(size_mb * 1024 * 1024)
+    subprocess.run([f"mkfs.{fstype}", "-q", str(image)], check=True)
+    mountpoint.mkdir()
+    subprocess.run(["mount", "-o", "loop", str(image), str(mountpoint)], check=True)
+    try:
+        yield mountpoint
+    finally:
+        subprocess.run(["umount", str(mountpoint)], check=True)
+        image.unlink()
+
+
+def time_copy(copy, src: Path, dst: Path) -> float:
+    """seconds for one copy, including getting it to disk."""
+    start = time.perf_counter()
+    copy(str(src), str(dst))
+    os.sync()
+    elapsed = time.perf_counter() - start
+    dst.unlink()
+    return elapsed
+
+
+def cmd_copy(args: argparse.Namespace) -> None:
+    size = args.size_mb * 1024 * 1024
+    throttle = main.Throttle(args.bandwidth_mb * 1024 * 1024)
+    methods = {
+        "copy2 (before)": shutil.copy2,
+        "LINK_MODE=copy": lambda s, d: main.copy_file(s, d, throttle=throttle),
+        "LINK_MODE=reflink": lambda s, d: main.copy_file(s, d, reflink_only=True),
+    }
+    with tempfile.TemporaryDirectory() as tmp, contextlib.ExitStack() as stack:
+        targets = [Path(d) for d in args.dir] or [Path(tmp) / "plain"]
+        for fstype in args.loopback:
+            image_mb = args.size_mb * 3 + 300
+            targets.append(stack.enter_context(loopback(fstype, image_mb, Path(tmp))))
+        for target in targets:
+            target.mkdir(exist_ok=True)
+            src = target / "qbit-sync-bench.src"
+            with open(src, "wb") as f:
+                for _ in range(0, size, COPY_BENCH_CHUNK):
+                    f.write(os.urandom(COPY_BENCH_CHUNK))
+            os.sync()
+            print(f"{target} ({args.size_mb} MB file):")
+            try:
+                for label, copy in methods.items():
+                    dst = target / "qbit-sync-bench.dst"
+                    try:
+                        how = ""
+                        if label == "LINK_MODE=copy":
+                            how = main.copy_file(str(src), str(dst))
+                            dst.unlink()
+                            how = f" (via {how})"
+                        best = min(
+                            time_copy(copy, src, dst) for _ in range(args.repeat)
+                        )
+                        print(
+                            f"  {label:>18}: {best * 1000:8.1f} ms, "
+                            f"{args.size_mb / best:8.0f} MB/s{how}"
+                        )
+                    except OSError as e:
+                        print(f"  {label:>18}: unsupported ({e.strerror})")
+            finally:
+                src.unlink()
+
+
+def cmd_topology(args: argparse.Namespace) -> None:
+    if not args.verbose:
+        logging.getLogger("qbit-sync").setLevel(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory(
+        dir=args.other_fs
+    ) as other:
+        input_dir = Path(tmp) / "downloads"
+        if os.stat(tmp).st_dev == os.stat(other).st_dev:
+            sys.exit(f"{args.other_fs} is on the same filesystem as {tmp}")
+        fake = FakeQbit(input_dir).start()
+        for i in range(args.torrents):
+            name = f"t{i:04d}"
+            files = make_torrent(input_dir, name, args.files, 16)
+            fake.add_torrent(name, files, TRACKERS, "stalledUP")
+        print(
+            f"{args.torrents} torrents x {args.files} files, output on another "
+            f"filesystem ({args.other_fs})"
+        )
+        for policy in args.policies:
+            output_dir = Path(other) / policy.replace(",", "-")
+            main.config.update(
+                qbit_url=fake.url,
+                input_dir=input_dir,
+                output_dir=output_dir,
+                desired_trackers={"tracker.example"},
+                link_mode="hardlink",
+                link_policy=policy.split(","),
+                full_resync=True,
+                state_dir=Path(tmp) / "state",
+            )
+            syncer = main.QbitSync(main.connect_client(retries=0, delay=0), main.config)
+            start = time.perf_counter()
+            counts = syncer._sync_all(syncer.client.torrents(filter="completed"))
+            elapsed = time.perf_counter() - start
+            placed = (
+                sum(1 for p in output_dir.rglob("*.bin")) if output_dir.exists() else 0
+            )
+            modes = ", ".join(str(m) for m in syncer.modes.values())
+            print(
+                f"  LINK_POLICY={policy:<24} -> {modes:<8} {elapsed:6.2f}s, "
+                f"{counts['synced']} synced / {counts['failed']} failed, {placed} files"
+            )
+        fake.stop()
+
+
+def damage(path: Path, how: str) -> None:
+    """break one destination file the way real setups do."""
+    st = path.stat()
+    if how == "stale":  # replaced by an unrelated file, e.g. an old download
+        path.unlink()
+        path.write_bytes(b"y" * st.st_size)
+    elif how == "truncated":  # interrupted copy from before temp files
+        with open(path, "r+b") as f:
+            f.truncate(st.st_size // 2)
+    elif how == "corrupted":  # same size and mtime, different bytes
+        with open(path, "r+b") as f:
+            f.write(b"z")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def cmd_verify(args: argparse.Namespace) -> None:
+    if not args.verbose:
+        logging.getLogger("qbit-sync").setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = Path(tmp) / "downloads"
+        fake = FakeQbit(input_dir).start()
+        for i in range(args.torrents):
+            name = f"t{i:04d}"
+            fake.add_torrent(
+                name,
+                make_torrent(input_dir, name, args.files, 4096),
+                TRACKERS,
+                "stalledUP",
+            )
+        total = args.torrents * args.files
+        for mode, kinds in (
+            ("hardlink", ["stale"]),
+            ("copy", ["stale", "truncated", "corrupted"]),
+        ):
+            output_dir = Path(tmp) / f"output-{mode}"
+            main.config.update(
+                qbit_url=fake.url,
+                input_dir=input_dir,
+                output_dir=output_dir,
+                desired_trackers={"tracker.example"},
+                link_mode=mode,
+                link_policy=[mode],
+                full_resync=True,
+                verify=True,
+                verify_hash_sample=1.0,
+                state_dir=Path(tmp) / "state",
+            )
+
+            def run() -> tuple[float, "main.QbitSync"]:
+                syncer = main.QbitSync(main.connect_client(retries=0), main.config)
+                start = time.perf_counter()
+                syncer._sync_all(syncer.client.torrents(filter="completed"))
+                return time.perf_counter() - start, syncer
+
+            fresh, _ = run()
+            files = sorted(output_dir.rglob("*.bin"))
+            damaged = {}
+            for path in rng.sample(files, args.damage * len(kinds)):
+                damaged[path] = kinds[len(damaged) % len(kinds)]
+                damage(path, damaged[path])
+            elapsed, syncer = run()
+            repaired = syncer.totals["repair"]
+            still_bad = [
+                p
+                for p in damaged
+                # output is <torrent dir>/<path in torrent>, input just the latter
+                if p.read_bytes()
+                != input_dir.joinpath(*p.relative_to(output_dir).parts[1:]).read_bytes()
+            ]
+            print(
+                f"{mode}: fresh sync of {total} files {fresh:.2f}s, resync with "
+                f"{len(damaged)} damaged ({', '.join(kinds)}) {elapsed:.2f}s, {repaired} repaired"
+            )
+            if repaired != len(damaged) or still_bad:
+                failures.append(f"{mode}: {len(still_bad)} damaged files left")
+        fake.stop()
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+def disk_usage(root: Path) -> int:
+    """bytes allocated under root, hardlinked files counted once."""
+    seen = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            st = os.lstat(os.path.join(dirpath, filename))
+            seen[(st.st_dev, st.st_ino)] = st.st_blocks * 512
+    return sum(seen.values())
+
+
+def cmd_dedupe(args: argparse.Namespace) -> None:
+    if not args.verbose:
+        logging.getLogger("qbit-sync").setLevel(logging.WARNING)
+    size = args.size_mb * 1024 * 1024
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = Path(tmp) / "downloads"
+        fake = FakeQbit(input_dir).start()
+        originals = []
+        for i in range(args.torrents):
+            name = f"t{i:04d}"
+            files = make_torrent(input_dir, name, args.files, size)
+            originals.append(fake.add_torrent(name, files, TRACKERS, "stalledUP"))
+        print(
+            f"{args.torrents} torrents of {args.files} x {args.size_mb} MiB, "
+            f"then {args.cross_seeds} cross-seeds of each (hardlinked in INPUT_DIR)"
+        )
+
+        for dedupe in (False, True):
+            label = "index on" if dedupe else "index off"
+            output_dir = Path(tmp) / f"output-{label.replace(' ', '-')}"
+            main.config.update(
+                qbit_url=fake.url,
+                input_dir=input_dir,
+                output_dir=output_dir,
+                desired_trackers={"tracker.example"},
+                link_mode="copy",
+                link_policy=["copy"],
+                full_resync=False,
+                verify=True,
+                dedupe_copies=dedupe,
+                state_dir=None,
+            )
+
+            def run() -> float:
+                # new syncer each time, the index has to come from disk
+                syncer = main.QbitSync(main.connect_client(retries=0), main.config)
+                start = time.perf_counter()
+                syncer.sync_torrents()
+                return time.perf_counter() - start
+
+            for h in list(fake.torrents):
+                if h not in originals:
+                    fake.remove(h)
+            first = run()
+            base = disk_usage(output_dir)
+            for n in range(args.cross_seeds):
+                for i in range(args.torrents):
+                    name = f"xs{n}-t{i:04d}"
+                    files = {}
+                    for j in range(args.files):
+                        rel = f"{name}/renamed{j:02d}.bin"
+                        (input_dir / rel).parent.mkdir(parents=True, exist_ok=True)
+                        if not (input_dir / rel).exists():
+                            os.link(
+                                input_dir / f"t{i:04d}/part{j:02d}.bin", input_dir / rel
+                            )
+                        files[rel] = size
+                    fake.add_torrent(name, files, TRACKERS, "stalledUP")
+            second = run()
+            added = disk_usage(output_dir) - base
+            print(
+                f"  {label:9}: originals {first:.2f}s ({base / 2**20:.0f} MiB), "
+                f"cross-seeds {second:.2f}s (+{added / 2**20:.0f} MiB)"
+            )
+            if dedupe and added > base // 100:
+                failures.append(f"cross-seeds added {added} bytes with the index on")
+        fake.stop()
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+def naive_orphans(output_dir: Path, expected: set[str]) -> set[Path]:
+    """the obvious version: Path objects for everything on both sides."""
+    want = {output_dir / rel for rel in expected}
+    have = {
+        p for p in output_dir.rglob("*") if p.is_file() and ".qbit-sync" not in p.parts
+    }
+    return have - want
+
+
+def measure(fn) -> tuple[float, float, object]:
+    """(seconds, peak MiB allocated, result), timed and traced in separate calls."""
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def count_files(root: Path) -> int:
+    return sum(len(filenames) for _, _, filenames in os.walk(root))
+
+
+def cmd_gc(args: argparse.Namespace) -> None:
+    if not args.verbose:
+        logging.getLogger("qbit-sync").setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = Path(tmp) / "downloads"
+        output_dir = Path(tmp) / "output"
+        fake = FakeQbit(input_dir).start()
+        hashes = []
+        for i in range(args.torrents):
+            name = f"t{i:05d}"
+            files = make_torrent(input_dir, name, args.files, 1)
+            hashes.append(fake.add_torrent(name, files, TRACKERS, "stalledUP"))
+        main.config.update(
+            qbit_url=fake.url,
+            input_dir=input_dir,
+            output_dir=output_dir,
+            desired_trackers={"tracker.example"},
+            link_mode="hardlink",
+            link_policy=["hardlink"],
+            dry_run=False,
+            gc_quarantine_dir=None,
+            state_dir=None,
+        )
+        syncer = main.QbitSync(main.connect_client(retries=0), main.config)
+        syncer.sync_torrents()
+
+        # orphans: removed torrents, plus leftovers inside kept ones
+        removed = rng.sample(hashes, args.torrents * args.removed_pct // 100)
+        for torrent_hash in removed:
+            fake.remove(torrent_hash)
+        for torrent_hash in rng.sample(sorted(set(hashes) - set(removed)), 10):
+            name = fake.torrents[torrent_hash]["name"]
+            (output_dir / name / "leftover.nfo").write_text("old")
+        total = count_files(output_dir)
+        print(
+            f"{total} files in OUTPUT_DIR, {len(removed)} of {args.torrents} torrents "
+            f"removed from qbit, 10 leftover files in kept ones"
+        )
+
+        expected = syncer._expected_outputs()[0]
+        elapsed, peak, orphans = measure(lambda: naive_orphans(output_dir, expected))
+        print(
+            f"  rglob + Path sets: {elapsed:6.2f}s, peak {peak:6.1f} MiB, {len(orphans)} orphans"
+        )
+
+        main.config.update(dry_run=True)
+        dry = main.QbitSync(syncer.client, main.config)
+        elapsed, peak, stats = measure(dry.collect_garbage)
+        print(
+            f"   gc dry run total: {elapsed:6.2f}s, peak {peak:6.1f} MiB, "
+            f"{stats['files']} orphans (incl. file listing api calls)"
+        )
+        if stats["files"] != len(orphans) or count_files(output_dir) != total:
+            failures.append(
+                "dry run disagrees with the naive set-diff or touched files"
+            )
+
+        main.config.update(dry_run=False, gc_quarantine_dir=Path(tmp) / "quarantine")
+        start = time.perf_counter()
+        stats = main.QbitSync(syncer.client, main.config).collect_garbage()
+        print(
+            f"   gc (quarantine): {time.perf_counter() - start:6.2f}s, "
+            f"{stats['files']} files moved, {stats['emptied dirs']} emptied dirs removed"
+        )
+        left = [p for p in orphans if p.exists()]
+        missing = [rel for rel in expected if not (output_dir / rel).exists()]
+        if left or missing or count_files(Path(tmp) / "quarantine") != len(orphans):
+            failures.append(
+                f"{len(left)} orphans left, {len(missing)} expected files gone"
+            )
+        fake.stop()
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    daemon = sub.add_parser(
+        "daemon", help="daemon mode: completion -> link latency and idle api traffic"
+    )
+    daemon.add_argument("--torrents", type=int, default=50)
+    daemon.add_argument("--files", type=int, default=5)
+    daemon.add_argument("--poll-interval", type=float, default=0.5)
+    daemon.add_argument("--idle", type=float, default=3.0)
+    daemon.add_argument("-v", "--verbose", action="store_true")
+    daemon.set_defaults(func=cmd_daemon)
+
+    trackers = sub.add_parser(
+        "trackers",
+        help="api calls per sync run: tracker cache cold/warm, synced-state skips",
+    )
+    trackers.add_argument("--torrents", type=int, default=2000)
+    trackers.add_argument("--seed", type=int, default=0)
+    trackers.add_argument("-v", "--verbose", action="store_true")
+    trackers.set_defaults(func=cmd_trackers)
+
+    workers = sub.add_parser(
+        "workers", help="sync run time per worker count against a slow fake qbit"
+    )
+    workers.add_argument("--torrents", type=int, default=200)
+    workers.add_argument("--files", type=int, default=5)
+    workers.add_argument("--latency-ms", type=float, default=10.0)
+    workers.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    workers.add_argument("--http-pool", type=int, default=4)
+    workers.add_argument("-v", "--verbose", action="store_true")
+    workers.set_defaults(func=cmd_workers)
+
+    linker = sub.add_parser(
+        "linker", help="per-file link/mkdir vs planned per-directory linking"
+    )
+    linker.add_argument("--files", type=int, default=20000)
+    linker.add_argument("--dirs", type=int, default=20)
+    linker.add_argument("--repeat", type=int, default=3)
+    linker.set_defaults(func=cmd_linker)
+
+    copy = sub.add_parser(
+        "copy", help="copy2 vs copy/reflink modes, optionally on loopback filesystems"
+    )
+    copy.add_argument("--size-mb", type=int, default=256)
+    copy.add_argument("--dir", nargs="+", default=[], help="existing dirs to test in")
+    copy.add_argument(
+        "--loopback", nargs="+", default=[], help="filesystems to mkfs and mount"
+    )
+    copy.add_argument("--bandwidth-mb", type=float, default=0.0)
+    copy.add_argument("--repeat", type=int, default=3)
+    copy.set_defaults(func=cmd_copy)
+
+    topology = sub.add_parser(
+        "topology", help="sync to another filesystem under different LINK_POLICY values"
+    )
+    topology.add_argument("--torrents", type=int, default=200)
+    topology.add_argument("--files", type=int, default=20)
+    topology.add_argument(
+        "--other-fs", default="/dev/shm", help="a dir on a different filesystem"
+    )
+    topology.add_argument(
+        "--policies", nargs="+", default=["hardlink", "hardlink,reflink,copy"]
+    )
+    topology.add_argument("-v", "--verbose", action="store_true")
+    topology.set_defaults(func=cmd_topology)
+
+    verify = sub.add_parser(
+        "verify", help="damage some synced files, check a resync finds and repairs them"
+    )
+    verify.add_argument("--torrents", type=int, default=100)
+    verify.add_argument("--files", type=int, default=20)
+    verify.add_argument("--damage", type=int, default=10, help="files per kind")
+    verify.add_argument("--seed", type=int, default=0)
+    verify.add_argument("-v", "--verbose", action="store_true")
+    verify.set_defaults(func=cmd_verify)
+
+    dedupe = sub.add_parser(
+        "dedupe", help="copy mode: time and space for cross-seeds, copy index on/off"
+    )
+    dedupe.add_argument("--torrents", type=int, default=20)
+    dedupe.add_argument("--files", type=int, default=5)
+    dedupe.add_argument("--size-mb", type=int, default=4)
+    dedupe.add_argument("--cross-seeds", type=int, default=2)
+    dedupe.add_argument("-v", "--verbose", action="store_true")
+    dedupe.set_defaults(func=cmd_dedupe)
+
+    gc = sub.add_parser(
+        "gc",
+        help="orphan collection in OUTPUT_DIR vs an rglob set-diff, time and memory",
+    )
+    gc.add_argument("--torrents", type=int, default=1000)
+    gc.add_argument("--files", type=int, default=50)
+    gc.add_argument("--removed-pct", type=int, default=10)
+    gc.add_argument("--seed", type=int, default=0)
+    gc.add_argument("-v", "--verbose", action="store_true")
+    gc.set_defaults(func=cmd_gc)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main_cli()
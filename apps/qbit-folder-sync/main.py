@@ -1,12 +1,24 @@
 #!/usr/bin/env python
 
 import os
+import random
 import sys
+import errno
+import fcntl
+import hashlib
+import itertools
+import json
 import logging
 import shutil
+import signal
+import stat
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
 # using python-qbittorrent library (make sure it's installed)
 try:
@@ -17,6 +29,11 @@ except ImportError:
         file=sys.stderr,
     )
     sys.exit(1)
+try:
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    print("error: 'requests' library not found. pip install requests", file=sys.stderr)
+    sys.exit(1)
 
 # --- configuration ---
 # load config from environment variables w/ defaults
@@ -33,11 +50,87 @@ config = {
     "desired_trackers": set(
         filter(None, os.getenv("DESIRED_TRACKERS", "").split(","))
     ),  # comma-separated tracker urls (or parts)
-    "link_mode": os.getenv("LINK_MODE", "hardlink").lower(),  # 'hardlink' or 'copy'
+    # 'hardlink', 'reflink' or 'copy'
+    "link_mode": os.getenv("LINK_MODE", "hardlink").lower(),
+    # modes to try per source filesystem, cheapest first. defaults to just LINK_MODE
+    "link_policy": [
+        mode.strip()
+        for mode in os.getenv("LINK_POLICY", "").lower().split(",")
+        if mode.strip()
+    ],
     "log_level": os.getenv("LOG_LEVEL", "INFO").upper(),
     "connection_retries": int(os.getenv("CONNECTION_RETRIES", "3")),
     "connection_retry_delay": int(os.getenv("CONNECTION_RETRY_DELAY", "5")),
+    # keep running and poll for newly completed torrents instead of a single run
+    "daemon": os.getenv("DAEMON", "").lower() in ("1", "true", "yes"),
+    "poll_interval": float(os.getenv("POLL_INTERVAL", "5")),  # seconds, daemon mode
+    # seconds until the daemon tries a torrent that failed to sync again
+    "retry_interval": float(os.getenv("RETRY_INTERVAL", "60")),
+    # where caches between runs live, defaults to OUTPUT_DIR/.qbit-sync
+    "state_dir": Path(os.getenv("STATE_DIR")) if os.getenv("STATE_DIR") else None,
+    # re-check every torrent instead of skipping ones synced before
+    "full_resync": os.getenv("FULL_RESYNC", "").lower() in ("1", "true", "yes"),
+    "workers": int(os.getenv("WORKERS", "4")),  # torrents processed at once
+    # http connections kept open to qbit. workers beyond this wait for a free one
+    "http_pool_size": int(os.getenv("HTTP_POOL_SIZE", "4")),
+    # log what would be created in OUTPUT_DIR without touching it
+    "dry_run": os.getenv("DRY_RUN", "").lower() in ("1", "true", "yes"),
+    # copies/reflinks of files this big go through a separate, smaller pool
+    "large_file_mb": int(os.getenv("LARGE_FILE_MB", "64")),
+    "copy_workers": int(os.getenv("COPY_WORKERS", "2")),
+    # cap on data actually copied (reflinks are free), MB/s over all workers. 0 = none
+    "copy_bandwidth_mb": float(os.getenv("COPY_BANDWIDTH_MB", "0")),
+    # check files already in OUTPUT_DIR (inode for hardlinks, size/mtime for
+    # copies) and replace the ones that don't match their source
+    "verify": os.getenv("VERIFY", "true").lower() in ("1", "true", "yes"),
+    # share of copies (0-1) that also get sampled blocks compared
+    "verify_hash_sample": float(os.getenv("VERIFY_HASH_SAMPLE", "0")),
+    # copy/reflink: link duplicates of an already copied source to that copy. opt-in,
+    # people pick copy mode for independent files
+    "dedupe_copies": os.getenv("DEDUPE_COPIES", "").lower() in ("1", "true", "yes"),
+    # remove what no torrent in qbit maps to anymore (after a run, at daemon start)
+    "gc": os.getenv("GC", "").lower() in ("1", "true", "yes"),
+    "gc_quarantine_dir": (
+        Path(os.getenv("GC_QUARANTINE_DIR")) if os.getenv("GC_QUARANTINE_DIR") else None
+    ),
+}
+
+# torrent states qbittorrent's own "completed" filter matches
+COMPLETED_STATES = {
+    "uploading",
+    "stalledUP",
+    "pausedUP",
+    "stoppedUP",
+    "queuedUP",
+    "forcedUP",
+    "checkingUP",
+}
+
+LINK_MODES = ["hardlink", "reflink", "copy"]
+
+# linux ioctl that makes dst share src's extents (btrfs, xfs, bcachefs...)
+FICLONE = 0x40049409
+# errnos that mean "not on this fs/kernel", as opposed to an actual io error
+UNSUPPORTED_ERRNOS = {
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
 }
+COPY_CHUNK = 8 * 1024 * 1024  # per copy_file_range/read when throttled
+# sampled content check: this many blocks spread over the file
+HASH_SAMPLE_BLOCKS = 8
+HASH_SAMPLE_BLOCK_SIZE = 64 * 1024
+
+# link relative to an open destination dir when the platform can
+LINK_DIR_FD = os.link in os.supports_dir_fd and hasattr(os, "O_DIRECTORY")
+
+# temp names don't derive from the destination's, which may already be at the
+# 255 byte limit, and are unique per call so concurrent writers can't collide.
+# random part since in a container every run is pid 1
+_TMP_PREFIX = f".qbit-sync-{os.getpid()}-{random.getrandbits(32):08x}"
+_tmp_counter = itertools.count()
 
 # --- logging setup ---
 logging.basicConfig(
@@ -46,6 +139,20 @@ logging.basicConfig(
     datefmt="%y-%m-%d %h:%m:%s",
 )
 logger = logging.getLogger("qbit-sync")
+
+# short hash of the torrent a worker is on, so interleaved lines can be told apart
+current_torrent: ContextVar[str] = ContextVar("current_torrent", default="")
+
+
+class TorrentPrefixFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        prefix = current_torrent.get()
+        if prefix:
+            record.msg = f"[{prefix}] {record.msg}"
+        return True
+
+
+logger.addFilter(TorrentPrefixFilter())
 # tone down noisy libraries
 logging.getLogger("requests").setLevel(logging.WARN)
 logging.getLogger("urllib3").setLevel(logging.WARN)
@@ -58,6 +165,128 @@ def sanitize_filename(name: str) -> str:
     return "".join(c for c in name if c.isalnum() or c in (".", "-", "_"))
 
 
+class Throttle:
+    """bandwidth cap shared by all copies, in bytes per second (0 = unlimited)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_free = time.monotonic()
+
+    def consume(self, n: int) -> None:
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(self.next_free, now)
+            self.next_free = start + n / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+def _copy_data(fsrc, fdst, throttle: Optional[Throttle]) -> str:
+    """copy_file_range if the kernel takes it, read/write otherwise. returns which."""
+    chunk = COPY_CHUNK if throttle and throttle.rate else 1 << 30
+    if hasattr(os, "copy_file_range"):
+        total = 0
+        try:
+            while True:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), chunk)
+                if not copied:
+                    break
+                total += copied
+                if throttle:
+                    throttle.consume(copied)
+        except OSError as e:
+            if total or e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+        # some filesystems report eof right away instead of an error
+        if total or not os.fstat(fsrc.fileno()).st_size:
+            return "copy_file_range"
+
+    while True:
+        data = fsrc.read(min(chunk, COPY_CHUNK))
+        if not data:
+            return "buffered"
+        fdst.write(data)
+        if throttle:
+            throttle.consume(len(data))
+
+
+def temp_path(dst_dir: str) -> str:
+    """a fresh temp name in dst_dir for something that gets renamed into place."""
+    return os.path.join(dst_dir, f"{_TMP_PREFIX}-{next(_tmp_counter)}")
+
+
+def copy_file(
+    src: str,
+    dst: str,
+    reflink_only: bool = False,
+    throttle: Optional[Throttle] = None,
+) -> str:
+    """copy src to dst the cheapest way the filesystems allow, returns how.
+
+    tries a reflink (FICLONE) first, then copy_file_range (in-kernel, and
+    server-side on nfs/smb), then a plain buffered copy. data goes to a temp
+    file next to dst which is renamed over it when complete, so an interrupted
+    copy never leaves a truncated file under the real name.
+    """
+    tmp = temp_path(os.path.dirname(dst))
+    try:
+        with open(src, "rb") as fsrc, open(tmp, "xb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                method = "reflink"
+            except OSError as e:
+                if reflink_only or e.errno not in UNSUPPORTED_ERRNOS:
+                    raise
+                method = _copy_data(fsrc, fdst, throttle)
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+        return method
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def link_replace(src: str, dst: str) -> None:
+    """hardlink src to dst, replacing whatever dst is, via a temp name next to it."""
+    tmp = temp_path(os.path.dirname(dst))
+    os.link(src, tmp)
+    try:
+        os.replace(tmp, dst)
+    except OSError:
+        os.unlink(tmp)
+        raise
+
+
+def sample_digest(path: str, size: int) -> bytes:
+    """hash of a few blocks spread evenly over the file (all of it if small)."""
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        if size <= HASH_SAMPLE_BLOCKS * HASH_SAMPLE_BLOCK_SIZE:
+            digest.update(f.read())
+        else:
+            step = (size - HASH_SAMPLE_BLOCK_SIZE) // (HASH_SAMPLE_BLOCKS - 1)
+            for i in range(HASH_SAMPLE_BLOCKS):
+                f.seek(i * step)
+                digest.update(f.read(HASH_SAMPLE_BLOCK_SIZE))
+    return digest.digest()
+
+
+def device_of(path: Path) -> int:
+    """st_dev of path, or of its closest existing parent if it isn't there yet."""
+    for p in [path, *path.parents]:
+        try:
+            return os.stat(p).st_dev
+        except OSError:
+            continue
+    return -1
+
+
 def connect_client(
     retries: int = config["connection_retries"],
     delay: int = config["connection_retry_delay"],
@@ -75,6 +304,16 @@ def connect_client(
             else:
                 logger.info("no credentials provided, skipping authentication")
 
+            # bounded, blocking pool so any number of workers share a fixed set
+            # of connections instead of opening and dropping extra ones
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=config["http_pool_size"],
+                pool_block=True,
+            )
+            client.session.mount("http://", adapter)
+            client.session.mount("https://", adapter)
+
             logger.info(
                 "connection successful. client version: %s, api version: %s",
                 client.qbittorrent_version,
@@ -94,6 +333,166 @@ def connect_client(
     return None
 
 
+class HashStore:
+    """json file of torrent hash -> entry, kept between runs in STATE_DIR."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Any] = {}
+        self.dirty = False
+        self.lock = threading.Lock()  # workers update it concurrently
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"ignoring unreadable state file {path}: {e}")
+
+    def get(self, torrent_hash: str) -> Any:
+        return self.entries.get(torrent_hash)
+
+    def set(self, torrent_hash: str, entry: Any) -> None:
+        with self.lock:
+            self.entries[torrent_hash] = entry
+            self.dirty = True
+
+    def discard(self, torrent_hash: str) -> None:
+        with self.lock:
+            if self.entries.pop(torrent_hash, None) is not None:
+                self.dirty = True
+
+    def prune(self, keep: set) -> None:
+        """forget torrents that are gone from qbit."""
+        for torrent_hash in [h for h in self.entries if h not in keep]:
+            self.discard(torrent_hash)
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with self.lock, open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp, self.path)
+            self.dirty = False
+        except OSError as e:
+            logger.warning(f"could not save state file {self.path}: {e}")
+
+
+class SyncedTorrents(HashStore):
+    """what was synced per torrent, so unchanged torrents can be skipped.
+
+    an entry holds what the torrent listing had at the time (name, size,
+    completion time), the file count, and the mtime of every output directory
+    the torrent's files went into. deleting or adding anything in those
+    directories bumps their mtime, which is how out-of-band changes to
+    OUTPUT_DIR are noticed with a stat per directory instead of per file.
+    """
+
+    def is_current(self, torrent_info: Dict[str, Any], output_dir: Path) -> bool:
+        entry = self.get(torrent_info["hash"])
+        if not entry:
+            return False
+        if (
+            entry["name"] != torrent_info.get("name")
+            or entry["size"] != torrent_info.get("size")
+            or entry["completed"] != torrent_info.get("completion_on")
+        ):
+            return False
+        for rel_dir, mtime_ns in entry["dirs"].items():
+            try:
+                if os.stat(output_dir / rel_dir).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False  # deleted (or unreadable) since the last sync
+        return True
+
+    def record(
+        self,
+        torrent_info: Dict[str, Any],
+        output_dir: Path,
+        dst_dirs: set,
+        file_count: int,
+    ) -> None:
+        dirs = {}
+        for dst_dir in dst_dirs:
+            try:
+                rel_dir = os.path.relpath(dst_dir, output_dir)
+                dirs[rel_dir] = os.stat(dst_dir).st_mtime_ns
+            except OSError:
+                return  # something raced us, just sync it again next time
+        self.set(
+            torrent_info["hash"],
+            {
+                "name": torrent_info.get("name"),
+                "size": torrent_info.get("size"),
+                "completed": torrent_info.get("completion_on"),
+                "files": file_count,
+                "dirs": dirs,
+            },
+        )
+
+
+class CopyIndex(HashStore):
+    """source inode -> a copy of it already in OUTPUT_DIR, so duplicates share it.
+
+    cross-seeded torrents usually hardlink the same data under other names in
+    INPUT_DIR, which copying would otherwise turn into one full copy each.
+    keyed by "st_dev:st_ino", an entry holds the source's size and mtime (to
+    notice a recycled inode) and the copy's path relative to OUTPUT_DIR.
+    """
+
+    @staticmethod
+    def key(src_stat: os.stat_result) -> str:
+        return f"{src_stat.st_dev}:{src_stat.st_ino}"
+
+    def find(self, src_stat: os.stat_result, output_dir: Path) -> Optional[str]:
+        """path of a still intact earlier copy of the source, if there is one."""
+        key = self.key(src_stat)
+        entry = self.get(key)
+        if not entry:
+            return None
+        size, mtime_ns, rel = entry
+        if (size, mtime_ns) == (src_stat.st_size, src_stat.st_mtime_ns):
+            copy = os.path.join(output_dir, rel)
+            try:
+                copy_stat = os.stat(copy)
+                # same check as verifying copies, see QbitSync._matches_source
+                if copy_stat.st_size == size and int(copy_stat.st_mtime) == int(
+                    src_stat.st_mtime
+                ):
+                    return copy
+            except OSError:
+                pass
+        self.discard(key)  # source changed or copy gone, next copy takes over
+        return None
+
+    def add(self, src_stat: os.stat_result, output_dir: Path, copy: str) -> None:
+        self.set(
+            self.key(src_stat),
+            [src_stat.st_size, src_stat.st_mtime_ns, os.path.relpath(copy, output_dir)],
+        )
+
+
+class LinkPlan:
+    """what one torrent needs done in OUTPUT_DIR, worked out before touching it."""
+
+    # plain str paths: pathlib overhead dominates on torrents with many files
+    def __init__(self):
+        self.mkdirs: List[str] = []  # parents first
+        self.ops: Dict[str, List[Tuple[str, str]]] = {}  # dst dir -> (src, name)
+        self.dirs: set = set()  # every dir the torrent's files end up in
+        self.present = 0  # files already there (and verified, if enabled)
+        self.repairs: List[Tuple[str, str, str]] = []  # (src, dst dir, name) to replace
+        self.mode = "hardlink"  # picked per source filesystem, see _mode_for
+
+    @property
+    def op_count(self) -> int:
+        return sum(len(entries) for entries in self.ops.values())
+
+
 class QbitSync:
     """handles the torrent syncing logic."""
 
@@ -104,34 +503,114 @@ class QbitSync:
         self.output_dir = cfg["output_dir"]
         self.desired_trackers = cfg["desired_trackers"]
         self.link_mode = cfg["link_mode"]
+        self.link_policy = cfg.get("link_policy") or [self.link_mode]
+        self.state_dir = cfg.get("state_dir") or self.output_dir / ".qbit-sync"
+        self.tracker_cache = HashStore(self.state_dir / "trackers.json")
+        self.synced = SyncedTorrents(self.state_dir / "synced.json")
+        self.dedupe_copies = cfg.get("dedupe_copies", False)
+        self.copies = CopyIndex(self.state_dir / "copies.json")
+        self.gc_quarantine_dir = cfg.get("gc_quarantine_dir")
+        self.full_resync = cfg.get("full_resync", False)
+        self.workers = max(cfg.get("workers", 1), 1)
+        self.dry_run = cfg.get("dry_run", False)
+        self.totals = Counter()  # filesystem ops over the run, see _plan_links
+        self.totals_lock = threading.Lock()
+        self.large_file_size = cfg.get("large_file_mb", 64) * 1024 * 1024
+        self.copy_pool = ThreadPoolExecutor(
+            max_workers=max(cfg.get("copy_workers", 1), 1), thread_name_prefix="copy"
+        )
+        self.throttle = Throttle(cfg.get("copy_bandwidth_mb", 0) * 1024 * 1024)
+        self.modes: Dict[int, Optional[str]] = {}  # source st_dev -> mode, per run
+        self.verify = cfg.get("verify", False)
+        self.verify_hash_sample = cfg.get("verify_hash_sample", 0.0)
+        self.modes_lock = threading.Lock()
 
         if not self.desired_trackers:
             logger.warning(
                 "no desired_trackers specified. script will try to sync *all* completed torrents."
             )
-        if self.link_mode not in ["hardlink", "copy"]:
-            logger.error(
-                f"invalid link_mode '{self.link_mode}'. must be 'hardlink' or 'copy'. exiting."
-            )
-            sys.exit(1)
+        for mode in [self.link_mode] + self.link_policy:
+            if mode not in LINK_MODES:
+                logger.error(
+                    f"invalid link_mode '{mode}'. must be one of {', '.join(LINK_MODES)}. exiting."
+                )
+                sys.exit(1)
+        self.input_dev = device_of(self.input_dir)
+        self.output_dev = device_of(self.output_dir)
         logger.info("sync configuration:")
         logger.info(f"  - qbit url: {self.cfg['qbit_url']}")
         logger.info(f"  - input dir: {self.input_dir}")
         logger.info(f"  - output dir: {self.output_dir}")
         logger.info(f"  - desired trackers: {self.desired_trackers or 'any'}")
-        logger.info(f"  - link mode: {self.link_mode}")
+        logger.info(f"  - link policy: {', '.join(self.link_policy)}")
+        logger.info(
+            f"  - filesystems: input {self.input_dev:#x}, output {self.output_dev:#x}"
+        )
+        if self.input_dev != self.output_dev and self.link_policy[0] == "hardlink":
+            logger.warning(
+                "input and output dirs are on different filesystems, hardlinks won't work for torrents under INPUT_DIR."
+            )
+        logger.info(f"  - state dir: {self.state_dir}")
+        logger.info(f"  - workers: {self.workers}")
+        if self.verify:
+            logger.info(
+                f"  - verify: existing files checked, {self.verify_hash_sample:.0%} of copies content-sampled"
+            )
+        if self.dedupe_copies and self.link_policy != ["hardlink"]:
+            logger.info(
+                f"  - dedupe copies: {len(self.copies.entries)} earlier copies indexed"
+            )
+        if cfg.get("gc"):
+            logger.info(
+                f"  - garbage collection: orphans "
+                + (
+                    f"moved to {self.gc_quarantine_dir}"
+                    if self.gc_quarantine_dir
+                    else "deleted"
+                )
+            )
+        if self.dry_run:
+            logger.info("  - dry run: only logging what would be done")
+        if self.full_resync:
+            logger.info("  - full resync: ignoring what previous runs synced")
+
+    def _matches_tracker(self, url: str) -> bool:
+        return any(dt in url for dt in self.desired_trackers)
+
+    def _get_tracker_urls(self, torrent_hash: str) -> List[str]:
+        """all tracker urls of a torrent, from the cache or one api call."""
+        urls = self.tracker_cache.get(torrent_hash)
+        if urls is None:
+            trackers = self.client.get_torrent_trackers(torrent_hash)
+            urls = [tracker["url"] for tracker in trackers]
+            self.tracker_cache.set(torrent_hash, urls)
+        return urls
 
     def _is_desired_torrent(self, torrent_info: Dict[str, Any]) -> bool:
         """check if the torrent matches the desired trackers."""
         if not self.desired_trackers:
             return True  # sync all if no specific trackers are desired
 
+        # the listing already has the tracker currently in use. that settles it
+        # unless it's empty (nothing working right now) or there are other
+        # trackers that might match, then look at the full list
+        current = torrent_info.get("tracker") or ""
+        if current and self._matches_tracker(current):
+            logger.debug(
+                f"torrent '{torrent_info['name']}' matched desired tracker via url '{current}'"
+            )
+            return True
+        if current and torrent_info.get("trackers_count") == 1:
+            logger.debug(
+                f"torrent '{torrent_info['name']}' did not match any desired trackers."
+            )
+            return False
+
         try:
-            trackers = self.client.get_torrent_trackers(torrent_info["hash"])
-            for tracker in trackers:
-                if any(dt in tracker["url"] for dt in self.desired_trackers):
+            for url in self._get_tracker_urls(torrent_info["hash"]):
+                if self._matches_tracker(url):
                     logger.debug(
-                        f"torrent '{torrent_info['name']}' matched desired tracker via url '{tracker['url']}'"
+                        f"torrent '{torrent_info['name']}' matched desired tracker via url '{url}'"
                     )
                     return True
             logger.debug(
@@ -164,48 +643,530 @@ class QbitSync:
             )
             return None
 
-    def _link_or_copy_file(self, src: Path, dst: Path) -> bool:
-        """create link or copy file based on configuration."""
-        if dst.exists():
-            logger.debug(f"destination exists, skipping: {dst}")
+    def _plan_links(
+        self, pairs: List[Tuple[str, str]], mode: str = "hardlink"
+    ) -> "LinkPlan":
+        """phase one: work out which dirs to create and which files to place.
+
+        each destination dir is listed once instead of stat-ing every file, and
+        missing dirs are collected once each (parents first) instead of a
+        mkdir -p per file. files already there are checked against their
+        source when verifying, see _matches_source.
+        """
+        plan = LinkPlan()
+        plan.mode = mode
+        for src, dst in pairs:
+            dst_dir, name = os.path.split(dst)
+            plan.ops.setdefault(dst_dir, []).append((src, name))
+        plan.dirs = set(plan.ops)
+
+        is_dir: Dict[str, bool] = {}
+        for dst_dir in list(plan.ops):
+            try:
+                with os.scandir(dst_dir) as entries:
+                    present = {entry.name: entry for entry in entries}
+                is_dir[dst_dir] = True
+            except FileNotFoundError:
+                present = {}
+                missing = []
+                d = dst_dir
+                while True:
+                    if d not in is_dir:
+                        is_dir[d] = os.path.isdir(d)
+                    if is_dir[d]:
+                        break
+                    missing.append(d)
+                    is_dir[d] = True  # will be by the time anything needs it
+                    d = os.path.dirname(d)
+                plan.mkdirs.extend(reversed(missing))
+            except OSError:
+                present = {}  # not a dir / no access, placing will report it
+
+            todo = []
+            for src, name in plan.ops[dst_dir]:
+                entry = present.get(name)
+                if entry is None:
+                    todo.append((src, name))
+                elif not self.verify or self._matches_source(src, entry, mode):
+                    plan.present += 1
+                else:
+                    plan.repairs.append((src, dst_dir, name))
+            if todo:
+                plan.ops[dst_dir] = todo
+            else:
+                del plan.ops[dst_dir]
+        return plan
+
+    def _mode_for(self, src: str) -> Optional[str]:
+        """link mode for the filesystem src lives on, decided once per st_dev.
+
+        the first torrent seen on a filesystem pays for the probe, everything
+        else gets the cached answer. None means nothing in the policy works.
+        """
+        try:
+            dev = os.stat(src).st_dev
+        except OSError:
+            return self.link_policy[0]  # missing source, placing will report it
+        with self.modes_lock:
+            if dev not in self.modes:
+                self.modes[dev] = self._choose_mode(src, dev)
+            return self.modes[dev]
+
+    def _choose_mode(self, src: str, dev: int) -> Optional[str]:
+        reasons = []
+        for mode in self.link_policy:
+            reason = self._probe_mode(mode, src, dev)
+            if reason is None:
+                logger.info(
+                    f"using {mode} for files on filesystem {dev:#x} ({os.path.dirname(src)})"
+                    + (f", {'; '.join(reasons)}" if reasons else "")
+                )
+                return mode
+            reasons.append(f"no {mode}: {reason}")
+        logger.error(
+            f"none of {', '.join(self.link_policy)} work from filesystem {dev:#x} "
+            f"({os.path.dirname(src)}) to OUTPUT_DIR: {'; '.join(reasons)}. skipping its torrents. "
+            "consider adding copy to LINK_POLICY."
+        )
+        return None
+
+    def _probe_mode(self, mode: str, src: str, dev: int) -> Optional[str]:
+        """try mode once with a real source file, returns why it can't work (or None)."""
+        if mode == "copy":
+            return None
+        if mode == "hardlink" and dev != self.output_dev:
+            return "different filesystem than OUTPUT_DIR"
+        if self.dry_run:
+            # can't try without writing. st_dev is the best guess (btrfs
+            # subvolumes differ but can still reflink between each other)
+            return None if dev == self.output_dev else "different filesystem"
+        probe = os.path.join(self.output_dir, f".qbit-sync-probe-{os.getpid()}")
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            if mode == "hardlink":
+                os.link(src, probe)
+            else:
+                copy_file(src, probe, reflink_only=True)
+            return None
+        except OSError as e:
+            return e.strerror or str(e)
+        finally:
+            try:
+                os.unlink(probe)
+            except OSError:
+                pass
+
+    def _matches_source(self, src: str, entry: os.DirEntry, mode: str) -> bool:
+        """whether an existing destination is still a good copy/link of src.
+
+        hardlinks must be the same device and inode as dst itself. copies
+        and reflinks must match size and mtime (copystat keeps it), and a
+        sampled share of them also a hash of a few blocks.
+        """
+        try:
+            src_stat = os.stat(src)
+        except OSError:
+            return True  # source gone, keep what's there rather than break it
+        try:
+            if not entry.is_file(follow_symlinks=False):
+                reason = "not a regular file"
+            elif mode == "hardlink":
+                # dst's own device, a bind mount under OUTPUT_DIR can differ from it
+                dst_stat = entry.stat(follow_symlinks=False)
+                if (src_stat.st_dev, src_stat.st_ino) == (
+                    dst_stat.st_dev,
+                    dst_stat.st_ino,
+                ):
+                    return True
+                reason = "not a hardlink of the source"
+            else:
+                dst_stat = entry.stat(follow_symlinks=False)
+                if dst_stat.st_size != src_stat.st_size:
+                    reason = f"size {dst_stat.st_size}, source {src_stat.st_size}"
+                elif int(dst_stat.st_mtime) != int(src_stat.st_mtime):
+                    reason = "mtime differs from source"
+                elif random.random() < self.verify_hash_sample and sample_digest(
+                    src, src_stat.st_size
+                ) != sample_digest(entry.path, dst_stat.st_size):
+                    reason = "content differs from source"
+                else:
+                    return True
+        except OSError as e:
+            reason = f"can't check: {e}"
+        logger.info(f"repairing {entry.path}: {reason}")
+        return False
+
+    def _execute_plan(self, plan: "LinkPlan") -> Tuple[int, int]:
+        """phase two: create the dirs, then place files dir by dir. returns (ok, failed)."""
+        for d in plan.mkdirs:
+            try:
+                os.mkdir(d)
+            except FileExistsError:
+                pass  # another worker (or a same-named torrent) made it
+            except OSError as e:
+                logger.error(f"could not create directory {d}: {e}")
+
+        ok = failed = 0
+        large = []  # big copies, queued on the shared copy pool
+        for dst_dir, entries in plan.ops.items():
+            dir_fd = None
+            if LINK_DIR_FD and plan.mode == "hardlink":
+                try:
+                    dir_fd = os.open(dst_dir, os.O_RDONLY | os.O_DIRECTORY)
+                except OSError as e:
+                    logger.error(f"could not open destination dir {dst_dir}: {e}")
+                    failed += len(entries)
+                    continue
+            try:
+                for src, name in entries:
+                    if plan.mode != "hardlink" and self._is_large(src):
+                        large.append(
+                            # copy_context keeps the torrent's log prefix
+                            self.copy_pool.submit(
+                                copy_context().run,
+                                self._place_file,
+                                src,
+                                dst_dir,
+                                name,
+                                None,
+                                plan.mode,
+                            )
+                        )
+                    elif self._place_file(src, dst_dir, name, dir_fd, plan.mode):
+                        ok += 1
+                    else:
+                        failed += 1
+            finally:
+                if dir_fd is not None:
+                    os.close(dir_fd)
+        for src, dst_dir, name in plan.repairs:
+            if self._repair_file(src, dst_dir, name, plan.mode):
+                ok += 1
+            else:
+                failed += 1
+        for future in large:
+            if future.result():
+                ok += 1
+            else:
+                failed += 1
+        return ok, failed
+
+    def _repair_file(self, src: str, dst_dir: str, name: str, mode: str) -> bool:
+        """replace a mismatched destination, swapped in atomically."""
+        if mode != "hardlink":
+            # copies replace too. always from the source, the indexed earlier
+            # copy could be what's damaged
+            return self._place_file(src, dst_dir, name, None, mode, dedupe=False)
+        dst = os.path.join(dst_dir, name)
+        try:
+            link_replace(src, dst)
             return True
+        except OSError as e:
+            logger.error(f"os error repairing {dst} from {src}: {e}")
+            return False
+
+    def _is_large(self, src: str) -> bool:
+        try:
+            return os.path.getsize(src) >= self.large_file_size
+        except OSError:
+            return False  # placing it will report the problem
 
+    def _place_file(
+        self,
+        src: str,
+        dst_dir: str,
+        name: str,
+        dir_fd: Optional[int],
+        mode: str,
+        dedupe: bool = True,
+    ) -> bool:
+        """create link or copy file based on the mode picked for its filesystem."""
+        dst = os.path.join(dst_dir, name)
         try:
-            dst.parent.mkdir(parents=True, exist_ok=True)
-            if self.link_mode == "hardlink":
+            if mode == "hardlink":
                 logger.debug(f"hardlinking: {src} -> {dst}")
-                os.link(src, dst)
-            elif self.link_mode == "copy":
-                logger.debug(f"copying: {src} -> {dst}")
-                shutil.copy2(src, dst)
+                if dir_fd is None:
+                    os.link(src, dst)
+                else:
+                    os.link(src, name, dst_dir_fd=dir_fd)
+            elif mode in ("reflink", "copy"):
+                logger.debug(f"{mode}: {src} -> {dst}")
+                src_stat = os.stat(src)
+                method = None
+                if self.dedupe_copies and dedupe:
+                    earlier = self.copies.find(src_stat, self.output_dir)
+                    if earlier and earlier != dst:
+                        method = self._reuse_copy(earlier, dst)
+                if method is None:
+                    method = copy_file(
+                        src,
+                        dst,
+                        reflink_only=mode == "reflink",
+                        throttle=self.throttle,
+                    )
+                    if self.dedupe_copies:
+                        self.copies.add(src_stat, self.output_dir, dst)
+                with self.totals_lock:
+                    self.totals[f"via {method}"] += 1
             else:
-                logger.error(f"internal error: invalid link_mode '{self.link_mode}'")
+                logger.error(f"internal error: invalid link_mode '{mode}'")
                 return False
             return True
+        except FileExistsError:
+            # another worker got there first (same-named torrents share a dir)
+            logger.debug(f"destination appeared meanwhile, skipping: {dst}")
+            return True
         except FileNotFoundError:
             logger.error(f"source file not found: {src}")
             return False
         except OSError as e:
             logger.error(f"os error linking/copying {src} to {dst}: {e}")
-            if (
-                self.link_mode == "hardlink"
-                and "invalid cross-device link" in str(e).lower()
-            ):
+            if mode == "hardlink" and e.errno == errno.EXDEV:
                 logger.warning(
                     "hardlink failed (likely cross-device). consider setting link_mode=copy if source/dest are on different filesystems."
                 )
+            elif mode == "reflink" and e.errno in UNSUPPORTED_ERRNOS:
+                logger.warning(
+                    "reflink failed. source/dest need to be on the same filesystem and it has to support reflinks (btrfs, xfs...). consider link_mode=copy."
+                )
             return False
         except Exception as e:
             logger.exception(f"unexpected error linking/copying {src} to {dst}: {e}")
             return False
 
-    def process_torrent(self, torrent_info: Dict[str, Any]) -> None:
-        """process a single torrent: get files, calculate paths, link/copy."""
+    def _reuse_copy(self, earlier: str, dst: str) -> Optional[str]:
+        """place dst as a hardlink (or else reflink) of an earlier copy of its source.
+
+        returns how, or None if neither works and it needs a real copy.
+        """
+        try:
+            link_replace(earlier, dst)
+            return "link to earlier copy"
+        except OSError as e:
+            logger.debug(f"can't hardlink earlier copy {earlier}: {e}")  # EMLINK...
+        try:
+            copy_file(earlier, dst, reflink_only=True)
+            return "reflink to earlier copy"
+        except OSError as e:
+            logger.debug(f"can't reflink earlier copy {earlier}: {e}")
+        return None
+
+    def _log_plan(self, torrent_name: str, plan: "LinkPlan") -> None:
+        verb = plan.mode
+        for d in plan.mkdirs:
+            logger.info(f"[dry run] mkdir {d}")
+        for dst_dir, entries in plan.ops.items():
+            for src, name in entries:
+                logger.info(f"[dry run] {verb} {src} -> {os.path.join(dst_dir, name)}")
+        for src, dst_dir, name in plan.repairs:
+            logger.info(
+                f"[dry run] replace with {verb}: {src} -> {os.path.join(dst_dir, name)}"
+            )
+        logger.info(
+            f"[dry run] '{torrent_name}': {len(plan.mkdirs)} mkdir, {plan.op_count} {verb}, "
+            f"{len(plan.repairs)} repair, {plan.present} already there"
+        )
+
+    def _expected_outputs(self) -> Optional[Tuple[set, set]]:
+        """(files, dirs) relative to OUTPUT_DIR that torrents in qbit map to.
+
+        every torrent counts, whatever its state or trackers. None if the
+        picture is incomplete, collecting against that would delete live files.
+        """
+        try:
+            torrents = self.client.torrents(get_torrent_generic_properties=False)
+        except Exception as e:
+            logger.exception(f"unexpected error retrieving torrent list: {e}")
+            return None
+        if not torrents:
+            logger.warning(
+                "qbittorrent lists no torrents, not treating all of OUTPUT_DIR as orphaned."
+            )
+            return None
+
+        files: set = set()
+        dirs: set = set()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="gc"
+        ) as pool:
+            listings = pool.map(
+                lambda torrent: self._get_torrent_files(torrent["hash"]), torrents
+            )
+            for torrent, listing in zip(torrents, listings):
+                name = torrent.get("name", f"unknown_hash_{torrent['hash']}")
+                if listing is None:
+                    logger.error(
+                        f"no file list for '{name}', skipping garbage collection."
+                    )
+                    return None
+                # same paths as process_torrent, as plain strings
+                root = sanitize_filename(name)
+                dirs.add(root)
+                for f in listing:
+                    rel = os.path.normpath(os.path.join(root, f.get("name", "")))
+                    files.add(rel)
+                    d = os.path.dirname(rel)
+                    while d and d not in dirs:
+                        dirs.add(d)
+                        d = os.path.dirname(d)
+        return files, dirs
+
+    def collect_garbage(self) -> Counter:
+        """remove (or quarantine) whatever in OUTPUT_DIR no torrent in qbit maps to.
+
+        one streaming scandir pass checked against the expected paths. dirs
+        nothing is expected under are taken as a whole without looking things
+        up below them, and dirs left empty go too. returns the counts.
+        """
+        stats = Counter()
+        expected = self._expected_outputs()
+        if expected is None:
+            return stats
+        files, dirs = expected
+        root = str(self.output_dir)
+        skip = set()  # our own state (and quarantine) if they live in OUTPUT_DIR
+        for d in (self.state_dir, self.gc_quarantine_dir):
+            if d and os.path.abspath(d).startswith(os.path.abspath(root) + os.sep):
+                rel = os.path.relpath(os.path.abspath(d), os.path.abspath(root))
+                skip.add(rel)
+                # walk down to it like to any expected dir, instead of taking
+                # a parent (say OUTPUT_DIR/meta for meta/state) as an orphan
+                rel = os.path.dirname(rel)
+                while rel:
+                    dirs.add(rel)
+                    rel = os.path.dirname(rel)
+        quarantine = None
+        if self.gc_quarantine_dir:
+            quarantine = os.path.join(
+                self.gc_quarantine_dir, time.strftime("%Y%m%d-%H%M%S")
+            )
+
+        logger.info(
+            f"collecting garbage in {root}, {len(files)} files of torrents in qbit expected..."
+        )
+        start = time.monotonic()
+        try:
+            self._collect_dir(root, "", files, dirs, skip, quarantine, stats)
+        except OSError as e:
+            logger.error(f"could not scan {root}: {e}")
+            return stats
+        verb = "would remove" if self.dry_run else "removed"
+        if quarantine and not self.dry_run:
+            verb = f"moved to {quarantine}"
+        logger.info(
+            f"{'[dry run] ' if self.dry_run else ''}garbage collection: {verb} "
+            f"{stats['files']} orphaned files and {stats['dirs']} dirs "
+            f"({stats['bytes'] / 2**20:.1f} MiB not linked elsewhere), "
+            f"{stats['emptied dirs']} emptied dirs removed, "
+            f"{stats['failed']} failures, {time.monotonic() - start:.1f}s."
+        )
+        return stats
+
+    def _collect_dir(
+        self,
+        root: str,
+        rel: str,
+        files: set,
+        dirs: set,
+        skip: set,
+        quarantine: Optional[str],
+        stats: Counter,
+    ) -> bool:
+        """collect one expected dir, recursing into expected subdirs. returns if it's now empty."""
+        kept = 0
+        with os.scandir(os.path.join(root, rel) if rel else root) as entries:
+            for entry in entries:
+                child = os.path.join(rel, entry.name) if rel else entry.name
+                if child in skip:
+                    kept += 1
+                elif entry.is_dir(follow_symlinks=False) and child in dirs:
+                    if self._collect_dir(
+                        root, child, files, dirs, skip, quarantine, stats
+                    ) and self._remove_emptied(entry.path, child, stats):
+                        continue
+                    kept += 1
+                elif child in files:
+                    kept += 1
+                elif not self._remove_orphan(entry.path, child, quarantine, stats):
+                    kept += 1
+        return kept == 0
+
+    def _remove_emptied(self, path: str, rel: str, stats: Counter) -> bool:
+        """rmdir a dir whose contents were all orphans (quarantined or not)."""
+        if self.dry_run:
+            logger.info(f"[dry run] emptied: {rel}")
+        else:
+            try:
+                os.rmdir(path)
+            except OSError as e:
+                logger.error(f"could not remove emptied dir {path}: {e}")
+                stats["failed"] += 1
+                return False
+        stats["emptied dirs"] += 1
+        return True
+
+    def _remove_orphan(
+        self, path: str, rel: str, quarantine: Optional[str], stats: Counter
+    ) -> bool:
+        """delete/quarantine one orphaned file or dir tree (or just count it in a dry run).
+
+        trees are walked bottom-up once, deleting as they're counted. bytes
+        only count files with no other link, hardlinks into INPUT_DIR free nothing.
+        """
+        delete = not self.dry_run and quarantine is None
+        counts = Counter()
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+                    for name in filenames + dirnames:
+                        p = os.path.join(dirpath, name)
+                        st = os.lstat(p)
+                        if stat.S_ISDIR(st.st_mode):
+                            counts["dirs"] += 1
+                            if delete:
+                                os.rmdir(p)
+                            continue
+                        counts["files"] += 1
+                        if st.st_nlink == 1:
+                            counts["bytes"] += st.st_size
+                        if delete:
+                            os.unlink(p)
+                counts["dirs"] += 1
+                if delete:
+                    os.rmdir(path)
+            else:
+                st = os.lstat(path)
+                counts["files"] += 1
+                if st.st_nlink == 1:
+                    counts["bytes"] += st.st_size
+                if delete:
+                    os.unlink(path)
+            if self.dry_run:
+                logger.info(f"[dry run] orphaned: {rel}")
+            elif quarantine:
+                dst = os.path.join(quarantine, rel)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.move(path, dst)
+            else:
+                logger.debug(f"removed orphaned {rel}")
+            stats.update(counts)
+            return True
+        except OSError as e:
+            logger.error(f"could not remove orphaned {path}: {e}")
+            stats.update(counts)
+            stats["failed"] += 1
+            return False
+
+    def process_torrent(self, torrent_info: Dict[str, Any]) -> bool:
+        """process a single torrent: get files, calculate paths, link/copy.
+
+        returns whether every file made it, in which case it's recorded as synced.
+        """
         torrent_hash = torrent_info.get("hash")
         torrent_name = torrent_info.get("name", f"unknown_hash_{torrent_hash}")
         if not torrent_hash:
             logger.error(f"torrent info missing 'hash': {torrent_info}")
-            return
+            return False
 
         logger.info(f"processing torrent: {torrent_name}")
 
@@ -214,20 +1175,21 @@ class QbitSync:
             logger.warning(
                 f"skipping torrent '{torrent_name}' due to error fetching properties."
             )
-            return
+            return False
 
         files = self._get_torrent_files(torrent_hash)
         if not files:
             logger.warning(
                 f"skipping torrent '{torrent_name}' due to error fetching file list."
             )
-            return
+            return False
 
         sanitized_name = sanitize_filename(torrent_name)
-        torrent_out_dir = self.output_dir / sanitized_name
+        torrent_out_dir = str(self.output_dir / sanitized_name)
+        input_dir = str(self.input_dir)
 
-        success_count = 0
         fail_count = 0
+        pairs = []
         for f in files:
             file_name = f.get("name")
             if not file_name:
@@ -238,22 +1200,173 @@ class QbitSync:
                 continue
 
             # Build source and destination paths
-            src_path = self.input_dir / file_name
-            dst_path = torrent_out_dir / file_name
+            pairs.append(
+                (
+                    os.path.join(input_dir, file_name),
+                    os.path.join(torrent_out_dir, file_name),
+                )
+            )
 
-            if self._link_or_copy_file(src_path, dst_path):
-                success_count += 1
-            else:
-                fail_count += 1
+        mode = self._mode_for(pairs[0][0]) if pairs else self.link_policy[0]
+        if mode is None:
+            logger.warning(
+                f"skipping torrent '{torrent_name}', no link mode works for its filesystem."
+            )
+            return False
 
+        plan = self._plan_links(pairs, mode)
+        with self.totals_lock:
+            self.totals.update(
+                {
+                    "mkdir": len(plan.mkdirs),
+                    mode: plan.op_count,
+                    "repair": len(plan.repairs),
+                    "present": plan.present,
+                }
+            )
+        if self.dry_run:
+            self._log_plan(torrent_name, plan)
+            return fail_count == 0
+
+        ok, failed = self._execute_plan(plan)
+        success_count = ok + plan.present
+        fail_count += failed
         if fail_count > 0:
             logger.warning(
                 f"finished processing '{torrent_name}' with {success_count} successful links/copies and {fail_count} failures."
             )
-        else:
-            logger.info(
-                f"successfully processed '{torrent_name}' ({success_count} files)."
-            )
+            return False
+        logger.info(f"successfully processed '{torrent_name}' ({success_count} files).")
+        self.synced.record(torrent_info, self.output_dir, plan.dirs, success_count)
+        return True
+
+    def _sync_completed(self, torrent_info: Dict[str, Any]) -> str:
+        """sync one completed torrent unless it's filtered out or already synced.
+
+        returns 'unchanged', 'filtered', 'synced' or 'failed'.
+        """
+        token = current_torrent.set(str(torrent_info.get("hash", ""))[:8])
+        try:
+            name = torrent_info.get("name", "unknown")
+            if not self.full_resync and self.synced.is_current(
+                torrent_info, self.output_dir
+            ):
+                logger.debug(f"skipping torrent '{name}', unchanged since last sync.")
+                return "unchanged"
+            if not self._is_desired_torrent(torrent_info):
+                logger.debug(
+                    f"skipping torrent '{name}' as it doesn't match desired trackers."
+                )
+                return "filtered"
+            return "synced" if self.process_torrent(torrent_info) else "failed"
+        finally:
+            current_torrent.reset(token)
+
+    def _sync_each(self, torrents: List[Dict[str, Any]]) -> List[str]:
+        """run _sync_completed over torrents on up to `workers` threads, outcomes in order."""
+        if self.workers == 1 or len(torrents) <= 1:
+            return [self._sync_completed(t) for t in torrents]
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="sync"
+        ) as pool:
+            return list(pool.map(self._sync_completed, torrents))
+
+    def _sync_all(self, torrents: List[Dict[str, Any]]) -> Counter:
+        return Counter(self._sync_each(torrents))
+
+    def _save_state(self) -> None:
+        if self.dry_run:
+            return  # leave OUTPUT_DIR (and the state in it) alone
+        self.tracker_cache.save()
+        self.synced.save()
+        self.copies.save()
+
+    def _apply_maindata(
+        self,
+        data: Dict[str, Any],
+        torrents: Dict[str, Dict[str, Any]],
+        done: set,
+    ) -> List[Dict[str, Any]]:
+        """merge one sync/maindata response into `torrents`, return the ones that just completed.
+
+        maindata only sends fields that changed since the given rid, so the full
+        picture is kept here. a torrent counts once per daemon lifetime (tracked in
+        `done`), unless it's removed and added again.
+        """
+        if data.get("full_update"):
+            torrents.clear()
+        for torrent_hash in data.get("torrents_removed", []):
+            torrents.pop(torrent_hash, None)
+            done.discard(torrent_hash)
+            self.tracker_cache.discard(torrent_hash)
+            self.synced.discard(torrent_hash)
+
+        changed = data.get("torrents", {})
+        for torrent_hash, delta in changed.items():
+            torrents.setdefault(torrent_hash, {"hash": torrent_hash}).update(delta)
+        return [
+            torrents[h]
+            for h in changed
+            if h not in done and torrents[h].get("state") in COMPLETED_STATES
+        ]
+
+    def watch(
+        self,
+        poll_interval: float,
+        stop: threading.Event,
+        retry_interval: float = 60.0,
+    ) -> None:
+        """daemon mode: poll sync/maindata and process torrents as they complete.
+
+        the first poll is a full update, so everything already completed gets
+        synced like a normal run. after that each poll only carries what changed,
+        which is next to nothing while the client is idle. torrents that fail
+        (api hiccup, files not moved into place yet...) are tried again every
+        retry_interval seconds until they sync or go away.
+        """
+        logger.info(f"watching for completed torrents every {poll_interval}s...")
+        rid = 0
+        torrents: Dict[str, Dict[str, Any]] = {}
+        done: set = set()
+        retry_at: Dict[str, float] = {}  # failed hash -> monotonic time to retry
+        while not stop.is_set():
+            try:
+                data = self.client.sync_main_data(rid)
+            except Exception as e:
+                # likely an expired session or qbit restarting, log in again and
+                # start over from a full update so no completion is missed
+                logger.warning(f"maindata poll failed: {e}. reconnecting...")
+                client = connect_client()
+                if client:
+                    self.client = client
+                rid = 0
+                stop.wait(poll_interval)
+                continue
+
+            rid = data.get("rid", 0)
+            completed = self._apply_maindata(data, torrents, done)
+            if completed:
+                logger.info(f"{len(completed)} torrents newly completed.")
+            now = time.monotonic()
+            queued = {torrent["hash"] for torrent in completed}
+            for torrent_hash, when in list(retry_at.items()):
+                torrent = torrents.get(torrent_hash)
+                if not torrent or torrent.get("state") not in COMPLETED_STATES:
+                    del retry_at[torrent_hash]  # gone, or a completion will requeue it
+                elif torrent_hash not in queued and when <= now:
+                    logger.info(f"retrying '{torrent.get('name', torrent_hash)}'.")
+                    completed.append(torrent)
+
+            outcomes = self._sync_each(completed)
+            for torrent, outcome in zip(completed, outcomes):
+                if outcome == "failed":
+                    retry_at[torrent["hash"]] = now + retry_interval
+                else:
+                    done.add(torrent["hash"])
+                    retry_at.pop(torrent["hash"], None)
+            self._save_state()
+            stop.wait(poll_interval)
+        logger.info("stopped watching.")
 
     def sync_torrents(self) -> None:
         """main sync logic: find completed torrents and process them."""
@@ -267,23 +1380,46 @@ class QbitSync:
             logger.exception(f"unexpected error retrieving torrent list: {e}")
             return  # exit the function, main will exit
 
-        processed_count = 0
-        for torrent in all_completed:
-            if self._is_desired_torrent(torrent):
-                self.process_torrent(torrent)
-                processed_count += 1
-            else:
-                logger.debug(
-                    f"skipping torrent '{torrent.get('name', 'unknown')}' as it doesn't match desired trackers."
-                )
+        counts = Counter()
+        try:
+            counts = self._sync_all(all_completed)
+        finally:
+            # keep what got synced so far even if the run dies halfway
+            listed = {torrent["hash"] for torrent in all_completed}
+            self.tracker_cache.prune(listed)
+            self.synced.prune(listed)
+            self._save_state()
 
         logger.info(
-            f"sync run finished. processed {processed_count} matching torrents."
+            f"sync run finished. synced {counts['synced']} torrents, {counts['failed']} with failures, "
+            f"{counts['unchanged']} unchanged, {counts['filtered']} not matching trackers."
+        )
+        ops = [f"{self.totals['mkdir']} mkdir"]
+        ops += [f"{self.totals[m]} {m}" for m in LINK_MODES if self.totals[m]]
+        if self.totals["repair"]:
+            ops.append(f"{self.totals['repair']} repaired")
+        ops += [
+            f"{self.totals[f'via {m}']} via {m}"
+            for m in (
+                "reflink",
+                "copy_file_range",
+                "buffered",
+                "link to earlier copy",
+                "reflink to earlier copy",
+            )
+            if self.totals[f"via {m}"]
+        ]
+        logger.info(
+            f"{'[dry run] would do: ' if self.dry_run else 'filesystem ops: '}"
+            f"{', '.join(ops)}, {self.totals['present']} files already there."
         )
 
 
 def main():
-    logger.info("qbit-sync starting up for a single run...")
+    if config["daemon"]:
+        logger.info("qbit-sync starting up in daemon mode...")
+    else:
+        logger.info("qbit-sync starting up for a single run...")
 
     exit_code = 0
     qbit_client = connect_client()
@@ -294,7 +1430,18 @@ def main():
     else:
         try:
             syncer = QbitSync(qbit_client, config)
-            syncer.sync_torrents()
+            if config["daemon"]:
+                # stop between polls on docker stop / ctrl-c
+                stop = threading.Event()
+                signal.signal(signal.SIGTERM, lambda *_: stop.set())
+                signal.signal(signal.SIGINT, lambda *_: stop.set())
+                if config["gc"]:
+                    syncer.collect_garbage()
+                syncer.watch(config["poll_interval"], stop, config["retry_interval"])
+            else:
+                syncer.sync_torrents()
+                if config["gc"]:
+                    syncer.collect_garbage()
             logger.info("qbit-sync run complete.")
         except Exception as e:
             logger.exception(
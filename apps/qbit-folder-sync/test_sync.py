@@ -0,0 +1,538 @@
+"""tests for qbit-folder-sync against a fake qbittorrent on localhost.
+
+FakeQbit is shared with benchmark.py, which runs the same scenarios at scale.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import main
+
+
+class FakeQbit:
+    """just enough of the qbittorrent webui api (v2) for main.py, served on localhost.
+
+    every request is counted per endpoint in `calls`. sync/maindata keeps the
+    last snapshot it sent so the next poll with that rid gets a real diff.
+    """
+
+    def __init__(self, save_path: Path):
+        self.save_path = save_path
+        self.torrents: dict[str, dict] = {}
+        self.files: dict[str, list[dict]] = {}
+        self.trackers: dict[str, list[str]] = {}
+        self.calls: Counter = Counter()
+        # answer this many requests with 403, like an expired session
+        self.forbidden = 0
+        self.latency = 0.0  # seconds added to every response, like a busy qbit
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._rid = 0
+        self._snapshots: dict[int, dict] = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> "FakeQbit":
+        threading.Thread(
+            target=self.server.serve_forever,
+            kwargs={"poll_interval": 0.01},
+            daemon=True,
+        ).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_torrent(
+        self,
+        name: str,
+        files: dict[str, int],
+        trackers: list[str],
+        state: str = "downloading",
+        working: bool = True,
+    ) -> str:
+        """register a torrent with relative file paths -> sizes, returns its hash.
+
+        like qbit, the listing's `tracker` is the first working tracker, or empty
+        when none is (`working=False`).
+        """
+        torrent_hash = hashlib.sha1(name.encode()).hexdigest()
+        with self.lock:
+            self.torrents[torrent_hash] = {
+                "hash": torrent_hash,
+                "name": name,
+                "state": state,
+                "progress": 1.0 if state in main.COMPLETED_STATES else 0.5,
+                "tracker": trackers[0] if working else "",
+                "trackers_count": len(trackers),
+                "size": sum(files.values()),
+                "completion_on": (
+                    int(time.time()) if state in main.COMPLETED_STATES else -1
+                ),
+            }
+            self.files[torrent_hash] = [
+                {"name": rel, "size": size, "progress": 1.0}
+                for rel, size in files.items()
+            ]
+            self.trackers[torrent_hash] = trackers
+        return torrent_hash
+
+    def complete(self, torrent_hash: str) -> None:
+        with self.lock:
+            self.torrents[torrent_hash].update(
+                state="uploading", progress=1.0, completion_on=int(time.time())
+            )
+
+    def remove(self, torrent_hash: str) -> None:
+        with self.lock:
+            del self.torrents[torrent_hash]
+
+    def total_calls(self) -> int:
+        with self.lock:
+            return sum(self.calls.values())
+
+    def _maindata(self, rid: int) -> dict:
+        current = {h: dict(t) for h, t in self.torrents.items()}
+        previous = self._snapshots.get(rid)
+        self._rid += 1
+        self._snapshots = {self._rid: current}
+        data: dict = {"rid": self._rid}
+        if previous is None:
+            data["full_update"] = True
+            data["torrents"] = current
+            return data
+        changed = {}
+        for h, torrent in current.items():
+            old = previous.get(h, {})
+            delta = {k: v for k, v in torrent.items() if old.get(k) != v}
+            if delta:
+                changed[h] = delta
+        removed = [h for h in previous if h not in current]
+        if changed:
+            data["torrents"] = changed
+        if removed:
+            data["torrents_removed"] = removed
+        return data
+
+    def _respond(self, endpoint: str, query: dict) -> tuple[int, object]:
+        torrent_hash = query.get("hash", [""])[0]
+        if endpoint in ("app/preferences", "auth/logout"):
+            return 200, {}
+        if endpoint == "auth/login":
+            return 200, "Ok."
+        if endpoint == "app/version":
+            return 200, "v4.6.0"
+        if endpoint == "app/webapiVersion":
+            return 200, "2.9.3"
+        if endpoint == "sync/maindata":
+            return 200, self._maindata(int(query.get("rid", ["0"])[0]))
+        if endpoint == "torrents/info":
+            torrents = list(self.torrents.values())
+            if query.get("filter") == ["completed"]:
+                torrents = [t for t in torrents if t["state"] in main.COMPLETED_STATES]
+            return 200, torrents
+        if torrent_hash not in self.torrents:
+            return 404, "Not Found"
+        if endpoint == "torrents/properties":
+            torrent = self.torrents[torrent_hash]
+            return 200, {
+                "save_path": str(self.save_path),
+                "total_size": torrent["size"],
+                "completion_date": torrent["completion_on"],
+            }
+        if endpoint == "torrents/files":
+            return 200, self.files[torrent_hash]
+        if endpoint == "torrents/trackers":
+            return 200, [
+                {"url": url, "status": 2} for url in self.trackers[torrent_hash]
+            ]
+        return 404, "Not Found"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so client pooling shows
+            disable_nagle_algorithm = True  # or every response waits on a delayed ack
+
+            def setup(self):
+                super().setup()
+                with fake.lock:
+                    fake.connections += 1
+
+            def _serve(self):
+                url = urlparse(self.path)
+                endpoint = url.path.removeprefix("/api/v2/")
+                query = parse_qs(url.query)
+                if self.command == "POST":
+                    length = int(self.headers.get("Content-Length", 0))
+                    query.update(parse_qs(self.rfile.read(length).decode()))
+                with fake.lock:
+                    fake.calls[endpoint] += 1
+                    if fake.forbidden and endpoint != "auth/login":
+                        fake.forbidden -= 1
+                        status, body = 403, "Forbidden"
+                    else:
+                        status, body = fake._respond(endpoint, query)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                payload = (body if isinstance(body, str) else json.dumps(body)).encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+TRACKERS = ["https://tracker.example/announce"]
+OTHER_TRACKERS = ["udp://open.tracker.test:1337/announce"]
+
+
+def make_torrent(input_dir: Path, name: str, n_files: int, size: int) -> dict[str, int]:
+    """write a torrent's files under input_dir, returns relative path -> size."""
+    files = {}
+    for i in range(n_files):
+        rel = f"{name}/part{i:02d}.bin"
+        (input_dir / rel).parent.mkdir(parents=True, exist_ok=True)
+        (input_dir / rel).write_bytes(b"x" * size)
+        files[rel] = size
+    return files
+
+
+def wait_for(predicate, timeout: float, step: float = 0.005) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(step)
+    return predicate()
+
+
+class SyncTestCase(unittest.TestCase):
+    """temp INPUT_DIR/OUTPUT_DIR and a running FakeQbit per test."""
+
+    def setUp(self):
+        tmp = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.input_dir = tmp / "downloads"
+        self.output_dir = tmp / "output"
+        self.input_dir.mkdir()
+        self.fake = FakeQbit(self.input_dir).start()
+        self.addCleanup(self.fake.stop)
+        # connect_client (and the daemon's reconnects) read the global config
+        self.enterContext(mock.patch.dict(main.config, qbit_url=self.fake.url))
+        self.enterContext(mock.patch.object(main.logger, "disabled", True))
+
+    def syncer(self, **overrides) -> "main.QbitSync":
+        cfg = dict(
+            main.config,
+            input_dir=self.input_dir,
+            output_dir=self.output_dir,
+            desired_trackers={"tracker.example"},
+            link_mode="hardlink",
+            link_policy=["hardlink"],
+            state_dir=None,
+            full_resync=False,
+            workers=2,
+            dry_run=False,
+            verify=True,
+            verify_hash_sample=0.0,
+            dedupe_copies=False,
+            gc_quarantine_dir=None,
+        )
+        cfg.update(overrides)
+        syncer = main.QbitSync(main.connect_client(retries=0, delay=0), cfg)
+        self.addCleanup(syncer.copy_pool.shutdown)
+        return syncer
+
+    def add(self, name: str, trackers=TRACKERS, state="stalledUP", n_files=3) -> str:
+        files = make_torrent(self.input_dir, name, n_files, 100)
+        return self.fake.add_torrent(name, files, trackers, state)
+
+    def src(self, name: str, i: int = 0) -> Path:
+        return self.input_dir / name / f"part{i:02d}.bin"
+
+    def out(self, name: str, i: int = 0) -> Path:
+        return self.output_dir / name / name / f"part{i:02d}.bin"
+
+
+class TestDaemon(SyncTestCase):
+    def watch(self, syncer, **kwargs) -> threading.Event:
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=syncer.watch, args=(0.02, stop), kwargs=kwargs, daemon=True
+        )
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+        return stop
+
+    def test_syncs_torrents_as_they_complete(self):
+        self.add("done")
+        pending = self.add("pending", state="downloading")
+        self.watch(self.syncer())
+        self.assertTrue(wait_for(self.out("done").exists, 5))
+        self.assertFalse(self.out("pending").exists())
+
+        self.fake.complete(pending)
+        self.assertTrue(wait_for(self.out("pending").exists, 5))
+        # each torrent's files are fetched once, idle polls don't refetch
+        time.sleep(0.1)
+        self.assertEqual(self.fake.calls["torrents/files"], 2)
+        self.assertTrue(os.path.samefile(self.out("done"), self.src("done")))
+
+    def test_failed_torrents_are_retried(self):
+        self.add("late")
+        moved = self.src("late", 1).with_suffix(".part")
+        self.src("late", 1).rename(moved)  # not moved into place yet
+        self.watch(self.syncer(), retry_interval=0.05)
+        self.assertTrue(wait_for(self.out("late", 0).exists, 5))
+        self.assertFalse(self.out("late", 1).exists())
+
+        moved.rename(self.src("late", 1))
+        self.assertTrue(wait_for(self.out("late", 1).exists, 5))
+
+    def test_reconnects_after_403(self):
+        self.watch(self.syncer())
+        self.assertTrue(wait_for(lambda: self.fake.calls["sync/maindata"] > 1, 5))
+        self.fake.forbidden = 1
+        self.add("after")
+        self.assertTrue(wait_for(self.out("after").exists, 5))
+
+
+class TestApiCalls(SyncTestCase):
+    def test_tracker_cache_and_synced_state(self):
+        # the working tracker doesn't match, so the full list has to be looked up
+        for i in range(4):
+            self.add(f"t{i}", trackers=OTHER_TRACKERS + TRACKERS)
+        self.add("other", trackers=OTHER_TRACKERS)
+
+        self.syncer().sync_torrents()
+        self.assertEqual(self.fake.calls["torrents/trackers"], 4)
+        self.assertEqual(self.fake.calls["torrents/files"], 4)
+        self.assertFalse((self.output_dir / "other").exists())
+
+        self.fake.calls.clear()
+        self.syncer(full_resync=True).sync_torrents()
+        self.assertEqual(self.fake.calls["torrents/trackers"], 0)  # cached on disk
+        self.assertEqual(self.fake.calls["torrents/files"], 4)
+
+        self.fake.calls.clear()
+        self.syncer().sync_torrents()
+        self.assertEqual(self.fake.calls["torrents/files"], 0)  # all unchanged
+
+        # deleting an output dir bumps its mtime, only that torrent resyncs
+        for path in (self.output_dir / "t1" / "t1").iterdir():
+            path.unlink()
+        self.syncer().sync_torrents()
+        self.assertEqual(self.fake.calls["torrents/files"], 1)
+        self.assertTrue(self.out("t1", 2).exists())
+
+
+class TestPlan(SyncTestCase):
+    def test_lists_dirs_once_and_creates_parents_first(self):
+        out = str(self.output_dir)
+        os.makedirs(os.path.join(out, "a"))
+        open(os.path.join(out, "a", "present"), "w").close()
+        pairs = [
+            (str(self.src("x", 0)), os.path.join(out, "a", "present")),
+            (str(self.src("x", 1)), os.path.join(out, "a", "new")),
+            (str(self.src("x", 2)), os.path.join(out, "b", "c", "d", "new")),
+            (str(self.src("x", 3)), os.path.join(out, "b", "c", "other")),
+        ]
+        plan = self.syncer(verify=False)._plan_links(pairs)
+        self.assertEqual(
+            plan.mkdirs,
+            [
+                os.path.join(out, "b"),
+                os.path.join(out, "b", "c"),
+                os.path.join(out, "b", "c", "d"),
+            ],
+        )
+        self.assertEqual(plan.present, 1)
+        self.assertEqual(plan.op_count, 3)
+        self.assertEqual(len(plan.dirs), 3)
+
+    def test_dry_run_touches_nothing(self):
+        self.add("t")
+        self.syncer(dry_run=True).sync_torrents()
+        self.assertFalse(self.output_dir.exists())
+
+
+class TestVerify(SyncTestCase):
+    def test_hardlink_repairs_stale_files(self):
+        self.add("t")
+        self.syncer().sync_torrents()
+        self.out("t", 1).unlink()
+        self.out("t", 1).write_bytes(b"y" * 100)  # unrelated file under the name
+
+        syncer = self.syncer(full_resync=True)
+        syncer.sync_torrents()
+        self.assertEqual(syncer.totals["repair"], 1)
+        self.assertEqual(syncer.totals["present"], 2)
+        self.assertTrue(os.path.samefile(self.out("t", 1), self.src("t", 1)))
+
+    def test_hardlink_check_uses_the_destination_device(self):
+        self.add("t")
+        syncer = self.syncer()
+        syncer.sync_torrents()
+        # as if the torrent's folder were a bind mount with its own device
+        syncer.output_dev ^= 1
+        with os.scandir(self.out("t", 0).parent) as it:
+            entries = {e.name: e for e in it}
+        entry = entries[self.out("t", 0).name]
+        self.assertTrue(
+            syncer._matches_source(str(self.src("t", 0)), entry, "hardlink")
+        )
+
+    def test_copy_repairs_truncated_and_corrupted_files(self):
+        self.add("t")
+        self.syncer(link_mode="copy", link_policy=["copy"]).sync_torrents()
+        for i, damage in ((0, b"x" * 50), (1, b"z" * 100)):
+            st = self.out("t", i).stat()
+            self.out("t", i).write_bytes(damage)
+            os.utime(self.out("t", i), ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        syncer = self.syncer(
+            link_mode="copy",
+            link_policy=["copy"],
+            full_resync=True,
+            verify_hash_sample=1.0,
+        )
+        syncer.sync_torrents()
+        self.assertEqual(syncer.totals["repair"], 2)
+        for i in range(3):
+            self.assertEqual(
+                self.out("t", i).read_bytes(), self.src("t", i).read_bytes()
+            )
+            self.assertFalse(os.path.samefile(self.out("t", i), self.src("t", i)))
+
+    def test_long_names_and_no_temp_files_left(self):
+        name = "n" * 250
+        self.fake.add_torrent(name, {f"t/{name}": 3}, TRACKERS, "stalledUP")
+        (self.input_dir / "t").mkdir()
+        (self.input_dir / "t" / name).write_bytes(b"abc")
+        for mode in ("copy", "hardlink"):
+            self.syncer(
+                link_mode=mode, link_policy=[mode], full_resync=True
+            ).sync_torrents()
+            dst = self.output_dir / name / "t" / name
+            self.assertEqual(dst.read_bytes(), b"abc")
+            self.assertEqual(os.listdir(dst.parent), [name])
+            dst.unlink()
+
+
+class TestDedupe(SyncTestCase):
+    def add_cross_seed(self, name: str, of: str) -> None:
+        files = {}
+        for i in range(3):
+            rel = f"{name}/renamed{i}.bin"
+            (self.input_dir / name).mkdir(exist_ok=True)
+            os.link(self.src(of, i), self.input_dir / rel)
+            files[rel] = 100
+        self.fake.add_torrent(name, files, TRACKERS, "stalledUP")
+
+    def test_cross_seeds_link_to_earlier_copies(self):
+        self.add("t")
+        copy = dict(link_mode="copy", link_policy=["copy"], dedupe_copies=True)
+        self.syncer(**copy).sync_torrents()
+        self.add_cross_seed("xs", of="t")
+
+        syncer = self.syncer(**copy)  # index comes back from STATE_DIR
+        syncer.sync_torrents()
+        self.assertEqual(syncer.totals["via link to earlier copy"], 3)
+        for i in range(3):
+            xs = self.output_dir / "xs" / "xs" / f"renamed{i}.bin"
+            self.assertTrue(os.path.samefile(xs, self.out("t", i)))
+            self.assertFalse(os.path.samefile(xs, self.src("t", i)))
+
+    def test_independent_copies_without_dedupe(self):
+        self.add("t")
+        self.add_cross_seed("xs", of="t")
+        self.syncer(link_mode="copy", link_policy=["copy"]).sync_torrents()
+        xs = self.output_dir / "xs" / "xs" / "renamed0.bin"
+        self.assertFalse(os.path.samefile(xs, self.out("t", 0)))
+
+
+class TestGarbageCollection(SyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add("kept")
+        self.gone = self.add("gone")
+        self.syncer().sync_torrents()
+        self.fake.remove(self.gone)
+        (self.output_dir / "kept" / "kept" / "leftover.nfo").write_text("old")
+        (self.output_dir / "kept" / "empty" / "dirs").mkdir(parents=True)
+        self.orphans = {
+            "gone/gone/part00.bin",
+            "gone/gone/part01.bin",
+            "gone/gone/part02.bin",
+            "kept/kept/leftover.nfo",
+        }
+
+    def files(self, root: Path) -> set:
+        return {
+            os.path.relpath(os.path.join(d, f), root)
+            for d, _, files in os.walk(root)
+            for f in files
+            if ".qbit-sync" not in d
+        }
+
+    def test_removes_orphans_and_emptied_dirs(self):
+        before = self.files(self.output_dir)
+        stats = self.syncer().collect_garbage()
+        self.assertEqual(stats["files"], 4)
+        self.assertEqual(self.files(self.output_dir), before - self.orphans)
+        self.assertFalse((self.output_dir / "gone").exists())
+        self.assertFalse((self.output_dir / "kept" / "empty").exists())
+        self.assertTrue((self.output_dir / ".qbit-sync" / "synced.json").exists())
+
+    def test_dry_run_only_reports(self):
+        before = self.files(self.output_dir)
+        stats = self.syncer(dry_run=True).collect_garbage()
+        self.assertEqual(stats["files"], 4)
+        self.assertEqual(self.files(self.output_dir), before)
+
+    def test_quarantine(self):
+        quarantine = self.output_dir / "quarantine"
+        self.syncer(gc_quarantine_dir=quarantine).collect_garbage()
+        (run,) = quarantine.iterdir()
+        self.assertEqual(self.files(run), self.orphans)
+
+    def test_nested_state_and_quarantine_dirs_are_kept(self):
+        state_dir = self.output_dir / "meta" / "state"
+        quarantine = self.output_dir / "meta" / "trash" / "gc"
+        self.syncer(state_dir=state_dir).sync_torrents()  # writes state there
+        (self.output_dir / "meta" / "stray").write_text("orphan")
+        syncer = self.syncer(state_dir=state_dir, gc_quarantine_dir=quarantine)
+        syncer.collect_garbage()
+        self.assertTrue((state_dir / "synced.json").exists())
+        (run,) = quarantine.iterdir()
+        self.assertEqual(self.files(run), self.orphans | {"meta/stray"})
+
+    def test_skipped_when_qbit_lists_nothing(self):
+        for torrent_hash in list(self.fake.torrents):
+            self.fake.remove(torrent_hash)
+        before = self.files(self.output_dir)
+        self.assertEqual(self.syncer().collect_garbage(), Counter())
+        self.assertEqual(self.files(self.output_dir), before)
+
+
+if __name__ == "__main__":
+    unittest.main()